@@ -1,12 +1,250 @@
+import os
+import re
+import csv
+import json
 import time
+import queue
+import shutil
 import logging
-import win32com.client as win32
+import tempfile
+
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 from sys import stdout
+from fnmatch import fnmatchcase
 from itertools import chain
-from psutil import process_iter
+from contextlib import nullcontext
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path, WindowsPath
-from tkinter import Tk, filedialog
+
+# psutil, tkinter and asyncio are imported where they are used. Headless workers never open a file dialog or
+# an event loop, and importing them up front slows down every spawned worker process.
+# The COM specifics live in the backends, so everything here also runs against the simulated flowsheet.
+from backends import Backend, ComBackend
+from cache import ArchiveCache, ResultCache, hash_archive
+from timings import Timings
+from topology import FlowsheetIndex, RewireTransaction
+
+# Where connect_to_aspen looks for the archive when it isn't given a path, in this order.
+ASPEN_PATH_ENV = "ASPEN_PATH"
+ASPEN_PATH_FILES = ("path_param.json", "aspenpy.toml")
+ASPEN_PATH_ARG = "--aspen-path"
+
+# Process names that belong to a running ASPEN instance.
+ASPEN_PROCESS_NAMES = ("AspenPlus.exe", "APropMain.exe", "AspenProperties.exe")
+
+# Which autosave artifacts run_aspen writes. See ASPEN._artifacts_to_save.
+ARTIFACT_POLICIES = ("all", "none", "failures", "every_n", "reports")
+
+# How a block's BLKSTAT code is classified after a run. Unknown non-zero codes count as errors.
+BLOCK_STATUS = {0: "converged", 1: "errors", 2: "warnings"}
+
+# The severity markers ASPEN puts in front of block messages, e.g. "** ERROR", "*** SEVERE ERROR" or "* WARNING".
+# Plain words aren't matched, so messages such as "0 errors" don't count.
+BLOCK_ERROR_PATTERN = re.compile(r"\*+\s*(?:SEVERE\s+)?ERROR\b|\bNOT\s+CONVERGED\b", re.IGNORECASE)
+BLOCK_WARNING_PATTERN = re.compile(r"\*+\s*WARNING\b", re.IGNORECASE)
+
+# Health classes from best to worst. A case is as healthy as its worst block.
+HEALTH_LEVELS = ("converged", "warnings", "errors")
+
+
+class ConvergenceError(RuntimeError):
+    """
+    Raised when a run finishes but the block health scan finds blocks with errors.
+
+    Attributes:
+        health : dict
+            The scan result. See ASPEN.scan_block_health.
+    """
+
+    def __init__(self, health: dict):
+        self.health = health
+        super().__init__(f"Blocks with errors: {', '.join(health['errors'])}")
+
+
+def start_log_listener(log_file: str | Path, log_queue=None, format: str='%(asctime)s - %(levelname)s - %(message)s',
+                       console: bool=True):
+    """
+    Starts a QueueListener that writes queued log records to stdout and a log file on its own thread.
+
+    Loggers only put records on the queue, so logging never blocks on console or disk I/O.
+
+    Args:
+        log_file (str | Path): The log file to write.
+        log_queue (queue.Queue | multiprocessing.Queue, optional): The queue to listen on. Pass a
+            multiprocessing queue to collect records from worker processes. Defaults to a new queue.Queue.
+        format (str, optional): The record format.
+        console (bool, optional): Also write the records to stdout. Defaults to True.
+
+    Returns:
+        tuple: (log_queue, listener). Call listener.stop() to flush and stop it.
+    """
+    if log_queue is None: log_queue = queue.Queue()
+    formatter = logging.Formatter(format)
+    handlers = [logging.FileHandler(filename=log_file)]
+    if console:
+        handlers.append(logging.StreamHandler(stdout))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    listener = QueueListener(log_queue, *handlers)
+    listener.start()
+    return log_queue, listener
+
+
+def validate_archive(path: str | Path):
+    """
+    Checks that an ASPEN archive exists and can be read, and hashes it.
+
+    Meant to be called once per sweep, with the hash handed to every worker so none of them rereads the archive.
+
+    Args:
+        path (str | Path): The path to the archive.
+
+    Raises:
+        ValueError: If the path is not a readable file.
+
+    Returns:
+        str: The SHA-256 hex digest of the archive.
+    """
+    path = Path(path)
+    if not path.is_file():
+        raise ValueError(f"ASPEN path invalid: {path}")
+    try:
+        return hash_archive(path)
+    except OSError as e:
+        raise ValueError(f"ASPEN archive unreadable: {path} ({e})")
+
+
+def read_aspen_path_config(file: str | Path):
+    """
+    Reads the ASPEN path from a JSON or TOML config file with an "aspen_path" key.
+
+    A relative path in the file is taken relative to the file's folder.
+
+    Args:
+        file (str | Path): The config file. Files ending in .toml are read as TOML, anything else as JSON.
+
+    Raises:
+        RuntimeError: If the file can't be parsed, or is TOML and tomllib (Python 3.11+) is not available.
+
+    Returns:
+        pathlib.Path: The path, or None if the file doesn't exist or has no "aspen_path".
+    """
+    file = Path(file)
+    if not file.is_file():
+        return None
+    try:
+        if file.suffix == ".toml":
+            try:
+                import tomllib
+            except ImportError:
+                raise RuntimeError("tomllib (Python 3.11+) is required to read TOML config files.")
+            with open(file, "rb") as config_file:
+                config = tomllib.load(config_file)
+        else:
+            with open(file, "r") as config_file:
+                config = json.load(config_file)
+    except (ValueError, OSError) as e:
+        raise RuntimeError(f"Unable to read ASPEN path from {file}: {e}")
+    if not config.get("aspen_path"):
+        return None
+    return file.parent / Path(config["aspen_path"])
+
+
+def resolve_aspen_path(config_files=ASPEN_PATH_FILES, argv=None):
+    """
+    Looks up the ASPEN path without asking anyone.
+
+    The sources are tried in order: the ASPEN_PATH environment variable, the config files, then the
+    --aspen-path command line argument.
+
+    Args:
+        config_files (iterable, optional): JSON or TOML config files to try, relative to the working folder.
+            Defaults to ASPEN_PATH_FILES.
+        argv (list, optional): The command line arguments. Defaults to None (sys.argv[1:]).
+
+    Returns:
+        tuple: (path, source) where path is a pathlib.Path and source describes where it came from, or
+            (None, None) if no source gives a path.
+    """
+    from argparse import ArgumentParser
+    
+    # Environment variable.
+    if os.environ.get(ASPEN_PATH_ENV):
+        return Path(os.environ[ASPEN_PATH_ENV]), f"the {ASPEN_PATH_ENV} environment variable"
+    
+    # Config files.
+    for file in config_files:
+        path = read_aspen_path_config(Path.cwd() / file)
+        if path is not None:
+            return path, str(file)
+    
+    # Command line. Unknown arguments belong to the caller's own parser.
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(ASPEN_PATH_ARG)
+    args, _ = parser.parse_known_args(argv)
+    if args.aspen_path:
+        return Path(args.aspen_path), f"the {ASPEN_PATH_ARG} argument"
+    return None, None
+
+
+def classify_block_status(status, message):
+    """
+    Classifies one block's run status as "converged", "warnings" or "errors".
+
+    The BLKSTAT code is looked up in BLOCK_STATUS and the BLKMSG text is checked for ASPEN's error and warning
+    markers. The worse of the two wins, so a message the code doesn't account for is not missed.
+
+    Args:
+        status: The block's BLKSTAT value. None means the block has no status, e.g. a hierarchy block or one
+            that is deactivated or never ran.
+        message: The block's BLKMSG value, or None.
+
+    Returns:
+        str: The health class.
+    """
+    # Only a present non-zero code is an error. A missing or unreadable status is worth a look, not a retry.
+    if status is None:
+        by_code = "warnings"
+    else:
+        try:
+            by_code = BLOCK_STATUS.get(int(status), "errors")
+        except (TypeError, ValueError):
+            by_code = "warnings"
+    text = str(message or "")
+    by_message = ("errors" if BLOCK_ERROR_PATTERN.search(text) else
+                  "warnings" if BLOCK_WARNING_PATTERN.search(text) else "converged")
+    return max(by_code, by_message, key=HEALTH_LEVELS.index)
+
+
+def kill_process_tree(pids, timeout: float=30.0):
+    """
+    Kills the given processes and every process they started, and waits for them to exit.
+
+    Args:
+        pids (iterable): The process IDs to kill.
+        timeout (float, optional): The longest to wait for the processes to exit, in seconds. Defaults to 30.
+
+    Returns:
+        list: The processes that were still alive after the timeout.
+    """
+    from psutil import Process, NoSuchProcess, wait_procs
+    
+    processes = []
+    for pid in pids:
+        try:
+            process = Process(pid)
+            processes.extend(process.children(recursive=True))
+            processes.append(process)
+        except NoSuchProcess:
+            pass
+    for process in processes:
+        try:
+            process.kill()
+        except NoSuchProcess:
+            pass
+    _, alive = wait_procs(processes, timeout=timeout)
+    return alive
 
 
 class ASPEN:
@@ -29,8 +267,70 @@ class ASPEN:
             Flag indicating whether the class is connected to ASPEN.
         err_flag : bool
             Flag indicating whether an error has occurred.
+        wait_timeout : float
+            The longest any lifecycle wait (engine stop, process exit) is allowed to take, in seconds.
+        poll_interval : float
+            The first polling interval of a lifecycle wait, in seconds.
+        poll_backoff : float
+            The factor the polling interval grows by after each unsuccessful poll.
+        _aspen_processes : list
+            The ASPEN processes that appeared when this instance dispatched ASPEN.
+        _dispatch_lock : multiprocessing.Lock
+            Held while dispatching so processes started by other instances aren't mistaken for this one's.
+        backend : Backend
+            Creates the document and moves it between threads. COM by default.
+        _engine_executor : concurrent.futures.ThreadPoolExecutor
+            The dedicated COM-apartment thread that runs the engine for run_aspen_future.
+        _run_cancelled : bool
+            Flag indicating whether the current run was stopped by cancel_run.
+        _run_future : concurrent.futures.Future
+            The future of the latest background run, so cancel_run can cancel it before it starts.
+        artifact_policy : str
+            Which autosave artifacts are written. One of ARTIFACT_POLICIES.
+        artifact_every : int
+            With the "every_n" policy, artifacts are written for every Nth run.
+        _artifact_writer : concurrent.futures.ThreadPoolExecutor
+            The background writer that moves staged artifacts into the log folder.
+        _artifact_staging : pathlib.Path
+            The local folder artifacts are written to before being moved by the background writer.
+        health_check : bool
+            Whether every block's status is scanned after each run.
+        last_health : dict
+            The block health scan of the last run, or None if it wasn't scanned.
+        result_cache : ResultCache
+            Memoizes run_case outputs, or None.
+        _applied_inputs : dict
+            Every input set on the loaded archive since it was loaded.
+        _archive_hash : str
+            The hash of the loaded archive, computed on first use.
+        _shared_archive_hash : str
+            A hash given at construction for the first archive connected to, or None once it has been used.
+        archive_cache : ArchiveCache
+            The cache the archive is staged into before loading, or None to load it in place.
+        _working_archive : pathlib.Path
+            The private copy of the archive that is loaded, or None when loading in place.
+        interactive : bool
+            Whether connect_to_aspen may open a file dialog when no path is given or configured.
+        timings : Timings
+            Per-stage timing spans, appended to 'timings.jsonl' in the log folder.
+        _flowsheet : FlowsheetIndex
+            The topology index, built on first use after connecting.
+        node_cache_hits : int
+            The number of node lookups answered from the node cache.
+        node_cache_misses : int
+            The number of node lookups that had to go to the Aspen tree.
+        node_errors : dict
+            Addresses that failed in the last set_node_values or get_node_values call, mapped to the reason.
+        _node_cache : dict
+            Node handles keyed by address string.
         __logger : logging.Logger
-            The logger instance for logging messages.
+            The logger instance for logging messages. Each instance has its own.
+        _log_queue : queue.Queue
+            The queue the logger puts records on.
+        _log_listener : logging.handlers.QueueListener
+            The listener writing this instance's records, or None when a shared queue was given.
+        _verbose : bool
+            Whether per-call chatter (e.g. "Trying to connect...", "Success!") is logged.
         __log_path : pathlib.Path
             The path to the log folder.
         aspen : win32com.client.CDispatch
@@ -47,20 +347,38 @@ class ASPEN:
             Sets the value of a node in the Aspen simulation using a string address.
         get_node_value(address):
             Gets the value of an address in the simulation.
+        set_node_values(mapping):
+            Sets the values of many nodes, logging the failures once.
+        get_node_values(addresses, as_array=False):
+            Gets the values of many nodes, logging the failures once.
+        _resolve_nodes(addresses):
+            Resolves every address to a node handle up front.
         find_node(address):
             Finds a node in the tree based on the given address.
+        clear_node_cache():
+            Drops every cached node handle.
+        node_cache_stats:
+            Returns the hit/miss counters and size of the node cache.
+        _cached_node(address, fetch):
+            Returns a node handle from the cache, fetching it on a miss.
         _get_logging():
-            Sets up logging for the current run.
+            Sets up queued logging for the current run.
+        _stop_logging():
+            Flushes and detaches this instance's log handlers.
         error(err_string):
             Logs an error message and sets the error flag.
         port_names():
             Prints a list of commonly used port names and their descriptions.
         block_list():
-            Retrieves a list of block names from the Aspen tree structure.
+            Retrieves a list of block names from the flowsheet index or the Aspen tree structure.
         stream_list():
-            Retrieves a list of stream names from the Aspen tree structure.
+            Retrieves a list of stream names from the flowsheet index or the Aspen tree structure.
+        flowsheet:
+            Returns the flowsheet topology index, building it on first use.
         stream_reconnect(disconnect_from, connect_to, stream_name, port_name):
             Reconnects a stream from one block to another.
+        rewire():
+            Returns a transaction that applies queued stream connections all or none.
         stream_disconnect(block_name, stream_name, port_name):
             Disconnects a stream from a specified block and port.
         stream_connect(block_name, stream_name, port_name):
@@ -91,27 +409,117 @@ class ASPEN:
             Retrieves the design specifications of a specified block.
         get_flowsheet_design_spec():
             Retrieves the design specifications of the flowsheet.
-        get_aspen_path_from_user():
+        get_aspen_path_from_user(save=False):
             Prompts the user to select an Aspen simulation file and logs the selected file path.
+        get_aspen_path_from_file(file=None):
+            Reads the ASPEN path from a JSON or TOML config file.
+        _write_aspen_path_to_file(file="path_param.json"):
+            Writes the ASPEN path to a JSON config file for the next run.
         reconnect_to_aspen(aspen_path=None):
             Reconnects to the ASPEN application using the specified path.
         connect_to_aspen(aspen_path=None):
             Connects to the ASPEN application using the specified path.
         get_block_run_status_message(block_name):
             Retrieves the run status message of a specified block.
-        run_aspen(autosave=True):
+        scan_block_health(document=None):
+            Reads every block's run status in one pass and classifies the run.
+        snapshot(paths=("Blocks", "Streams"), include=None, exclude=None, file=None, as_table=False):
+            Walks the Data tree once and collects every scalar leaf's address, value and units.
+        _walk_leaves(node, address, include, exclude, rows):
+            Recursively collects the scalar leaves below a node.
+        run_aspen(autosave=True, timeout=None):
             Runs the ASPEN simulation and optionally saves the results.
+        run_aspen_future(autosave=True):
+            Starts the simulation on the engine thread and returns a future.
+        run_aspen_async(autosave=True, timeout=None):
+            Runs the simulation without blocking the event loop.
+        cancel_run():
+            Stops the running simulation.
+        _wait_for_stop(future):
+            Waits for a cancelled background run, killing ASPEN if it ignores the stop.
+        _relaunch_if_killed():
+            Dispatches a new ASPEN if a run that ignored the stop had it killed.
+        _run_aspen(document, autosave):
+            Runs the simulation on the given COM document.
+        _run_aspen_on_engine_thread(stream, autosave):
+            Runs the simulation on the engine thread.
+        flush_artifacts():
+            Waits for the background writer to finish moving artifacts.
+        _artifacts_to_save(failed, health=None):
+            Decides which artifacts the artifact policy wants for this run.
+        _save_artifacts(document, failed, health=None):
+            Saves the artifacts for this run, in the background if enabled.
+        _move_artifacts(source, destination):
+            Moves staged artifacts into the log folder.
+        reset_aspen(reload=False):
+            Resets the simulation between cases without dispatching a new ASPEN instance.
+        run_case(inputs, outputs=(), autosave=False, timeout=None):
+            Sets the inputs, runs the simulation and reads back the outputs, using the result cache if set.
+        _release_working_archive():
+            Removes the working copy of the archive, if one was checked out.
+        archive_hash:
+            Returns the hash of the loaded archive.
+        aspen_pids:
+            Returns the IDs of the ASPEN processes this instance started.
+        write_metrics():
+            Writes the timing histograms to 'metrics.prom' in the log folder.
+        _dispatch_aspen():
+            Dispatches a new document from the backend.
+        _wait_for(condition, description, timeout=None):
+            Polls a condition with backoff until it holds or the timeout expires.
+        _wait_for_processes(processes, description, timeout=None):
+            Waits for processes to exit.
+        _find_aspen_processes():
+            Lists the running ASPEN processes.
         _kill_aspen():
             Terminates the ASPEN application.
+        _quit_or_kill_aspen():
+            Quits this instance's ASPEN, or kills its processes if there is no instance.
     """
     
-    def __init__(self, log_folder: str=None):
+    def __init__(self, log_folder: str=None, wait_timeout: float=30.0, poll_interval: float=0.05,
+                 poll_backoff: float=1.5, artifact_policy: str="all", artifact_every: int=1,
+                 background_artifacts: bool=False, result_cache: str | Path | ResultCache=None, log_queue=None,
+                 verbose: bool=True, dispatch_lock=None, backend: Backend=None, interactive: bool=False,
+                 archive_hash: str=None, archive_cache: str | Path | ArchiveCache=None, health_check: bool=False):
         """
         Initialize an instance of the class and sets up the logger.
 
         Args:
             log_folder (str, optional): The path to the folder where log files will be stored.
                 If not provided, defaults to 'ASPEN Simulation Run Log'.
+            wait_timeout (float, optional): The longest a lifecycle wait may take, in seconds. Defaults to 30.
+            poll_interval (float, optional): The first polling interval, in seconds. Defaults to 0.05.
+            poll_backoff (float, optional): The growth factor of the polling interval. Defaults to 1.5.
+            artifact_policy (str, optional): Which autosave artifacts to write: "all", "none", "failures",
+                "every_n" or "reports". Defaults to "all".
+            artifact_every (int, optional): With "every_n", write artifacts for every Nth run. Defaults to 1.
+            background_artifacts (bool, optional): Stage artifacts locally and move them into the log folder
+                on a background thread. Defaults to False.
+            result_cache (str | Path | ResultCache, optional): Memoizes run_case outputs. A path opens a
+                ResultCache with default settings. Defaults to None (no memoization).
+            log_queue (queue.Queue | multiprocessing.Queue, optional): A shared queue served by a listener
+                from start_log_listener, e.g. one per sweep. Defaults to None (this instance starts its own).
+            verbose (bool, optional): Log per-call chatter such as "Trying to connect..." and "Success!".
+                Set to False in production. Defaults to True.
+            dispatch_lock (multiprocessing.Lock, optional): A lock shared by every instance on the machine. Held
+                while dispatching so the new ASPEN process can be told apart from other instances'. Defaults to
+                None (no other instance dispatches at the same time).
+            backend (Backend, optional): What to talk to, e.g. backends.SimulatedBackend to run without ASPEN.
+                Defaults to None (backends.ComBackend, i.e. ASPEN Plus over COM).
+            interactive (bool, optional): Let connect_to_aspen fall back to a file dialog when no path is given
+                or configured. Never set this for workers, where nobody would see the dialog. Defaults to False.
+            archive_hash (str, optional): The hash of the first archive this instance connects to, when it is
+                already known, e.g. hashed once for a whole sweep. Defaults to None (hashed on first use).
+            archive_cache (str | Path | ArchiveCache, optional): Load a private local copy of the archive from
+                this cache instead of the archive itself. Saves go to the copy. A path opens an ArchiveCache
+                there. Defaults to None (the archive is loaded where it is).
+            health_check (bool, optional): Scan every block's status after each run. A run with block errors
+                raises ConvergenceError (so pools retry it) and its artifacts are only saved under the "failures"
+                policy. Defaults to False.
+
+        Raises:
+            ValueError: If the artifact policy is not recognised.
         """
         # Set log folder name. Handle default case. 
         if log_folder is None: log_folder = 'ASPEN Simulation Run Log'
@@ -126,8 +534,68 @@ class ASPEN:
         self._connected_to_aspen = False
         self.err_flag = False
         
+        # Lifecycle waits poll until the state changes instead of sleeping for a fixed time.
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.poll_backoff = poll_backoff
+        self._aspen_processes = []
+        self._dispatch_lock = dispatch_lock
+        self.backend = ComBackend() if backend is None else backend
+        
+        # The engine thread is only started when a run is made in the background.
+        self._engine_executor = None
+        self._run_cancelled = False
+        self._run_future = None
+        
+        # Autosave artifacts. The writer and staging folder are only created when first needed.
+        if artifact_policy not in ARTIFACT_POLICIES:
+            raise ValueError(f"Unknown artifact policy: {artifact_policy}. Use one of {ARTIFACT_POLICIES}")
+        self.artifact_policy = artifact_policy
+        self.artifact_every = artifact_every
+        self._background_artifacts = background_artifacts
+        self._artifact_writer = None
+        self._artifact_staging = None
+        
+        # Block health scan after each run.
+        self.health_check = health_check
+        self.last_health = None
+        
+        # Memoization. The key covers every input applied since the archive was loaded.
+        if result_cache is not None and not isinstance(result_cache, ResultCache):
+            result_cache = ResultCache(result_cache)
+        self.result_cache = result_cache
+        self._applied_inputs = {}
+        self._archive_hash = None
+        self._shared_archive_hash = archive_hash
+        
+        # Archive staging. The working copy is removed once ASPEN has quit.
+        if archive_cache is not None and not isinstance(archive_cache, ArchiveCache):
+            archive_cache = ArchiveCache(archive_cache)
+        self.archive_cache = archive_cache
+        self._working_archive = None
+        
+        # Path resolution. The file dialog is only used when asked for.
+        self.interactive = interactive
+        self.aspen_path = None
+        self.aspen = None
+        
+        # Node handles keyed by address. Each lookup is a COM round trip, so they are reused until the tree changes.
+        self._node_cache = {}
+        self.node_cache_hits = 0
+        self.node_cache_misses = 0
+        self.node_errors = {}
+        
+        # Topology index. Built on first use and updated by stream_connect/stream_disconnect.
+        self._flowsheet = None
+        
         # Setup the logger.
+        self._log_queue = log_queue
+        self._log_listener = None
+        self._verbose = verbose
         self._get_logging()
+        
+        # Per-stage timings live next to the log file.
+        self.timings = Timings(self.__log_path / 'timings.jsonl')
 
     def __enter__(self):
         """
@@ -148,26 +616,35 @@ class ASPEN:
             traceback (_type_): Traceback of exception. None when code executes normally.
         """
         # If ASPEN is running, stop the engine before quitting
-        if self._aspen_is_running:
+        if self._aspen_is_running and self.aspen is not None:
             self.aspen.Engine.Stop()
             self.error("Something went wrong! Stopping ASPEN...")
-            time.sleep(5)
+            self._wait_for(lambda: not getattr(self.aspen.Engine, "IsRunning", False), "the ASPEN engine to stop")
+        
+        # Stop the engine thread if one was started.
+        if self._engine_executor is not None:
+            self._engine_executor.shutdown(wait=True)
+            self._engine_executor = None
+        
+        # Let the background writer finish moving artifacts, then remove the staging folder.
+        self.flush_artifacts()
+        if self._artifact_staging is not None:
+            shutil.rmtree(self._artifact_staging, ignore_errors=True)
+            self._artifact_staging = None
         
-        # Kill the ASPEN instance.
+        # Kill the ASPEN instance, then remove its working copy of the archive.
         self._kill_aspen()
+        self._release_working_archive()
+        
+        # Write the timing histograms for this instance.
+        self.write_metrics()
         
         # If exit due to an exception, log the exception.
         if exc_type is not None:
             self.error(f"Exception: {exc_type} {exc_value} {traceback}")
         
-        # Clear the logger.  
-        try:
-            self.__logger.handlers.clear()
-        except AttributeError:
-            pass
-        
-        # Shutdown logging.
-        logging.shutdown()
+        # Flush and detach this instance's logging. Other instances' loggers are left alone.
+        self._stop_logging()
     
     def set_node_value(self, address: str, value: float):
         """
@@ -184,6 +661,7 @@ class ASPEN:
             self.error(f"Unable to set the value for this address: {address}")
             return None
         node.Value = value
+        self._applied_inputs[address] = value
         return 0
     
     def get_node_value(self, address: str):
@@ -202,6 +680,97 @@ class ASPEN:
             return None
         return node.Value
     
+    def set_node_values(self, mapping: dict):
+        """
+        Sets the values of many nodes, collecting the failures instead of logging each one.
+
+        Every address is resolved before any value is pushed. Each value is still one COM call, as with
+        set_node_value, since ASPEN has no bulk value call. Failures are collected into node_errors and logged
+        once instead of once per address.
+
+        Args:
+            mapping (dict): Mapping of Variable Explorer addresses to the values to set.
+
+        Returns:
+            dict: Mapping of each address that could not be set to the reason. Empty if all were set.
+        """
+        nodes, errors = self._resolve_nodes(mapping)
+        
+        # Push every value, keeping the failures for one report.
+        for address, node in nodes.items():
+            try:
+                node.Value = mapping[address]
+            except Exception as e:
+                errors[address] = repr(e)
+                continue
+            self._applied_inputs[address] = mapping[address]
+        
+        self.node_errors = errors
+        if errors:
+            self.error(f"Unable to set {len(errors)} of {len(mapping)} values: {list(errors)}")
+        return errors
+    
+    def get_node_values(self, addresses, as_array: bool=False):
+        """
+        Gets the values of many nodes, collecting the failures instead of logging each one.
+
+        Every address is resolved before any value is pulled. Each value is still one COM call, as with
+        get_node_value, since ASPEN has no bulk value call. Failures are collected into node_errors and logged
+        once instead of once per address.
+
+        Args:
+            addresses (iterable): The string addresses.
+            as_array (bool, optional): Return a NumPy float array in address order instead of a dict.
+                Failed addresses become NaN. Defaults to False.
+
+        Returns:
+            dict/numpy.ndarray: The value of each address, None (or NaN) where unsuccessful.
+        """
+        addresses = list(addresses)
+        nodes, errors = self._resolve_nodes(addresses)
+        
+        # Pull every value, keeping the failures for one report.
+        values = dict.fromkeys(addresses)
+        for address, node in nodes.items():
+            try:
+                values[address] = node.Value
+            except Exception as e:
+                errors[address] = repr(e)
+        
+        self.node_errors = errors
+        if errors:
+            self.error(f"Unable to get {len(errors)} of {len(addresses)} values: {list(errors)}")
+        
+        if as_array:
+            import numpy as np
+            return np.array([np.nan if values[address] is None else values[address] for address in addresses],
+                            dtype=float)
+        return values
+    
+    def _resolve_nodes(self, addresses):
+        """
+        Resolves every address to a node handle up front, without logging each failure.
+
+        Args:
+            addresses (iterable): The string addresses.
+
+        Returns:
+            tuple: (nodes, errors) where nodes maps addresses to handles and errors maps
+                unresolved addresses to the reason.
+        """
+        nodes, errors = {}, {}
+        for address in addresses:
+            try:
+                node = self._cached_node(address, lambda: self.aspen.Tree.FindNode(address))
+            except AttributeError as e:
+                errors[address] = repr(e)
+                continue
+            if node is None:
+                errors[address] = "Address not found"
+            else:
+                nodes[address] = node
+        return nodes, errors
+    
     def find_node(self, address: str):
         """
         Finds a node in the tree based on the given address.
@@ -213,11 +782,57 @@ class ASPEN:
             Node: The node if found, otherwise None.
         """
         try:
-            return self.aspen.Tree.FindNode(address)
+            return self._cached_node(address, lambda: self.aspen.Tree.FindNode(address))
         except AttributeError:
             self.error(f"Could not find that address: {address}")
             return None
     
+    def clear_node_cache(self):
+        """
+        Drops every cached node handle. Call this whenever the tree may have changed.
+
+        Returns:
+            None
+        """
+        self._node_cache.clear()
+    
+    @property
+    def node_cache_stats(self):
+        """
+        Returns the hit/miss counters and size of the node cache.
+
+        Returns:
+            dict: The hits, misses and number of cached handles.
+        """
+        return {
+            "hits": self.node_cache_hits,
+            "misses": self.node_cache_misses,
+            "size": len(self._node_cache)
+        }
+    
+    def _cached_node(self, address: str, fetch):
+        """
+        Returns a node handle from the cache, fetching it from the tree on a miss.
+
+        Args:
+            address (str): The address used as the cache key.
+            fetch (callable): Fetches the node from the tree. Only called on a miss.
+
+        Returns:
+            Node: The node, or None if fetch returned None. None is not cached.
+        """
+        node = self._node_cache.get(address)
+        if node is not None:
+            self.node_cache_hits += 1
+            return node
+        
+        # Go to the tree and remember the handle for next time.
+        self.node_cache_misses += 1
+        node = fetch()
+        if node is not None:
+            self._node_cache[address] = node
+        return node
+    
     def _get_logging(self):
         """
         Sets up logging for the current run, ensuring no directory collisions and creating necessary directories and loggers.
@@ -245,24 +860,42 @@ class ASPEN:
             if not path.exists():
                 path.mkdir()
         
-        # Create a new logger for this file.
-        self.__logger = logging.getLogger(__name__)
+        # Create a new logger for this instance. The log folder name is unique within the process.
+        self.__logger = logging.getLogger(f"{__name__}.{self.__log_path.name}")
         self.__logger.propagate = False
         
-        # Set formatter and handlers. 
-        format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        console = logging.StreamHandler(stdout)
-        file = logging.FileHandler(filename=self.__log_path/'Simulation Log File.log')
-        
-        # Setup Logger.
-        self.__logger.setLevel(logging.INFO)
-        console.setFormatter(format)
-        file.setFormatter(format)
-        self.__logger.addHandler(console)
-        self.__logger.addHandler(file)
+        # Records go on a queue. A listener thread does the console and file I/O.
+        if self._log_queue is None:
+            self._log_queue, self._log_listener = start_log_listener(self.__log_path/'Simulation Log File.log')
+        
+        # Setup Logger. Per-call chatter is logged at DEBUG so it can be dropped.
+        self.__logger.setLevel(logging.DEBUG if self._verbose else logging.INFO)
+        self.__logger.addHandler(QueueHandler(self._log_queue))
         self.log = self.__logger.info
+        self.debug = self.__logger.debug
         self.log(f'Logging started. Log folder path: {str(self.__log_path)}')
     
+    def _stop_logging(self):
+        """
+        Flushes and detaches this instance's log handlers, stopping its listener if it owns one.
+
+        Returns:
+            None
+        """
+        try:
+            for handler in self.__logger.handlers:
+                handler.close()
+            self.__logger.handlers.clear()
+        except AttributeError:
+            pass
+        
+        # Stopping the listener writes out any queued records.
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            for handler in self._log_listener.handlers:
+                handler.close()
+            self._log_listener = None
+    
     def error(self, err_string):
         """
         Logs an error message and sets the error flag.
@@ -316,6 +949,9 @@ class ASPEN:
         Returns:
             list: A list of block names if successful, otherwise None.
         """
+        # Use the flowsheet index if it has been built.
+        if self._flowsheet is not None:
+            return list(self._flowsheet.blocks)
         try:
             # Generate a list of block names from the Aspen tree structure.
             return [item.Name for item in self.aspen.Tree.Elements("Data").Elements("Blocks").Elements]
@@ -332,6 +968,9 @@ class ASPEN:
         Returns:
             list: A list of stream names if successful, otherwise None.
         """
+        # Use the flowsheet index if it has been built.
+        if self._flowsheet is not None:
+            return sorted(self._flowsheet.streams)
         try:
             # Generate a list of stream names from the Aspen tree structure.
             return [item.Name for item in self.aspen.Tree.Elements("Data").Elements("Streams").Elements]
@@ -340,6 +979,20 @@ class ASPEN:
             self.error("Unable to output list of streams. Attribute Error.")
             return None
     
+    @property
+    def flowsheet(self):
+        """
+        Returns the flowsheet topology index, walking the blocks, streams and ports on first use.
+
+        Returns:
+            FlowsheetIndex: The index.
+        """
+        if self._flowsheet is None:
+            with self.timings.span("flowsheet_index"):
+                self._flowsheet = FlowsheetIndex.from_tree(self.aspen.Tree)
+            self.log(f"Flowsheet indexed: {len(self._flowsheet.blocks)} blocks, {len(self._flowsheet.streams)} streams.")
+        return self._flowsheet
+    
     def stream_reconnect(self, disconnect_from, connect_to, stream_name, port_name):
         """
         Reconnects a stream from one block to another.
@@ -351,19 +1004,42 @@ class ASPEN:
             port_name (str): The port name used for the connection.
 
         Returns:
-            int: The result of the disconnection and reconnection operations.
+            int: 0 if the reconnection is successful, -1 if an error occurs. The flowsheet is left unchanged on error.
         """
-        # Disconnect the stream from the specified block.
-        result = self.stream_disconnect(disconnect_from, stream_name, port_name)
-        
-        # Connect the stream to the new block.
-        result += self.stream_connect(connect_to, stream_name, port_name)
+        try:
+            # Disconnect and connect in one transaction so a failure can't leave the stream half-moved.
+            with self.rewire() as tx:
+                tx.reconnect(disconnect_from, connect_to, stream_name, port_name)
+        except (ValueError, RuntimeError) as e:
+            self.error(f"Unable to reconnect {stream_name} from {disconnect_from} to {connect_to}: {e}")
+            return -1
         
         # Log the reconnection operation.
         self.log(f"Reconnected {stream_name} from {disconnect_from} to {connect_to}")
         
-        # Return the result of the operations.
-        return result
+        # Return 0 to indicate success.
+        return 0
+    
+    def rewire(self):
+        """
+        Returns a transaction that queues stream connections and disconnections and applies them all or none.
+
+        The operations are validated against the flowsheet index when the with block exits, then applied
+        with each block fetched once. If any step fails, the applied steps are undone. If the with block
+        raises, nothing is applied.
+
+            with aspen.rewire() as tx:
+                tx.disconnect("B1", "S3", "F(IN)")
+                tx.connect("B2", "S3", "F(IN)")
+
+        Raises:
+            ValueError: On exit, if an operation is invalid. Nothing is applied.
+            RuntimeError: On exit, if a step fails in Aspen. The flowsheet is rolled back.
+
+        Returns:
+            RewireTransaction: The transaction.
+        """
+        return RewireTransaction(self)
     
     def stream_disconnect(self, block_name, stream_name, port_name):
         """
@@ -381,7 +1057,7 @@ class ASPEN:
         block = self._fetch_block(block_name)
         
         # Log the attempt to disconnect the stream.
-        self.log(f"Trying to connect {stream_name} to {block_name}")
+        self.debug(f"Trying to connect {stream_name} to {block_name}")
         
         try:
             # Attempt to remove the stream from the specified port.
@@ -397,8 +1073,13 @@ class ASPEN:
             # Return -1 to indicate failure.
             return -1
         
+        # The flowsheet changed, so cached handles may be stale. Keep the topology index in step.
+        self.clear_node_cache()
+        if self._flowsheet is not None:
+            self._flowsheet.disconnect(block_name, stream_name, port_name)
+        
         # Log a success message if the disconnection is successful.
-        self.log(f"Success!")
+        self.debug(f"Success!")
         
         # Return 0 to indicate success.
         return 0
@@ -419,7 +1100,7 @@ class ASPEN:
         block = self._fetch_block(block_name)
         
         # Log the attempt to connect the stream.
-        self.log(f"Trying to connect {stream_name} to {block_name}")
+        self.debug(f"Trying to connect {stream_name} to {block_name}")
         
         try:
             # Attempt to add the stream to the specified port.
@@ -435,8 +1116,13 @@ class ASPEN:
             # Return -1 to indicate failure.
             return -1
         
+        # The flowsheet changed, so cached handles may be stale. Keep the topology index in step.
+        self.clear_node_cache()
+        if self._flowsheet is not None:
+            self._flowsheet.connect(block_name, stream_name, port_name)
+        
         # Log a success message if the connection is successful.
-        self.log(f"Success!")
+        self.debug(f"Success!")
         
         # Return 0 to indicate success.
         return 0
@@ -452,8 +1138,11 @@ class ASPEN:
             Block: The block if found, otherwise None.
         """
         try:
-            # Attempt to retrieve the block from the Aspen tree structure.
-            return self.aspen.Tree.Elements("Data").Elements("Blocks").Elements(block_name)
+            # Attempt to retrieve the block from the cache or the Aspen tree structure.
+            return self._cached_node(
+                f"\\Data\\Blocks\\{block_name}",
+                lambda: self.aspen.Tree.Elements("Data").Elements("Blocks").Elements(block_name)
+            )
         except AttributeError:
             # Log an error message if the block does not exist.
             self.log(f"This block {block_name} doesn't exist!")
@@ -470,8 +1159,11 @@ class ASPEN:
             Stream: The stream if found, otherwise None.
         """
         try:
-            # Attempt to retrieve the stream from the Aspen tree structure.
-            return self.aspen.Tree.Elements("Data").Elements("Streams").Elements(stream_name)
+            # Attempt to retrieve the stream from the cache or the Aspen tree structure.
+            return self._cached_node(
+                f"\\Data\\Streams\\{stream_name}",
+                lambda: self.aspen.Tree.Elements("Data").Elements("Streams").Elements(stream_name)
+            )
         except AttributeError:
             # Log an error message if the stream does not exist.
             self.log(f"This stream {stream_name} doesn't exist!")
@@ -606,19 +1298,26 @@ class ASPEN:
             self.log("Unable to get Calculator Block")
             return None
 
-    def save_aspen_file(self):
+    def save_aspen_file(self, grace_period: float=0):
         """
         Saves the current Aspen file, with a warning about overwriting the current file.
 
+        Args:
+            grace_period (float, optional): Seconds to wait after the warning so the save can be aborted.
+                Defaults to 0.
+
         Returns:
             None
         """
         # Log a warning message about overwriting the current file.
         self.log("This will overwrite the current file. Use this carefully!")
-        # Wait for 10 seconds before saving the file.
-        time.sleep(10)
+        # Give the user a chance to abort only when asked to.
+        if grace_period:
+            time.sleep(grace_period)
         # Save the current Aspen file.
+        start_time = time.time()
         self.aspen.Save()
+        self.log(f"Saved. Time taken: {time.time() - start_time} seconds")
 
     def get_block_design_spec(self, block_name):
         """
@@ -656,13 +1355,19 @@ class ASPEN:
             self.log("Unable to get Design Specs")
             return None
 
-    def get_aspen_path_from_user(self):
+    def get_aspen_path_from_user(self, save: bool=False):
         """
         Prompts the user to select an Aspen simulation file and logs the selected file path.
 
+        Args:
+            save (bool, optional): Write the selected path to 'path_param.json' so later runs find it without
+                asking. Defaults to False.
+
         Returns:
             None
         """
+        from tkinter import Tk, filedialog
+        
         # Create a Tkinter root window.
         root = Tk()
         try:
@@ -677,6 +1382,46 @@ class ASPEN:
         finally:
             # Ensure the window is destroyed and prevent crashes even if the user cancels input.
             root.destroy()
+        if save and self.aspen_path:
+            self._write_aspen_path_to_file()
+
+    def get_aspen_path_from_file(self, file: str | Path=None):
+        """
+        Reads the ASPEN path from a JSON or TOML config file with an "aspen_path" key.
+
+        Args:
+            file (str | Path, optional): The config file. Defaults to None (the first of ASPEN_PATH_FILES in the
+                working folder that gives a path).
+
+        Raises:
+            RuntimeError: If no config file gives a path.
+
+        Returns:
+            None
+        """
+        files = ASPEN_PATH_FILES if file is None else (file,)
+        for file in files:
+            path = read_aspen_path_config(Path.cwd() / file)
+            if path is not None:
+                self.aspen_path = path
+                self.log(f"File read from {file}: {path}")
+                return
+        raise RuntimeError(f"Unable to read ASPEN path from {', '.join(map(str, files))}.")
+
+    def _write_aspen_path_to_file(self, file: str | Path="path_param.json"):
+        """
+        Writes the ASPEN path to a JSON config file, where connect_to_aspen finds it on the next run.
+
+        Args:
+            file (str | Path, optional): The config file, relative to the working folder. Defaults to
+                'path_param.json'.
+
+        Returns:
+            None
+        """
+        with open(Path.cwd() / file, "w") as json_file:
+            json.dump({"aspen_path": str(Path(self.aspen_path).resolve())}, json_file, indent=4)
+        self.log(f"File path written to {file}. connect_to_aspen reads it when no path is given.")
     
     def reconnect_to_aspen(self, aspen_path: str | WindowsPath=None):
         """
@@ -693,8 +1438,9 @@ class ASPEN:
             self.log("Not connected to ASPEN. Cannot reconnect.")
             return
         
-        # Kill the current ASPEN instance.
+        # Kill the current ASPEN instance. Its node handles die with it.
         self._kill_aspen()
+        self.clear_node_cache()
         
         # Connect to ASPEN using the specified path.
         self.connect_to_aspen(aspen_path)
@@ -706,12 +1452,30 @@ class ASPEN:
         """
         Connects to the ASPEN application using the specified path.
 
+        Without a path, the path is looked up in the ASPEN_PATH environment variable, then the config files
+        ('path_param.json', 'aspenpy.toml'), then the --aspen-path argument. The file dialog is only shown if
+        none of them gives a path and the instance is interactive.
+
         Args:
             aspen_path (str | WindowsPath, optional): The path to the ASPEN file. Defaults to None.
 
+        Raises:
+            ValueError: If the path does not exist, or no path was found and the instance isn't interactive.
+
         Returns:
             None
         """
+        # Look the path up if none is provided. Never block a headless worker on a dialog.
+        if aspen_path is None:
+            aspen_path, source = resolve_aspen_path()
+            if aspen_path is not None:
+                self.log(f"ASPEN path from {source}: {aspen_path}")
+            elif not self.interactive:
+                self.error("No ASPEN path given or configured.")
+                raise ValueError(f"No ASPEN path given. Pass one, set {ASPEN_PATH_ENV}, add aspen_path to "
+                                 f"{' or '.join(ASPEN_PATH_FILES)}, or pass {ASPEN_PATH_ARG}. "
+                                 f"Use interactive=True to choose it in a dialog.")
+        
         # Check if a path is provided.
         if aspen_path is not None:
             # Convert string path to Path object if necessary.
@@ -730,20 +1494,136 @@ class ASPEN:
         self.log("Dispatching ASPEN instance.")
         start_time = time.time()
         
-        # Dispatch the ASPEN instance.
-        self.aspen = win32.gencache.EnsureDispatch('Apwn.Document')
+        # Dispatch the ASPEN instance. Any ASPEN process that appears during dispatch belongs to this instance.
+        with self._dispatch_lock or nullcontext():
+            existing = {process.pid for process in self._find_aspen_processes()}
+            with self.timings.span("dispatch"):
+                self.aspen = self._dispatch_aspen()
+            self._aspen_processes = [process for process in self._find_aspen_processes() if process.pid not in existing]
+        self.log(f"ASPEN process IDs: {self.aspen_pids}")
         self.log(f"ASPEN instance dispatched. Time taken: {time.time() - start_time} seconds")
         
         start_time = time.time()
         self.log("Connecting to the ASPEN file.")
         
-        # Connect to the ASPEN file.
-        self.aspen.InitFromArchive2(Path(self.aspen_path))
+        # Connect to the ASPEN file. Handles, inputs and topology from any previous archive are no longer valid.
+        self.clear_node_cache()
+        self._flowsheet = None
+        self._applied_inputs = {}
+        # A hash shared by the sweep is for the first archive only. Later archives are hashed on first use.
+        self._archive_hash, self._shared_archive_hash = self._shared_archive_hash, None
+        self._release_working_archive()
+        if self.archive_cache is not None:
+            # Load a private local copy, so no other instance reads or saves the same file.
+            with self.timings.span("archive_stage"):
+                self._working_archive = self.archive_cache.checkout(self.aspen_path, self.archive_hash)
+        with self.timings.span("archive_load"):
+            self.aspen.InitFromArchive2(Path(self._working_archive or self.aspen_path))
         self.log(f"Connected. Time taken: {time.time() - start_time} seconds")
         
         # Set the connection flag.
         self._connected_to_aspen = True
 
+    def snapshot(self, paths=("Blocks", "Streams"), include=None, exclude=None, file: str | Path=None,
+                 as_table: bool=False):
+        """
+        Walks the Data tree once and collects the address, value and units of every scalar leaf.
+
+        Globs are matched against the full address, e.g. "\\Data\\Streams\\*\\Output\\*". A subtree
+        whose address matches an exclude glob is not walked at all, which saves the COM round trips.
+
+        Args:
+            paths (iterable, optional): Folders under Data to walk. Defaults to ("Blocks", "Streams").
+            include (iterable, optional): Only keep leaves matching one of these globs. Defaults to None (all).
+            exclude (iterable, optional): Skip leaves and subtrees matching any of these globs. Defaults to None.
+            file (str | Path, optional): Also write the snapshot here. A .parquet file needs pyarrow,
+                anything else is written as CSV. Defaults to None.
+            as_table (bool, optional): Return a pyarrow Table instead of a list. Defaults to False.
+
+        Raises:
+            RuntimeError: If a Parquet file or Arrow table is requested and pyarrow is not installed.
+
+        Returns:
+            list/pyarrow.Table: One row per leaf with "address", "value" and "units".
+        """
+        include = list(include) if include is not None else None
+        exclude = list(exclude) if exclude is not None else []
+        rows = []
+        with self.timings.span("snapshot"):
+            data = self.aspen.Tree.Elements("Data")
+            for name in paths:
+                try:
+                    node = data.Elements(name)
+                except Exception:
+                    self.error(f"Snapshot path does not exist: {name}")
+                    continue
+                self._walk_leaves(node, f"\\Data\\{name}", include, exclude, rows)
+        self.log(f"Snapshot collected {len(rows)} values.")
+        
+        # Arrow is only needed for Parquet files and tables.
+        table = None
+        if as_table or (file is not None and Path(file).suffix == ".parquet"):
+            try:
+                import pyarrow as pa
+            except ImportError:
+                raise RuntimeError("pyarrow is required for Parquet snapshots and Arrow tables.")
+            # Arrow columns need one type, so numbers and text go in separate columns.
+            numeric = [isinstance(row["value"], (int, float)) and not isinstance(row["value"], bool) for row in rows]
+            table = pa.table({
+                "address": [row["address"] for row in rows],
+                "value": [float(row["value"]) if is_number else None for row, is_number in zip(rows, numeric)],
+                "text": [None if is_number or row["value"] is None else str(row["value"])
+                         for row, is_number in zip(rows, numeric)],
+                "units": [row["units"] for row in rows]
+            })
+        
+        if file is not None:
+            if Path(file).suffix == ".parquet":
+                import pyarrow.parquet as pq
+                pq.write_table(table, file)
+            else:
+                with open(file, "w", newline="") as csv_file:
+                    writer = csv.DictWriter(csv_file, fieldnames=("address", "value", "units"))
+                    writer.writeheader()
+                    writer.writerows(rows)
+        return table if as_table else rows
+
+    def _walk_leaves(self, node, address: str, include, exclude, rows: list):
+        """
+        Recursively collects the scalar leaves below a node.
+
+        Args:
+            node (Node): The node to walk.
+            address (str): The address of the node.
+            include (list): Globs a leaf must match one of, or None.
+            exclude (list): Globs that skip a leaf or a whole subtree.
+            rows (list): Collected rows are appended here.
+
+        Returns:
+            None
+        """
+        if any(fnmatchcase(address, pattern) for pattern in exclude):
+            return
+        
+        # A scalar leaf has dimension 0, or failing that no children.
+        try:
+            is_leaf = node.Dimension == 0
+        except AttributeError:
+            is_leaf = node.Elements.Count == 0
+        
+        if not is_leaf:
+            for child in node.Elements:
+                self._walk_leaves(child, f"{address}\\{child.Name}", include, exclude, rows)
+            return
+        
+        if include is not None and not any(fnmatchcase(address, pattern) for pattern in include):
+            return
+        try:
+            value = node.Value
+        except Exception:
+            value = None
+        rows.append({"address": address, "value": value, "units": getattr(node, "UnitString", None)})
+
     def get_block_run_status_message(self, block_name):
         """
         Retrieves the run status message of a specified block.
@@ -763,36 +1643,562 @@ class ASPEN:
                 "message": block.Elements("Output").Elements("BLKMSG").Value
             }
 
-    def run_aspen(self, autosave: bool=True):
+    def scan_block_health(self, document=None):
+        """
+        Reads BLKSTAT and BLKMSG for every block in one pass and classifies the run.
+
+        Block names come from the flowsheet index. On the thread that connected, the status nodes are resolved
+        once and cached like any other address, so later scans only read values. Another thread's document is
+        read with one FindNode per address, since cached handles can't cross COM apartments.
+
+        Args:
+            document (win32com.client.CDispatch, optional): The document to scan. Defaults to None (self.aspen).
+
+        Returns:
+            dict: "status" ("converged", "warnings" or "errors"), the "errors" and "warnings" block names, and
+                "messages" mapping every block that didn't converge cleanly to its BLKMSG.
+        """
+        addresses = {
+            name: (f"\\Data\\Blocks\\{name}\\Output\\BLKSTAT", f"\\Data\\Blocks\\{name}\\Output\\BLKMSG")
+            for name in self.flowsheet.blocks
+        }
+        flat = [address for pair in addresses.values() for address in pair]
+        if document is None or document is self.aspen:
+            values = self.get_node_values(flat)
+        else:
+            values = {}
+            for address in flat:
+                node = document.Tree.FindNode(address)
+                values[address] = None if node is None else node.Value
+        
+        health = {"status": "converged", "errors": [], "warnings": [], "messages": {}}
+        for name, (status, message) in addresses.items():
+            level = classify_block_status(values[status], values[message])
+            if level == "converged":
+                continue
+            health[level].append(name)
+            health["messages"][name] = values[message]
+            health["status"] = max(health["status"], level, key=HEALTH_LEVELS.index)
+        return health
+
+    def run_aspen(self, autosave: bool=True, timeout: float=None):
         """
         Runs the ASPEN simulation and optionally saves the results.
 
         Args:
             autosave (bool, optional): Whether to autosave the results. Defaults to True.
+            timeout (float, optional): Wall-clock limit in seconds. The run is stopped and TimeoutError
+                raised when it is exceeded. Defaults to None (no limit).
+
+        Raises:
+            TimeoutError: If the run exceeded the timeout.
+
+        Returns:
+            None
+        """
+        if timeout is None:
+            self._run_cancelled = False
+            self._run_aspen(self.aspen, autosave)
+            return
+        
+        # Run on the engine thread so this thread can enforce the timeout.
+        future = self.run_aspen_future(autosave)
+        try:
+            future.result(timeout)
+        except FutureTimeoutError:
+            self.cancel_run()
+            self._wait_for_stop(future)
+            self.error(f"ASPEN run exceeded the {timeout} second timeout and was stopped.")
+            raise TimeoutError(f"ASPEN run exceeded {timeout} seconds")
+
+    def run_aspen_future(self, autosave: bool=True):
+        """
+        Starts the simulation on the dedicated engine thread and returns immediately.
+
+        The calling thread stays free to post-process the previous case or to call cancel_run.
+
+        Args:
+            autosave (bool, optional): Whether to autosave the results. Defaults to True.
+
+        Returns:
+            concurrent.futures.Future: Resolves to None when the run finishes, or raises if it failed
+                or was cancelled.
+        """
+        # Start the engine thread on first use. It initialises its own COM apartment.
+        if self._engine_executor is None:
+            self._engine_executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="ASPEN Engine",
+                initializer=self.backend.thread_initializer
+            )
+        
+        # The health scan needs the block names. Index them here, since the engine thread can't use self.aspen.
+        if self.health_check:
+            self.flowsheet
+        
+        # COM objects can't cross apartments directly, so the backend marshals the document to the engine thread.
+        stream = self.backend.marshal(self.aspen)
+        
+        self._run_cancelled = False
+        self._run_future = self._engine_executor.submit(self._run_aspen_on_engine_thread, stream, autosave)
+        return self._run_future
+
+    async def run_aspen_async(self, autosave: bool=True, timeout: float=None):
+        """
+        Runs the simulation on the engine thread without blocking the event loop.
+
+        Cancelling the awaiting task stops the engine.
+
+        Args:
+            autosave (bool, optional): Whether to autosave the results. Defaults to True.
+            timeout (float, optional): Wall-clock limit in seconds. Defaults to None (no limit).
+
+        Raises:
+            TimeoutError: If the run exceeded the timeout.
+
+        Returns:
+            None
+        """
+        import asyncio  # Already loaded by whoever runs the event loop
+        
+        run = asyncio.wrap_future(self.run_aspen_future(autosave))
+        try:
+            await asyncio.wait_for(asyncio.shield(run), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Stop the engine and let it acknowledge before giving up on the case, without blocking the loop.
+            self.cancel_run()
+            await asyncio.get_running_loop().run_in_executor(None, self._wait_for_stop, self._run_future)
+            # Consume the outcome so asyncio doesn't warn about it. A run still blocked after a kill is abandoned.
+            if run.done() and not run.cancelled():
+                run.exception()
+            else:
+                run.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.error(f"ASPEN run exceeded the {timeout} second timeout and was stopped.")
+            raise TimeoutError(f"ASPEN run exceeded {timeout} seconds")
+
+    def cancel_run(self):
+        """
+        Stops the running simulation. Call this from the thread that connected to ASPEN.
+
+        A background run that is still queued never starts, and one that is still being handed to the engine
+        thread skips the solve.
+
+        Returns:
+            None
+        """
+        if self._run_future is not None:
+            self._run_future.cancel()
+        # Set even when nothing is solving yet. The engine thread checks it before Run2.
+        self._run_cancelled = True
+        if not self._aspen_is_running:
+            return
+        self.error("Stopping ASPEN run.")
+        self.aspen.Engine.Stop()
+
+    def _wait_for_stop(self, future):
+        """
+        Waits for a cancelled background run to finish, and kills ASPEN if the engine ignores the stop.
+
+        Args:
+            future (concurrent.futures.Future): The cancelled run.
+
+        Returns:
+            None
+        """
+        try:
+            future.exception(self.wait_timeout)
+        except CancelledError:
+            # It was still queued and never started.
+            pass
+        except FutureTimeoutError:
+            # The document is gone with the processes. The next reset or case dispatches a new one.
+            self.error(f"ASPEN did not stop within {self.wait_timeout} seconds. Killing it.")
+            self.aspen = None
+            self._kill_aspen()
+            # Abandon the engine thread in case it is still blocked, so the next run gets a fresh one.
+            if self._engine_executor is not None:
+                self._engine_executor.shutdown(wait=False, cancel_futures=True)
+                self._engine_executor = None
+            self._aspen_is_running = False
+
+    def _relaunch_if_killed(self):
+        """
+        Dispatches a new ASPEN and reloads the archive if a run that ignored the stop had ASPEN killed.
+
+        Returns:
+            bool: True if ASPEN was relaunched, so the archive is freshly loaded.
+        """
+        if self.aspen is not None or not self._connected_to_aspen:
+            return False
+        self.error("ASPEN was killed after a run ignored the stop. Relaunching it.")
+        self.connect_to_aspen(self.aspen_path)
+        return True
+
+    def _run_aspen_on_engine_thread(self, stream, autosave: bool):
+        """
+        Runs the simulation on the engine thread.
+
+        Args:
+            stream (object): The document marshalled by the backend, or None to use self.aspen directly.
+            autosave (bool): Whether to autosave the results.
+
+        Raises:
+            RuntimeError: If the run was stopped by cancel_run.
+
+        Returns:
+            None
+        """
+        document = self.aspen
+        if stream is not None:
+            document = self.backend.unmarshal(stream)
+        if not self._run_cancelled:
+            self._run_aspen(document, autosave)
+        if self._run_cancelled:
+            raise RuntimeError("ASPEN run was cancelled.")
+
+    def _run_aspen(self, document, autosave: bool):
+        """
+        Runs the simulation on the given COM document and optionally saves the results.
+
+        Args:
+            document (win32com.client.CDispatch): The ASPEN document to run. Differs from self.aspen on the engine thread.
+            autosave (bool): Whether to autosave the results.
+
+        Raises:
+            ConvergenceError: If the health check is on and a block finished with errors.
 
         Returns:
             None
         """
+        self.last_health = None
+        
+        # Set the running flag before checking for a cancel, so cancel_run either sees the run or stops it here.
+        self._aspen_is_running = True
+        if self._run_cancelled:
+            self._aspen_is_running = False
+            return
         try:
-            # Set the running flag.
-            self._aspen_is_running = True
             start_time = time.time()
             
             # Log the start of the ASPEN run.
             self.log("Running ASPEN")
             
             # Run the ASPEN simulation.
-            self.aspen.Engine.Run2()
+            with self.timings.span("solve", run_id=self._run_id):
+                document.Engine.Run2()
             self.log("ASPEN Run. Time taken: " + str(time.time() - start_time) + " seconds.")
             
             # Clear the running flag.
             self._aspen_is_running = False
+            
+            # Check every block before anything is saved, so known-bad results aren't.
+            if self.health_check and not self._run_cancelled:
+                with self.timings.span("health_scan", run_id=self._run_id):
+                    self.last_health = self.scan_block_health(document)
+                if self.last_health["status"] != "converged":
+                    self.log(f"Block health: {self.last_health['status']}. Errors: {self.last_health['errors']}. "
+                             f"Warnings: {self.last_health['warnings']}.")
         finally:
             if autosave:
-                # Save the ASPEN file and export the report.
-                self.aspen.SaveAs(str(self.__log_path / f"ASPEN Simulation {self._run_id}.bkp"), False)
-                self.aspen.Export(2, str(self.__log_path / f"ASPEN Simulation Report {self._run_id}"))
+                # Save the ASPEN file and export the report, as far as the artifact policy allows.
+                self._save_artifacts(document, failed=self._aspen_is_running or self._run_cancelled,
+                                     health=self.last_health)
                 self._run_id += 1
+        
+        # Block errors fail the run like a crash would, so callers and pools can retry it.
+        if self.last_health is not None and self.last_health["status"] == "errors":
+            self.error(f"ASPEN run finished with block errors: {self.last_health['messages']}")
+            raise ConvergenceError(self.last_health)
+
+    def flush_artifacts(self):
+        """
+        Waits for the background writer to finish moving artifacts into the log folder.
+
+        Returns:
+            None
+        """
+        if self._artifact_writer is not None:
+            self._artifact_writer.shutdown(wait=True)
+            self._artifact_writer = None
+
+    def _artifacts_to_save(self, failed: bool, health: dict=None):
+        """
+        Decides which artifacts the artifact policy wants for the current run.
+
+        A run whose health scan found block errors has known-bad results. They are only saved under the
+        "failures" policy, which exists to keep them for debugging.
+
+        Args:
+            failed (bool): Whether the run raised or was cancelled.
+            health (dict, optional): The block health scan of the run. Defaults to None (not scanned).
+
+        Returns:
+            tuple: (save_backup, save_report) booleans.
+        """
+        if health is not None and health["status"] == "errors":
+            keep = self.artifact_policy == "failures"
+            return keep, keep
+        if self.artifact_policy == "all":
+            return True, True
+        if self.artifact_policy == "failures":
+            return failed, failed
+        if self.artifact_policy == "every_n":
+            due = self._run_id % self.artifact_every == 0
+            return due, due
+        if self.artifact_policy == "reports":
+            return False, True
+        return False, False
+
+    def _save_artifacts(self, document, failed: bool, health: dict=None):
+        """
+        Saves the artifacts the policy wants for the current run.
+
+        The COM calls have to finish before the next case changes the document, so they always run here.
+        With background artifacts they write to a local staging folder and a writer thread moves the
+        files into the log folder while the next case runs.
+
+        Args:
+            document (win32com.client.CDispatch): The ASPEN document that was run.
+            failed (bool): Whether the run raised or was cancelled.
+            health (dict, optional): The block health scan of the run. Defaults to None (not scanned).
+
+        Returns:
+            None
+        """
+        save_backup, save_report = self._artifacts_to_save(failed, health)
+        if not (save_backup or save_report):
+            return
+        
+        # Write straight into the log folder, or into a per-run staging folder.
+        folder = self.__log_path
+        if self._background_artifacts:
+            if self._artifact_staging is None:
+                self._artifact_staging = Path(tempfile.mkdtemp(prefix="aspen_artifacts_"))
+            folder = self._artifact_staging / str(self._run_id)
+            folder.mkdir()
+        
+        start_time = time.time()
+        with self.timings.span("save_export", run_id=self._run_id):
+            if save_backup:
+                document.SaveAs(str(folder / f"ASPEN Simulation {self._run_id}.bkp"), False)
+            if save_report:
+                document.Export(2, str(folder / f"ASPEN Simulation Report {self._run_id}"))
+        self.log(f"Artifacts saved for run {self._run_id}. Time taken: {time.time() - start_time} seconds")
+        
+        if self._background_artifacts:
+            # Hand the move to the writer thread so the next case can start.
+            if self._artifact_writer is None:
+                self._artifact_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ASPEN Artifacts")
+            self._artifact_writer.submit(self._move_artifacts, folder, self.__log_path)
+
+    @staticmethod
+    def _move_artifacts(source: Path, destination: Path):
+        """
+        Moves every file in a staging folder into the destination folder and removes the staging folder.
+
+        Args:
+            source (pathlib.Path): The staging folder.
+            destination (pathlib.Path): The log folder.
+
+        Returns:
+            None
+        """
+        for path in source.iterdir():
+            shutil.move(str(path), str(destination / path.name))
+        source.rmdir()
+
+    def reset_aspen(self, reload: bool=False):
+        """
+        Resets the simulation between cases without dispatching a new ASPEN instance, unless the last one was
+        killed after ignoring a stop.
+
+        Args:
+            reload (bool, optional): Reload the archive into the running instance instead of
+                only reinitialising the results. Defaults to False.
+
+        Returns:
+            None
+        """
+        # A freshly loaded archive needs no reset.
+        if self._relaunch_if_killed():
+            return
+        start_time = time.time()
+        if reload:
+            # Reload the archive into the same COM instance. This discards any inputs set by a previous case.
+            self.clear_node_cache()
+            self._applied_inputs = {}
+            self._flowsheet = None
+            with self.timings.span("archive_load"):
+                self.aspen.InitFromArchive2(Path(self._working_archive or self.aspen_path))
+            self.log(f"Archive reloaded. Time taken: {time.time() - start_time} seconds")
+        else:
+            # Reinitialise the results so the next run starts from the archive estimates.
+            with self.timings.span("reset"):
+                self.aspen.Reinit()
+            self.log(f"Simulation reinitialised. Time taken: {time.time() - start_time} seconds")
+
+    def run_case(self, inputs: dict, outputs=(), autosave: bool=False, timeout: float=None):
+        """
+        Sets the inputs, runs the simulation and reads back the outputs.
+
+        Args:
+            inputs (dict): Mapping of Variable Explorer addresses to the values to set.
+            outputs (iterable, optional): Addresses to read once the run has finished. Defaults to ().
+            autosave (bool, optional): Whether to autosave the results. Defaults to False.
+            timeout (float, optional): Wall-clock limit for the run in seconds. Defaults to None (no limit).
+
+        Raises:
+            RuntimeError: If an input could not be set.
+            TimeoutError: If the run exceeded the timeout.
+            ConvergenceError: If the health check is on and a block finished with errors.
+
+        Returns:
+            dict: Mapping of each output address to its value.
+        """
+        self.last_health = None
+        self._relaunch_if_killed()
+        
+        # A cache hit skips ASPEN entirely, so the document and applied inputs stay as they are.
+        key = None
+        if self.result_cache is not None:
+            key = self.result_cache.key(self.archive_hash, {**self._applied_inputs, **inputs})
+            cached = self.result_cache.get(key, outputs)
+            if cached is not None:
+                self.debug("Result cache hit. Skipping ASPEN run.")
+                return cached
+        
+        # Apply every input before running. The run ID labels this case's timing spans.
+        run_id = self._run_id
+        with self.timings.span("input_set", run_id=run_id):
+            errors = self.set_node_values(inputs)
+        if errors:
+            raise RuntimeError(f"Unable to set inputs: {list(errors)}")
+        
+        # Run the simulation and read the outputs.
+        self.run_aspen(autosave=autosave, timeout=timeout)
+        with self.timings.span("output_read", run_id=run_id):
+            results = self.get_node_values(outputs)
+        
+        # Only complete results are memoized.
+        if key is not None and not self.node_errors:
+            self.result_cache.put(key, results)
+        return results
+
+    def write_metrics(self):
+        """
+        Writes the timing histograms to 'metrics.prom' in the log folder, in the Prometheus text format.
+
+        Returns:
+            None
+        """
+        self.timings.write_prometheus(self.__log_path / 'metrics.prom')
+
+    def _release_working_archive(self):
+        """
+        Removes the working copy of the archive, if one was checked out.
+
+        Returns:
+            None
+        """
+        if self._working_archive is not None:
+            self.archive_cache.release(self._working_archive)
+            self._working_archive = None
+
+    @property
+    def archive_hash(self):
+        """
+        Returns the hash of the loaded archive, hashing it on first use.
+
+        Returns:
+            str: The SHA-256 hex digest of the archive.
+        """
+        if self._archive_hash is None:
+            self._archive_hash = hash_archive(self.aspen_path)
+        return self._archive_hash
+
+    @property
+    def aspen_pids(self):
+        """
+        Returns the IDs of the ASPEN processes this instance started.
+
+        Returns:
+            list: The process IDs.
+        """
+        return [process.pid for process in self._aspen_processes]
+
+    def _dispatch_aspen(self):
+        """
+        Dispatches a new document from the backend.
+
+        Raises:
+            RuntimeError: If the COM backend is used and win32com is not available.
+
+        Returns:
+            Document: The ASPEN application instance, or a stand-in for it.
+        """
+        return self.backend.dispatch()
+
+    def _wait_for(self, condition, description: str, timeout: float=None):
+        """
+        Polls a condition with backoff until it holds or the timeout expires, and logs how long it took.
+
+        Args:
+            condition (callable): Returns True once the wait is over.
+            description (str): What is being waited for, used in the log.
+            timeout (float, optional): The longest to wait, in seconds. Defaults to wait_timeout.
+
+        Returns:
+            bool: True if the condition held before the timeout, otherwise False.
+        """
+        if timeout is None: timeout = self.wait_timeout
+        start_time = time.time()
+        interval = self.poll_interval
+        while not condition():
+            elapsed = time.time() - start_time
+            if elapsed >= timeout:
+                self.error(f"Timed out after {elapsed} seconds waiting for {description}")
+                return False
+            time.sleep(min(interval, timeout - elapsed))
+            interval *= self.poll_backoff
+        self.log(f"Waited {time.time() - start_time} seconds for {description}")
+        return True
+
+    def _wait_for_processes(self, processes, description: str, timeout: float=None):
+        """
+        Waits for processes to exit, returning as soon as they have, and logs how long it took.
+
+        Args:
+            processes (list): The psutil processes to wait for.
+            description (str): What is being waited for, used in the log.
+            timeout (float, optional): The longest to wait, in seconds. Defaults to wait_timeout.
+
+        Returns:
+            bool: True if every process exited before the timeout, otherwise False.
+        """
+        from psutil import wait_procs
+        
+        if timeout is None: timeout = self.wait_timeout
+        start_time = time.time()
+        _, alive = wait_procs(processes, timeout=timeout)
+        if alive:
+            self.error(f"Timed out after {time.time() - start_time} seconds waiting for {description}")
+            return False
+        self.log(f"Waited {time.time() - start_time} seconds for {description}")
+        return True
+
+    @staticmethod
+    def _find_aspen_processes():
+        """
+        Lists the running ASPEN processes.
+
+        Returns:
+            list: The psutil processes whose name is in ASPEN_PROCESS_NAMES.
+        """
+        from psutil import process_iter
+        
+        return [process for process in process_iter(["name"]) if process.info["name"] in ASPEN_PROCESS_NAMES]
 
     def _kill_aspen(self):
         """
@@ -801,6 +2207,24 @@ class ASPEN:
         Returns:
             None
         """
+        # No path was ever found, so nothing was dispatched. Don't go looking for other instances' processes.
+        if self.aspen_path is None:
+            return
+        with self.timings.span("kill"):
+            self._quit_or_kill_aspen()
+
+    def _quit_or_kill_aspen(self):
+        """
+        Quits this instance's ASPEN, or kills its processes if there is no instance.
+
+        Every ASPEN process on the machine is only killed as a last resort, when this instance doesn't know
+        its own processes and wasn't given a dispatch lock (so it isn't running alongside other instances).
+
+        Returns:
+            None
+        """
+        from psutil import NoSuchProcess
+        
         if self.aspen is not None:
             # Quit the ASPEN application.
             self.aspen.Quit()
@@ -808,44 +2232,31 @@ class ASPEN:
                 self.log("Quit ASPEN using WIN32")
             except AttributeError:
                 pass
-            time.sleep(5)
+            # Wait for the processes this instance started to exit rather than sleeping.
+            if self._aspen_processes:
+                self._wait_for_processes(self._aspen_processes, "ASPEN to quit")
+            self._aspen_processes = []
         else:
-            # Kill ASPEN processes if the application is not running.
-            for p in process_iter():
-                if p.name() in ["AspenPlus.exe", "APropMain.exe", "AspenProperties.exe"]:
-                    try:
-                        self.log("ASPEN was running. Killing process via Windows")
-                    except AttributeError:
-                        pass
+            # Kill this instance's ASPEN processes if the application is not running. Other instances' are left alone.
+            processes = self._aspen_processes
+            if not processes and self._dispatch_lock is None:
+                processes = self._find_aspen_processes()
+            self._aspen_processes = []
+            for p in processes:
+                try:
+                    self.log("ASPEN was running. Killing process via Windows")
+                except AttributeError:
+                    pass
+                try:
                     p.kill()
-                    time.sleep(5)
+                except NoSuchProcess:
+                    pass
+            # Wait for all of them at once instead of sleeping after each kill.
+            if processes:
+                self._wait_for_processes(processes, "ASPEN processes to be killed")
 
     # def set_aspen_path(self, path: str):
     #     if Path(path).exists():
     #         self.__aspen_path = path
     #     else:
     #         self.error(f"Path {path} does not exist.")
-
-    # def get_aspen_path_from_user(self, save: bool=False):
-    #     root = Tk()
-    #     #root.withdraw()
-    #     try:
-    #         # Get file path from user
-    #         self.__aspen_path =  filedialog.askopenfilename(initialdir = Path.cwd(),title = "Select simulation file",filetypes = (("ASPEN Backup File","*.bkp"),))
-    #         self.log(f"File selected: {str(Path(self.__aspen_path))}")
-    #     finally:
-    #         # This ensures the window is destroyed and prevents crashes even if the users cancels input. 
-    #         root.destroy()
-    #         if save: self._write_aspen_path_to_file()
-    
-    # def get_aspen_path_from_file(self):
-    #     try:
-    #         with open(Path.cwd() / "path_param.json", "r") as json_file:
-    #             self.__aspen_path = json.load(json_file)["aspen_path"]
-    #     except:
-    #         raise RuntimeError("Unable to Read ASPEN Path.")
-    
-    # def _write_aspen_path_to_file(self):
-    #     with open(Path.cwd() / "path_param.json", "w") as json_file:
-    #         json.dump({"aspen_path": str(self.__aspen_path)}, json_file, indent=4)
-    #     self.log("File path written to path_param.json. You can use this on the next startup by setting use_file_path to True.")
\ No newline at end of file
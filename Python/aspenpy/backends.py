@@ -0,0 +1,738 @@
+import csv
+import json
+import time
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+from threading import Event
+
+
+
+def _import_com():
+    """
+    Imports win32com on first use. It only exists on Windows, and importing it is slow, so processes that never
+    touch COM (the simulated backend, pool parents, headless tools) don't pay for it.
+
+    Returns:
+        tuple: (win32com.client, pythoncom), or (None, None) if win32com is not installed.
+    """
+    try:
+        import win32com.client as win32
+        import pythoncom
+    except ImportError:
+        return None, None
+    return win32, pythoncom
+
+
+class Backend(ABC):
+    """
+    Creates the document ASPEN talks to, and moves it between threads.
+
+    A document exposes the subset of the Apwn.Document COM surface that ASPEN uses:
+        Tree: the root node. Nodes have Name, Value, UnitString, Dimension, FindNode(address) and Elements,
+            a collection that can be called with a name, iterated, counted (Count) and changed (Add, Remove).
+        Engine: Run2(), Stop() and IsRunning.
+        InitFromArchive2(path), Reinit(), Save(), SaveAs(path, overwrite), Export(kind, path), Quit() and Visible.
+
+    Methods:
+        prepare():
+            Does the one-off setup every process would otherwise repeat. Called once per sweep by the parent.
+        dispatch():
+            Returns a new document.
+        thread_initializer():
+            Prepares a thread to use documents, or None if nothing is needed.
+        marshal(document):
+            Packs a document for use on another thread.
+        unmarshal(token):
+            Unpacks a document on the thread that will use it.
+    """
+    thread_initializer = None
+
+    def prepare(self):
+        """
+        Does the one-off setup every process would otherwise repeat. Called once per sweep by the parent, before
+        any worker is spawned. Does nothing by default.
+        """
+        pass
+
+    @abstractmethod
+    def dispatch(self):
+        """
+        Returns a new document.
+
+        Returns:
+            Document: The document.
+        """
+
+    def marshal(self, document):
+        """
+        Packs a document for use on another thread.
+
+        Args:
+            document (Document): The document.
+
+        Returns:
+            object: A token for unmarshal, or None if the document can be used on any thread as it is.
+        """
+        return None
+
+    def unmarshal(self, token):
+        """
+        Unpacks a document on the thread that will use it.
+
+        Args:
+            token (object): The token returned by marshal.
+
+        Returns:
+            Document: The document.
+        """
+        return token
+
+
+class ComBackend(Backend):
+    """
+    The ASPEN Plus COM server. Only available on Windows with pywin32 installed.
+
+    Attributes:
+        prog_id : str
+            The COM ProgID to dispatch.
+
+    Methods:
+        thread_initializer:
+            Returns pythoncom.CoInitialize, to give each thread its own COM apartment.
+        prepare():
+            Generates the gencache wrapper for the ProgID once, so workers don't race to generate it.
+        dispatch():
+            Dispatches a new ASPEN COM instance.
+        marshal(document):
+            Marshals the document into a stream for another thread.
+        unmarshal(token):
+            Unmarshals the document on the thread that will use it.
+    """
+
+    def __init__(self, prog_id: str="Apwn.Document"):
+        """
+        Initialize the backend.
+
+        Args:
+            prog_id (str, optional): The COM ProgID to dispatch. Defaults to "Apwn.Document".
+        """
+        self.prog_id = prog_id
+
+    @property
+    def thread_initializer(self):
+        """
+        Returns pythoncom.CoInitialize, since every thread that touches COM needs its own apartment.
+
+        Returns:
+            callable: The initializer, or None if win32com is not installed.
+        """
+        _, pythoncom = _import_com()
+        return None if pythoncom is None else pythoncom.CoInitialize
+
+    def prepare(self):
+        """
+        Generates the makepy wrapper for the ProgID in the win32com gencache if it isn't there yet.
+
+        EnsureDispatch generates the wrapper the first time it sees a ProgID. Workers that start at the same time
+        would each generate it, and can read a half-written cache. Generating it once in the parent means the
+        workers only load it.
+        """
+        win32, _ = _import_com()
+        if win32 is None:
+            return
+        # Nothing to do if the wrapper was generated by an earlier sweep.
+        if win32.gencache.GetModuleForProgID(self.prog_id) is not None:
+            return
+        document = win32.gencache.EnsureDispatch(self.prog_id)
+        try:
+            document.Quit()
+        except Exception:
+            pass
+
+    def dispatch(self):
+        """
+        Dispatches a new ASPEN COM instance.
+
+        Raises:
+            RuntimeError: If win32com is not available.
+
+        Returns:
+            win32com.client.CDispatch: The ASPEN application instance.
+        """
+        win32, _ = _import_com()
+        if win32 is None:
+            raise RuntimeError("win32com is not available. ASPEN can only be dispatched on Windows.")
+        return win32.gencache.EnsureDispatch(self.prog_id)
+
+    def marshal(self, document):
+        """
+        Marshals the document's interface into a stream for another thread's apartment.
+
+        Args:
+            document (win32com.client.CDispatch): The document.
+
+        Returns:
+            PyIStream: The stream, or None if win32com is not installed or the document isn't a COM object.
+        """
+        # COM objects can't cross apartments directly, so marshal the interface into a stream.
+        _, pythoncom = _import_com()
+        if pythoncom is None or not hasattr(document, "_oleobj_"):
+            return None
+        return pythoncom.CoMarshalInterThreadInterfaceInStream(pythoncom.IID_IDispatch, document._oleobj_)
+
+    def unmarshal(self, token):
+        """
+        Unmarshals a document from a stream made by marshal, on the thread that will use it.
+
+        Args:
+            token (PyIStream): The stream returned by marshal.
+
+        Returns:
+            win32com.client.CDispatch: The document.
+        """
+        win32, pythoncom = _import_com()
+        return win32.Dispatch(pythoncom.CoGetInterfaceAndReleaseStream(token, pythoncom.IID_IDispatch))
+
+
+class SimulatedElements:
+    """
+    The Elements collection of a SimulatedNode. Lookups by name, iteration, Add and Remove each sleep for the
+    node's latency.
+
+    Attributes:
+        _node : SimulatedNode
+            The node the collection belongs to.
+        _children : dict
+            Mapping of child names to nodes, in insertion order.
+
+    Methods:
+        __call__(name):
+            Returns a child by name.
+        __iter__():
+            Iterates over the children.
+        Count:
+            Returns the number of children.
+        Item(index):
+            Returns a child by position.
+        Add(name):
+            Adds a child.
+        Remove(name):
+            Removes a child.
+    """
+
+    def __init__(self, node):
+        """
+        Initialize an empty collection.
+
+        Args:
+            node (SimulatedNode): The node the collection belongs to.
+        """
+        self._node = node
+        self._children = {}
+
+    def __call__(self, name):
+        """
+        Returns a child by name, like Elements("Data") on a COM node.
+
+        Args:
+            name (str): The child name.
+
+        Raises:
+            AttributeError: If there is no such child, as COM raises for a missing element.
+
+        Returns:
+            SimulatedNode: The child.
+        """
+        self._node._wait()
+        try:
+            return self._children[name]
+        except KeyError:
+            raise AttributeError(f"{self._node.Name} has no element {name}")
+
+    def __iter__(self):
+        """
+        Iterates over a snapshot of the children, so they can be added or removed while iterating.
+
+        Returns:
+            iterator: The child nodes.
+        """
+        self._node._wait()
+        return iter(list(self._children.values()))
+
+    @property
+    def Count(self):
+        """
+        Returns the number of children.
+
+        Returns:
+            int: The number of children.
+        """
+        return len(self._children)
+
+    def Item(self, index):
+        """
+        Returns a child by position.
+
+        Args:
+            index (int): The position, in insertion order.
+
+        Returns:
+            SimulatedNode: The child.
+        """
+        return list(self._children.values())[index]
+
+    def Add(self, name):
+        """
+        Adds a child, or returns the existing one with that name.
+
+        Args:
+            name (str): The child name.
+
+        Returns:
+            SimulatedNode: The child.
+        """
+        self._node._wait()
+        return self._children.setdefault(name, SimulatedNode(name, self._node.latency))
+
+    def Remove(self, name):
+        """
+        Removes a child.
+
+        Args:
+            name (str): The child name.
+
+        Raises:
+            AttributeError: If there is no such child.
+
+        Returns:
+            None
+        """
+        self._node._wait()
+        try:
+            del self._children[name]
+        except KeyError:
+            raise AttributeError(f"{self._node.Name} has no element {name}")
+
+
+class SimulatedNode:
+    """
+    An in-memory tree node. Every call that would be a COM round trip sleeps for the latency.
+
+    Attributes:
+        Name : str
+            The node name.
+        UnitString : str
+            The units of the value, or None.
+        Elements : SimulatedElements
+            The child nodes.
+        latency : float
+            Seconds slept per call.
+        create_missing : bool
+            Whether FindNode creates nodes that don't exist. Only read on the root.
+        _value : object
+            The value.
+
+    Methods:
+        Value:
+            Gets or sets the value.
+        Dimension:
+            Returns 0 for a scalar leaf and 1 for a node with children.
+        add(address, value=None, units=None):
+            Creates the node at an address below this one.
+        FindNode(address):
+            Returns the node at an address below this one.
+        leaves(address=""):
+            Yields every leaf below this node.
+    """
+
+    def __init__(self, name: str, latency: float=0.0, value=None, units: str=None):
+        """
+        Initialize a node with no children.
+
+        Args:
+            name (str): The node name.
+            latency (float, optional): Seconds slept per call. Defaults to 0.
+            value (optional): The value. Defaults to None.
+            units (str, optional): The units of the value. Defaults to None.
+        """
+        self.Name = name
+        self.UnitString = units
+        self.Elements = SimulatedElements(self)
+        self.latency = latency
+        self.create_missing = False
+        self._value = value
+
+    def _wait(self):
+        """
+        Sleeps for the latency, standing in for a COM round trip.
+
+        Returns:
+            None
+        """
+        if self.latency:
+            time.sleep(self.latency)  # Simulate the COM round trip
+
+    @property
+    def Value(self):
+        """
+        Returns the value.
+
+        Returns:
+            object: The value, or None if it was never set.
+        """
+        self._wait()
+        return self._value
+
+    @Value.setter
+    def Value(self, value):
+        self._wait()
+        self._value = value
+
+    @property
+    def Dimension(self):
+        """
+        Returns the dimension like a COM node: 0 for a scalar leaf, 1 for a node with children.
+
+        Returns:
+            int: The dimension.
+        """
+        return 0 if self.Elements.Count == 0 else 1
+
+    def add(self, address: str, value=None, units: str=None):
+        """
+        Creates the node at an address below this one, with every missing node on the way, and sets its value.
+
+        Args:
+            address (str): The address relative to this node, e.g. "\\Data\\Blocks\\B1\\Input\\TEMP".
+            value (optional): The value. Defaults to None.
+            units (str, optional): The units. Defaults to None.
+
+        Returns:
+            SimulatedNode: The node.
+        """
+        node = self
+        for name in address.strip("\\").split("\\"):
+            node = node.Elements._children.setdefault(name, SimulatedNode(name, self.latency))
+        node._value = value
+        node.UnitString = units
+        return node
+
+    def FindNode(self, address: str):
+        """
+        Returns the node at an address below this one.
+
+        Args:
+            address (str): The address, e.g. "\\Data\\Blocks\\B1\\Input\\TEMP".
+
+        Returns:
+            SimulatedNode: The node, or None if it doesn't exist and the tree doesn't create missing nodes.
+        """
+        self._wait()
+        node = self
+        for name in address.strip("\\").split("\\"):
+            child = node.Elements._children.get(name)
+            if child is None:
+                if not self.create_missing:
+                    return None
+                return self.add(address, 0.0)
+            node = child
+        return node
+
+    def leaves(self, address: str=""):
+        """
+        Yields (address, value, units) for every leaf below this node, without simulated latency.
+
+        Args:
+            address (str, optional): The address of this node. Defaults to "".
+
+        Yields:
+            tuple: (address, value, units).
+        """
+        if not self.Elements._children:
+            yield address, self._value, self.UnitString
+        for name, child in self.Elements._children.items():
+            yield from child.leaves(f"{address}\\{name}")
+
+
+class SimulatedEngine:
+    """
+    A stand-in for the ASPEN engine. Run2 sleeps for the solve time, or until stopped, then calls the solve
+    function on the tree.
+
+    Attributes:
+        IsRunning : bool
+            Whether a solve is in progress.
+        runs : int
+            The number of Run2 calls that finished, stopped or not.
+        _stopped : threading.Event
+            Set by Stop to end the current Run2.
+
+    Methods:
+        Run2(*args):
+            Solves the tree after the solve time.
+        Stop():
+            Ends the current Run2 early.
+    """
+
+    def __init__(self, document, solve_time: float, solve):
+        """
+        Initialize an idle engine.
+
+        Args:
+            document (SimulatedDocument): The document whose tree is solved.
+            solve_time (float): Seconds slept per Run2.
+            solve (callable): Called with the tree after each Run2, or None.
+        """
+        self._document = document
+        self._solve_time = solve_time
+        self._solve = solve
+        self._stopped = Event()
+        self.IsRunning = False
+        self.runs = 0
+
+    def Run2(self, *args):
+        """
+        Sleeps for the solve time, then calls the solve function unless Stop was called meanwhile.
+
+        Args:
+            *args: Ignored. Kept for API compatibility.
+
+        Returns:
+            None
+        """
+        self.IsRunning = True
+        self._stopped.clear()
+        try:
+            if not self._stopped.wait(self._solve_time) and self._solve is not None:
+                self._solve(self._document.Tree)
+            self.runs += 1
+        finally:
+            self.IsRunning = False
+
+    def Stop(self):
+        """
+        Ends the current Run2 early, without calling the solve function.
+
+        Returns:
+            None
+        """
+        self._stopped.set()
+
+
+class SimulatedDocument:
+    """
+    An in-memory stand-in for Apwn.Document. Loading an archive builds the tree from the backend's values.
+
+    Attributes:
+        Tree : SimulatedNode
+            The root node.
+        Engine : SimulatedEngine
+            The engine.
+        Visible : bool
+            Ignored. Kept for API compatibility.
+        archive : pathlib.Path
+            The last archive loaded, or None.
+
+    Methods:
+        InitFromArchive2(path):
+            Loads an archive.
+        Reinit():
+            Reinitialises the results.
+        Save():
+            Saves over the loaded archive.
+        SaveAs(path, overwrite=False):
+            Saves the tree as JSON.
+        Export(kind, path):
+            Writes the tree's leaves as text.
+        Quit():
+            Does nothing.
+    """
+
+    def __init__(self, backend):
+        """
+        Initialize a document with the backend's values loaded.
+
+        Args:
+            backend (SimulatedBackend): The backend with the values, units, latency and solve settings.
+        """
+        self._backend = backend
+        self.Tree = self._build_tree()
+        self.Engine = SimulatedEngine(self, backend.solve_time, backend.solve)
+        self.Visible = False
+        self.archive = None
+
+    def _build_tree(self):
+        """
+        Builds a fresh tree from the backend's values.
+
+        Returns:
+            SimulatedNode: The root node.
+        """
+        tree = SimulatedNode("Root", self._backend.latency)
+        tree.create_missing = self._backend.create_missing
+        for address, value in self._backend.values.items():
+            tree.add(address, value, self._backend.units.get(address))
+        return tree
+
+    def InitFromArchive2(self, path):
+        """
+        Reads the whole archive, like ASPEN does, then resets the tree to the backend's values.
+
+        Args:
+            path (str | Path): The archive.
+
+        Returns:
+            None
+        """
+        self.Tree._wait()
+        # Read the whole archive like ASPEN does, so where it is loaded from shows up in the load time.
+        with open(path, "rb") as file:
+            while file.read(1 << 20):
+                pass
+        self.archive = Path(path)
+        self.Tree = self._build_tree()
+
+    def Reinit(self):
+        """
+        Reinitialises the results. Only the latency is simulated.
+
+        Returns:
+            None
+        """
+        self.Tree._wait()
+
+    def Save(self):
+        """
+        Saves over the loaded archive, if there is one.
+
+        Returns:
+            None
+        """
+        if self.archive is not None:
+            self.SaveAs(self.archive, True)
+
+    def SaveAs(self, path, overwrite=False):
+        """
+        Saves the tree's leaves as JSON, so a saved "archive" can be inspected or fed back to SimulatedBackend.
+
+        Args:
+            path (str | Path): Where to save.
+            overwrite (bool, optional): Ignored. The file is always overwritten. Defaults to False.
+
+        Returns:
+            None
+        """
+        # Saved as JSON so a saved "archive" can be inspected or fed back to SimulatedBackend.
+        self.Tree._wait()
+        Path(path).write_text(json.dumps({address: value for address, value, _ in self.Tree.leaves()},
+                                         default=str, indent=4))
+
+    def Export(self, kind, path):
+        """
+        Writes one "address = value units" line per leaf, standing in for a report.
+
+        Args:
+            kind (int): The export type. Ignored.
+            path (str | Path): Where to write.
+
+        Returns:
+            None
+        """
+        self.Tree._wait()
+        with open(path, "w") as file:
+            for address, value, units in self.Tree.leaves():
+                file.write(f"{address} = {value} {units or ''}\n")
+
+    def Quit(self):
+        """
+        Does nothing. There is no process to quit.
+
+        Returns:
+            None
+        """
+        pass
+
+
+class SimulatedBackend(Backend):
+    """
+    An in-memory flowsheet with configurable latency per call, so the Python layer can be tested and
+    benchmarked without ASPEN or Windows.
+
+    Attributes:
+        values : dict
+            Mapping of addresses to the values a freshly loaded archive has.
+        units : dict
+            Mapping of addresses to their units.
+        latency : float
+            Seconds slept per simulated COM call (FindNode, Value, Elements, Add, Remove...).
+        solve_time : float
+            Seconds slept per Run2.
+        solve : callable
+            Called with the tree after each Run2 to set the outputs, or None.
+        create_missing : bool
+            Whether FindNode creates nodes that don't exist instead of returning None.
+
+    Methods:
+        from_snapshot(path, **options):
+            Builds a backend from a snapshot CSV written by ASPEN.snapshot.
+        dispatch():
+            Returns a new simulated document.
+    """
+
+    def __init__(self, values: dict=None, units: dict=None, latency: float=0.0, solve_time: float=0.0,
+                 solve=None, create_missing: bool=False):
+        """
+        Initialize the backend.
+
+        Args:
+            values (dict, optional): Mapping of addresses to initial values. Defaults to None (an empty tree).
+            units (dict, optional): Mapping of addresses to units. Defaults to None.
+            latency (float, optional): Seconds slept per simulated COM call. Defaults to 0.
+            solve_time (float, optional): Seconds slept per Run2. Defaults to 0.
+            solve (callable, optional): Called with the tree after each Run2, e.g. to compute outputs from
+                inputs. Must be picklable to be used in a pool. Defaults to None.
+            create_missing (bool, optional): FindNode creates missing nodes with the value 0.0. Defaults to False.
+        """
+        self.values = {} if values is None else dict(values)
+        self.units = {} if units is None else dict(units)
+        self.latency = latency
+        self.solve_time = solve_time
+        self.solve = solve
+        self.create_missing = create_missing
+
+    @classmethod
+    def from_snapshot(cls, path: str | Path, **options):
+        """
+        Builds a backend from a snapshot CSV written by ASPEN.snapshot, e.g. of a real flowsheet on Windows.
+
+        Numeric values are converted back to floats. Empty values become None.
+
+        Args:
+            path (str | Path): The snapshot CSV.
+            **options: Passed to the constructor.
+
+        Returns:
+            SimulatedBackend: The backend.
+        """
+        values, units = {}, {}
+        with open(path, newline="") as file:
+            for row in csv.DictReader(file):
+                value = row["value"]
+                try:
+                    value = float(value)
+                except ValueError:
+                    value = value or None
+                values[row["address"]] = value
+                if row["units"]:
+                    units[row["address"]] = row["units"]
+        return cls(values, units, **options)
+
+    def dispatch(self):
+        """
+        Returns a new simulated document.
+
+        Returns:
+            SimulatedDocument: The document.
+        """
+        return SimulatedDocument(self)
@@ -0,0 +1,160 @@
+import os
+import sys
+import tempfile
+import subprocess
+
+from aspen import ASPEN
+from cache import ArchiveCache, hash_archive
+from backends import SimulatedBackend
+from pathlib import Path
+from statistics import median
+from time import perf_counter
+
+
+def benchmark_node_access(n_inputs: int=50, n_outputs: int=150, cases: int=5, n_missing: int=10):
+    """
+    Compares per-call set_node_value/get_node_value with set_node_values/get_node_values.
+
+    Both paths make one COM call per value, plus one FindNode per address until its handle is cached, since the
+    Apwn COM surface has no bulk value call. The only work set_node_values/get_node_values skip is the logging
+    and error handling per failed address, timed here with n_missing addresses that don't exist. With 1 ms per
+    simulated call the two paths are within a few percent of each other in every case, failing ones included,
+    so use the multi-address calls for the collected errors rather than for speed.
+
+    Args:
+        n_inputs (int, optional): The number of inputs set per case. Defaults to 50.
+        n_outputs (int, optional): The number of outputs read per case. Defaults to 150.
+        cases (int, optional): The number of warm cases timed for each path. Defaults to 5.
+        n_missing (int, optional): The number of missing inputs and outputs in the failing cases. Defaults to 10.
+
+    Returns:
+        dict: Seconds for the cold case, mean seconds per warm case and mean seconds per failing case, for
+            each path.
+    """
+    inputs = {f"\\Data\\Blocks\\B{i}\\Input\\VALUE": float(i) for i in range(n_inputs)}
+    outputs = [f"\\Data\\Streams\\S{i}\\Output\\VALUE" for i in range(n_outputs)]
+    missing_inputs = {f"\\Data\\Blocks\\MISSING{i}\\Input\\VALUE": 0.0 for i in range(n_missing)}
+    missing_outputs = [f"\\Data\\Streams\\MISSING{i}\\Output\\VALUE" for i in range(n_missing)]
+
+    def per_call(aspen, inputs, outputs):
+        # Every call resolves, logs and handles errors on its own.
+        for address, value in inputs.items():
+            aspen.set_node_value(address, value)
+        [aspen.get_node_value(address) for address in outputs]
+
+    def multi(aspen, inputs, outputs):
+        # Every address is resolved up front, then failures are logged once per call.
+        aspen.set_node_values(inputs)
+        aspen.get_node_values(outputs)
+
+    # Every simulated COM call takes a millisecond. Missing addresses are not in the tree.
+    backend = SimulatedBackend(dict.fromkeys([*inputs, *outputs], 0.0), latency=0.001)
+    
+    timings = {}
+    with ASPEN("Benchmark Node Access", backend=backend, verbose=False) as aspen:
+        aspen.connect_to_aspen(__file__)  # Any existing file will do for the simulated archive
+        for name, path in (("per_call", per_call), ("multi", multi)):
+            aspen.clear_node_cache()
+            start_time = perf_counter()
+            path(aspen, inputs, outputs)
+            timings[f"{name}_cold"] = perf_counter() - start_time
+
+            start_time = perf_counter()
+            for _ in range(cases):
+                path(aspen, inputs, outputs)
+            timings[f"{name}_warm"] = (perf_counter() - start_time) / cases
+
+            start_time = perf_counter()
+            for _ in range(cases):
+                path(aspen, {**inputs, **missing_inputs}, outputs + missing_outputs)
+            timings[f"{name}_failing"] = (perf_counter() - start_time) / cases
+    return timings
+
+def benchmark_import_time(modules=("aspen", "psutil", "tkinter", "win32com.client"), repeats: int=5):
+    """
+    Times importing each module in a fresh interpreter, the way a spawned worker process imports it.
+
+    aspen is the cost every worker pays. The other modules are what aspen used to import eagerly, so their
+    times are what the lazy imports save per worker.
+
+    Args:
+        modules (iterable, optional): The names of the modules to time. Defaults to aspen, psutil, tkinter and
+            win32com.client.
+        repeats (int, optional): The number of fresh interpreters per module. Defaults to 5.
+
+    Returns:
+        dict: Median seconds to import each module, or None if it isn't installed.
+    """
+    code = ("import time; start_time = time.perf_counter(); import {module}; "
+            "print(time.perf_counter() - start_time)")
+    timings = {}
+    for module in modules:
+        samples = []
+        for _ in range(repeats):
+            # Run from this folder so the flat imports (aspen, backends...) resolve as they do for workers.
+            result = subprocess.run([sys.executable, "-c", code.format(module=module)], capture_output=True,
+                                    text=True, cwd=Path(__file__).parent)
+            if result.returncode != 0:
+                break
+            samples.append(float(result.stdout))
+        timings[module] = median(samples) if samples else None
+    return timings
+
+def benchmark_archive_staging(path: str | Path=None, loads: int=4, size_mb: int=50):
+    """
+    Times connecting to an archive where it is, and from a private copy staged in an archive cache.
+
+    The simulated backend reads the whole archive on load, like ASPEN does. Pass the real archive, e.g. one on
+    a network or synced folder, to see what staging saves there. Hashing and staging the archive into the cache
+    is paid once per sweep and is timed separately. Staged loads are timed with private copies and hardlinks.
+
+    Args:
+        path (str | Path, optional): The archive. Defaults to None (a temporary file of size_mb random bytes).
+        loads (int, optional): The number of connections timed each way, one per simulated worker. Defaults to 4.
+        size_mb (int, optional): The size of the stand-in archive in megabytes. Defaults to 50.
+
+    Returns:
+        dict: Mean seconds per connection in place, staged with copies and staged with hardlinks, and seconds
+            for the one-off stage.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        if path is None:
+            path = Path(folder) / "archive.bkp"
+            path.write_bytes(os.urandom(size_mb << 20))
+        cache = ArchiveCache(Path(folder) / "cache")
+
+        def connect(archive_cache, archive_hash):
+            # A fresh instance per load, as each worker would have, given the hash like a pool's workers.
+            with ASPEN("Benchmark Archive Staging", backend=SimulatedBackend(), archive_cache=archive_cache,
+                       archive_hash=archive_hash, verbose=False) as aspen:
+                start_time = perf_counter()
+                aspen.connect_to_aspen(path)
+                return perf_counter() - start_time
+
+        timings = {"in_place": sum(connect(None, None) for _ in range(loads)) / loads}
+        start_time = perf_counter()
+        archive_hash = hash_archive(path)
+        cache.stage(path, archive_hash)
+        timings["stage"] = perf_counter() - start_time
+        timings["staged"] = sum(connect(cache, archive_hash) for _ in range(loads)) / loads
+        cache.link = True
+        timings["staged_link"] = sum(connect(cache, archive_hash) for _ in range(loads)) / loads
+    return timings
+
+if __name__ == "__main__":
+    # Node access benchmark
+    timings = benchmark_node_access()
+    for name, seconds in timings.items():
+        print(f"{name}: {seconds:.4f} s/case")
+    for case in ("cold", "warm", "failing"):
+        print(f"multi/per_call {case}: {timings[f'multi_{case}'] / timings[f'per_call_{case}']:.2f}")
+    
+    # Import time benchmark
+    timings = benchmark_import_time()
+    for module, seconds in timings.items():
+        print(f"import {module}: " + ("not installed" if seconds is None else f"{seconds:.4f} s"))
+    
+    # Archive staging benchmark
+    timings = benchmark_archive_staging()
+    for name, seconds in timings.items():
+        print(f"archive {name}: {seconds:.4f} s")
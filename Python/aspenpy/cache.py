@@ -0,0 +1,389 @@
+import os
+import json
+import stat
+import time
+import shutil
+import sqlite3
+import hashlib
+import tempfile
+
+from pathlib import Path
+
+# The default local folder archives are staged into.
+ARCHIVE_CACHE = Path(tempfile.gettempdir()) / "aspenpy archives"
+
+
+def hash_archive(path: str | Path):
+    """
+    Hashes the contents of an ASPEN archive.
+
+    Args:
+        path (str | Path): The path to the archive.
+
+    Returns:
+        str: The SHA-256 hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    An on-disk LRU cache of case outputs keyed by the archive hash and the inputs applied to it.
+
+    Numeric inputs are snapped to a grid with a spacing of the tolerance before hashing, so revisiting a point
+    in the same grid cell returns the cached outputs instead of running ASPEN again. This is bucketing, not
+    matching within the tolerance: two points closer than the tolerance can still fall either side of a cell
+    boundary and miss each other.
+
+    The database is opened in WAL mode and every write is its own transaction, so several workers or sweeps
+    can share one cache file.
+
+    Attributes:
+        path : pathlib.Path
+            The path to the SQLite database.
+        tolerance : float
+            The grid spacing numeric inputs are snapped to before hashing. 0 means exact.
+        max_entries : int
+            The most entries kept. The least recently used are evicted first.
+        max_bytes : int
+            The most bytes of stored outputs kept, or None for no limit.
+        hits : int
+            The number of lookups answered from the cache.
+        misses : int
+            The number of lookups that were not.
+
+    Methods:
+        key(archive_hash, inputs):
+            Builds the cache key for a set of applied inputs.
+        get(key, outputs):
+            Returns the cached outputs, or None if any are missing.
+        put(key, outputs):
+            Stores outputs and evicts old entries.
+        close():
+            Closes the database connection.
+    """
+
+    def __init__(self, path: str | Path, tolerance: float=0.0, max_entries: int=10000, max_bytes: int=None):
+        """
+        Opens (or creates) the cache.
+
+        Args:
+            path (str | Path): The path to the SQLite database.
+            tolerance (float, optional): The grid spacing numeric inputs are snapped to. Defaults to 0 (exact).
+            max_entries (int, optional): The most entries kept. Defaults to 10000.
+            max_bytes (int, optional): The most bytes of stored outputs kept. Defaults to None (no limit).
+        """
+        self.path = Path(path)
+        self.tolerance = tolerance
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Wait for other writers rather than failing with "database is locked", and manage transactions here.
+        self._connection = sqlite3.connect(self.path, timeout=60.0, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, "
+            "outputs TEXT NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+
+    def key(self, archive_hash: str, inputs: dict):
+        """
+        Builds the cache key for a set of applied inputs.
+
+        Args:
+            archive_hash (str): The hash of the archive the inputs were applied to.
+            inputs (dict): Every input applied since the archive was loaded.
+
+        Returns:
+            str: The SHA-256 hex digest of the archive hash and canonicalised inputs.
+        """
+        canonical = []
+        for address, value in sorted(inputs.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                # ASPEN stores numbers as floats, so 1 and 1.0 are the same input.
+                value = float(value)
+                if self.tolerance:
+                    value = round(value / self.tolerance)
+            canonical.append((address, value))
+        return hashlib.sha256(json.dumps([archive_hash, canonical], default=str).encode()).hexdigest()
+
+    def get(self, key: str, outputs):
+        """
+        Returns the cached outputs for a key.
+
+        Args:
+            key (str): The cache key.
+            outputs (iterable): The addresses wanted.
+
+        Returns:
+            dict: The wanted outputs, or None if the key or any wanted address is not cached.
+        """
+        row = self._connection.execute("SELECT outputs FROM entries WHERE key = ?", (key,)).fetchone()
+        cached = json.loads(row[0]) if row is not None else {}
+        if row is None or any(address not in cached for address in outputs):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        return {address: cached[address] for address in outputs}
+
+    def put(self, key: str, outputs: dict):
+        """
+        Stores outputs under a key, merging with anything already cached, then evicts old entries.
+
+        Args:
+            key (str): The cache key.
+            outputs (dict): Mapping of output addresses to values.
+
+        Returns:
+            None
+        """
+        # Take the write lock before reading, so another process can't write the same key between the read and
+        # the write and have its outputs dropped by the merge.
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._connection.execute("SELECT outputs FROM entries WHERE key = ?", (key,)).fetchone()
+            merged = json.loads(row[0]) if row is not None else {}
+            merged.update(outputs)
+            data = json.dumps(merged)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, outputs, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time())
+            )
+            
+            # Evict the least recently used entries beyond the limits.
+            self._connection.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+            if self.max_bytes is not None:
+                total, = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+                for old_key, size in self._connection.execute(
+                        "SELECT key, size FROM entries ORDER BY last_used").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    self._connection.execute("DELETE FROM entries WHERE key = ?", (old_key,))
+                    total -= size
+        except BaseException:
+            self._connection.execute("ROLLBACK")
+            raise
+        self._connection.execute("COMMIT")
+
+    def close(self):
+        """
+        Closes the database connection.
+
+        Returns:
+            None
+        """
+        self._connection.close()
+
+
+class ArchiveCache:
+    """
+    A local, content-addressed cache of ASPEN archives and the private working copies made from them.
+
+    Each archive is copied into the cache once per content hash, however many workers or sweeps use it. Every
+    instance then loads its own working copy, so no two ASPEN processes read or save the same file and none of
+    them reads over a network or synced folder.
+
+    Attributes:
+        folder : pathlib.Path
+            The cache folder. Archives are kept in 'archives/<hash>/' and working copies in 'work/<pid>-*/'.
+        max_entries : int
+            The most archives kept. The least recently staged are removed first.
+        link : bool
+            Hardlink working copies to the cached archive instead of copying it, where the file system allows.
+            Only safe when nothing saves over the loaded archive. Cached archives are read-only, so an in-place
+            save fails instead of changing every worker's copy.
+
+    Methods:
+        stage(path, archive_hash=None):
+            Copies an archive into the cache unless it is already there.
+        checkout(path, archive_hash=None):
+            Returns a private working copy of an archive.
+        release(copy):
+            Removes a working copy.
+        prune():
+            Removes the oldest archives and the working copies of processes that have exited.
+        _protect():
+            Makes every cached archive read-only again.
+    """
+
+    def __init__(self, folder: str | Path=ARCHIVE_CACHE, max_entries: int=8, link: bool=False):
+        """
+        Initialize the cache. Nothing is written until an archive is staged.
+
+        Args:
+            folder (str | Path, optional): The cache folder. Use a local disk. Defaults to ARCHIVE_CACHE.
+            max_entries (int, optional): The most archives kept. Defaults to 8.
+            link (bool, optional): Hardlink working copies instead of copying. Defaults to False.
+        """
+        self.folder = Path(folder)
+        self.max_entries = max_entries
+        self.link = link
+
+    def stage(self, path: str | Path, archive_hash: str=None):
+        """
+        Copies an archive into the cache unless an archive with the same contents is already there.
+
+        Args:
+            path (str | Path): The archive.
+            archive_hash (str, optional): The hash of the archive, if already known. Defaults to None (hashed here).
+
+        Returns:
+            pathlib.Path: The cached archive.
+        """
+        path = Path(path)
+        if archive_hash is None: archive_hash = hash_archive(path)
+        staged = self.folder / "archives" / archive_hash / path.name
+        if staged.exists():
+            # Mark it as recently used so pruning keeps it.
+            os.utime(staged.parent)
+            return staged
+        
+        # Copy under a temporary name and rename, so a concurrent stage never sees a partial archive.
+        staged.parent.mkdir(parents=True, exist_ok=True)
+        partial = staged.with_name(f"{staged.name}.{os.getpid()}.partial")
+        shutil.copyfile(path, partial)
+        os.chmod(partial, stat.S_IREAD)
+        try:
+            os.replace(partial, staged)
+        except OSError:
+            # Another process staged it first.
+            _remove_path(partial)
+            if not staged.exists():
+                raise
+        self.prune()
+        return staged
+
+    def checkout(self, path: str | Path, archive_hash: str=None):
+        """
+        Stages an archive and returns a private working copy of it, a hardlink if link is set.
+
+        Args:
+            path (str | Path): The archive.
+            archive_hash (str, optional): The hash of the archive, if already known. Defaults to None (hashed here).
+
+        Returns:
+            pathlib.Path: The working copy. Pass it to release once the archive is no longer loaded.
+        """
+        staged = self.stage(path, archive_hash)
+        # The folder is named after this process, so prune can tell when its owner has gone.
+        work = self.folder / "work"
+        work.mkdir(parents=True, exist_ok=True)
+        copy = Path(tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=work)) / staged.name
+        if self.link:
+            try:
+                os.link(staged, copy)
+                return copy
+            except OSError:
+                pass  # Another file system, or no hardlink support. Fall back to a copy.
+        shutil.copyfile(staged, copy)
+        return copy
+
+    def release(self, copy: str | Path):
+        """
+        Removes a working copy returned by checkout.
+
+        Args:
+            copy (str | Path): The working copy.
+
+        Returns:
+            None
+        """
+        if _remove_path(Path(copy).parent):
+            self._protect()
+
+    def prune(self):
+        """
+        Removes the least recently staged archives beyond max_entries, and working copies left behind by
+        processes that have exited (e.g. workers that were killed).
+
+        Returns:
+            None
+        """
+        from psutil import pid_exists
+        
+        archives = self.folder / "archives"
+        if archives.exists():
+            entries = sorted(archives.iterdir(), key=lambda entry: entry.stat().st_mtime, reverse=True)
+            for entry in entries[self.max_entries:]:
+                _remove_path(entry)
+        work = self.folder / "work"
+        if work.exists():
+            unprotected = False
+            for entry in work.iterdir():
+                pid = entry.name.split("-")[0]
+                if pid.isdigit() and not pid_exists(int(pid)):
+                    unprotected = _remove_path(entry) or unprotected
+            if unprotected:
+                self._protect()
+
+    def _protect(self):
+        """
+        Makes every cached archive read-only again, after removing a hardlinked working copy made it writable.
+
+        Returns:
+            None
+        """
+        archives = self.folder / "archives"
+        if not archives.exists():
+            return
+        for staged in archives.glob("*/*"):
+            if not staged.name.endswith(".partial"):
+                try:
+                    os.chmod(staged, stat.S_IREAD)
+                except OSError:
+                    pass
+
+
+def _remove_path(path: Path):
+    """
+    Removes a file or folder, including read-only files, ignoring anything that can't be removed (e.g. a file
+    ASPEN still has open).
+
+    Permissions belong to the inode, so making a hardlinked file writable makes every link to it writable,
+    including a cached archive. Hardlinked files are unlinked as they are, and only made writable where that is
+    refused (Windows won't delete a read-only file).
+
+    Args:
+        path (pathlib.Path): The file or folder.
+
+    Returns:
+        bool: Whether a hardlinked file had to be made writable, so its other links need protecting again.
+    """
+    unprotected = False
+    paths = [path, *path.rglob("*")] if path.is_dir() else [path]
+    for item in paths:
+        try:
+            info = os.lstat(item)
+            if stat.S_ISDIR(info.st_mode):
+                os.chmod(item, stat.S_IREAD | stat.S_IWRITE | stat.S_IEXEC)
+                continue
+            if info.st_nlink > 1:
+                try:
+                    os.unlink(item)
+                    continue
+                except OSError:
+                    unprotected = True
+            os.chmod(item, stat.S_IREAD | stat.S_IWRITE)
+        except OSError:
+            pass
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+    return unprotected
@@ -0,0 +1,585 @@
+import os
+import time
+import queue
+import socket
+import secrets
+import argparse
+
+from pathlib import Path
+from threading import Lock, Thread, Event
+from multiprocessing.managers import BaseManager
+
+from pool import ASPENPool
+
+
+class _CoordinatorState:
+    """
+    The shared bookkeeping of a Coordinator: which agents are connected, how many licences each holds, and
+    their latest health reports. Served to agents through the coordinator's manager.
+    """
+
+    def __init__(self, host_limits: dict, default_limit: int):
+        self.host_limits = dict(host_limits)
+        self.default_limit = default_limit
+        self.agents = {}
+        self.stopping = False
+        self._lock = Lock()
+
+    def register(self, agent_id: str, host: str, licences: int):
+        """
+        Registers an agent and grants it as many slots as its host's licence limit allows.
+
+        Returns:
+            int: The number of slots granted. 0 if the host is already at its limit.
+        """
+        with self._lock:
+            limit = self.host_limits.get(host, self.default_limit)
+            used = sum(agent["slots"] for agent in self.agents.values() if agent["host"] == host)
+            slots = licences if limit is None else max(min(licences, limit - used), 0)
+            self.agents[agent_id] = {"host": host, "slots": slots, "health": {}, "seen": time.time()}
+            return slots
+
+    def heartbeat(self, agent_id: str, health: dict):
+        """
+        Records an agent's health report.
+
+        Returns:
+            str: "running", "stopping" once the coordinator is stopping, or "dropped" if the agent timed out and
+                its slots were freed. A dropped agent's cases have been requeued, so it must stop at once.
+        """
+        with self._lock:
+            if agent_id not in self.agents:
+                return "dropped"
+            self.agents[agent_id]["health"] = health
+            self.agents[agent_id]["seen"] = time.time()
+            return "stopping" if self.stopping else "running"
+
+    def release(self, agent_id: str):
+        """
+        Removes an agent and frees its slots.
+        """
+        with self._lock:
+            self.agents.pop(agent_id, None)
+
+    def snapshot(self):
+        """
+        Returns a copy of every agent's host, slots, health and last heartbeat.
+        """
+        with self._lock:
+            return {agent_id: dict(agent) for agent_id, agent in self.agents.items()}
+
+    def stop(self):
+        """
+        Tells agents to finish their current cases and disconnect.
+        """
+        with self._lock:
+            self.stopping = True
+
+
+class _AgentManager(BaseManager):
+    """
+    The client side of the coordinator's manager, used by agents.
+    """
+
+_AgentManager.register("tasks")
+_AgentManager.register("results")
+_AgentManager.register("state")
+
+
+class Coordinator:
+    """
+    Serves cases to remote agents over a socket and collects their results.
+
+    Cases are put on a task queue that agents pull from, so faster hosts take more work. Each host is
+    limited to the number of ASPEN licences it is allowed, however many agents run on it. An agent whose
+    heartbeats stop has its unfinished cases requeued and its slots freed, and is told to stop if it ever
+    checks in again.
+
+    The manager endpoint unpickles what agents send, so it always needs an explicit shared secret.
+
+    Attributes:
+        address : tuple
+            The (host, port) the coordinator listens on.
+        host_limits : dict
+            Mapping of host names to the most ASPEN instances they may run at once.
+        default_limit : int
+            The limit for hosts not in host_limits, or None for no limit beyond each agent's licences.
+        heartbeat_timeout : float
+            Seconds without a heartbeat before an agent's cases are requeued.
+        retries : int
+            How many times a case lost with its agent is requeued.
+        errors : dict
+            Mapping of failed case IDs to their error message.
+        _in_flight : dict
+            Mapping of agent IDs to the set of case IDs they are running.
+
+    Methods:
+        start():
+            Starts serving.
+        submit(inputs, outputs=None):
+            Queues a case and returns its case ID.
+        results(count, timeout=None):
+            Yields (case_id, outputs) tuples as agents finish cases.
+        map(cases):
+            Runs every case and returns the outputs in order.
+        health():
+            Returns every agent's host, slots and latest health report.
+        close(timeout=None):
+            Tells agents to stop and stops serving.
+    """
+
+    def __init__(self, address: tuple=("127.0.0.1", 50000), authkey: bytes=None, host_limits: dict=None,
+                 default_limit: int=None, heartbeat_timeout: float=60.0, retries: int=1):
+        """
+        Initialize the coordinator. Nothing is served until start() is called or the coordinator is entered.
+
+        Args:
+            address (tuple, optional): The (host, port) to listen on. Defaults to ("127.0.0.1", 50000).
+            authkey (bytes): The shared secret agents must present. Required.
+            host_limits (dict, optional): Mapping of host names to their licence limit. Defaults to None.
+            default_limit (int, optional): The licence limit of hosts not in host_limits. Defaults to None
+                (each agent's own licence count).
+            heartbeat_timeout (float, optional): Seconds without a heartbeat before an agent is dropped and
+                its cases requeued. Defaults to 60.
+            retries (int, optional): How many times a case lost with its agent is requeued. Defaults to 1.
+
+        Raises:
+            ValueError: If no authkey is given.
+        """
+        if not authkey:
+            raise ValueError("An authkey is required. Agents send pickled data, so the endpoint needs a secret.")
+        self.address = tuple(address)
+        self._authkey = authkey
+        self.host_limits = {} if host_limits is None else dict(host_limits)
+        self.default_limit = default_limit
+        self.heartbeat_timeout = heartbeat_timeout
+        self.retries = retries
+        self.errors = {}
+        self._in_flight = {}
+        self._cases = {}
+        self._attempts = {}
+        self._next_case_id = 0
+        self._tasks = queue.Queue()
+        self._results = queue.Queue()
+        self._state = _CoordinatorState(self.host_limits, default_limit)
+        self._server = None
+
+    def __enter__(self):
+        """
+        Starts serving when used with the with keyword.
+
+        Returns:
+            Coordinator: This coordinator.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Stops serving when leaving the with block.
+        """
+        self.close()
+
+    def start(self):
+        """
+        Starts serving the task queue, result queue and agent state on a background thread.
+
+        Returns:
+            None
+        """
+        # A manager class per coordinator, so the registered callables can close over this instance's queues.
+        manager_class = type("CoordinatorManager", (BaseManager,), {})
+        manager_class.register("tasks", callable=lambda: self._tasks)
+        manager_class.register("results", callable=lambda: self._results)
+        manager_class.register("state", callable=lambda: self._state)
+        self._server = manager_class(address=self.address, authkey=self._authkey).get_server()
+        self.address = self._server.address
+        Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def submit(self, inputs: dict, outputs=None):
+        """
+        Queues a case for the agents.
+
+        Args:
+            inputs (dict): Mapping of Variable Explorer addresses to the values to set.
+            outputs (iterable, optional): Addresses to read for this case. Defaults to the agent's outputs.
+
+        Returns:
+            int: The case ID.
+        """
+        case_id = self._next_case_id
+        self._next_case_id += 1
+        self._cases[case_id] = (dict(inputs), None if outputs is None else tuple(outputs))
+        self._tasks.put((case_id, *self._cases[case_id]))
+        return case_id
+
+    def results(self, count: int, timeout: float=None):
+        """
+        Yields finished cases in completion order, as agents stream them back.
+
+        Args:
+            count (int): The number of results to wait for.
+            timeout (float, optional): Give up once this many seconds pass without a case finishing.
+                Defaults to None (wait as long as agents are connected).
+
+        Raises:
+            TimeoutError: If no case finishes within the timeout.
+            RuntimeError: If no agent has been connected for the heartbeat timeout.
+
+        Yields:
+            tuple: (case_id, outputs) where outputs is a dict or None if the case failed.
+        """
+        remaining = count
+        last_finished = time.time()
+        alone_since = None
+        while remaining:
+            try:
+                status, agent_id, case_id, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                status = None
+
+            finished = []
+            if status == "started":
+                self._in_flight.setdefault(agent_id, set()).add(case_id)
+                self._attempts[case_id] = self._attempts.get(case_id, 0) + 1
+            elif status in ("done", "failed"):
+                self._in_flight.get(agent_id, set()).discard(case_id)
+                # A requeued case may finish twice. Only the first result counts.
+                if self._cases.pop(case_id, None) is not None:
+                    if status == "failed":
+                        self.errors[case_id] = payload
+                        payload = None
+                    finished.append((case_id, payload))
+
+            # Requeue the cases of agents that have gone quiet.
+            finished.extend(self._check_agents())
+
+            for case_id, outputs in finished:
+                remaining -= 1
+                yield case_id, outputs
+
+            # Nothing will ever finish without an agent, so give up rather than wait forever.
+            now = time.time()
+            if finished:
+                last_finished = now
+            elif timeout is not None and now - last_finished > timeout:
+                raise TimeoutError(f"No case finished in {timeout} seconds. {remaining} cases are outstanding.")
+            if self._state.snapshot():
+                alone_since = None
+            elif alone_since is None:
+                alone_since = now
+            elif now - alone_since > self.heartbeat_timeout:
+                raise RuntimeError(f"No agent connected for {self.heartbeat_timeout} seconds. "
+                                   f"{remaining} cases are outstanding.")
+
+    def _check_agents(self):
+        """
+        Drops agents that have stopped sending heartbeats and requeues the cases of agents that are gone.
+
+        Returns:
+            list: (case_id, None) tuples for cases that ran out of retries.
+        """
+        now = time.time()
+        agents = self._state.snapshot()
+        lost = {}
+        for agent_id, agent in agents.items():
+            if now - agent["seen"] > self.heartbeat_timeout:
+                self._state.release(agent_id)
+                lost[agent_id] = f"Agent {agent_id} on {agent['host']} stopped responding"
+        
+        # An agent that released itself, or was dropped and then reported a case starting, is gone for good. Agents
+        # put every message before releasing, so once the queue is empty whatever they still hold was lost.
+        if self._results.empty():
+            for agent_id in self._in_flight:
+                if agent_id not in agents:
+                    lost.setdefault(agent_id, f"Agent {agent_id} disconnected with cases in flight")
+        
+        given_up = []
+        for agent_id, reason in lost.items():
+            for case_id in self._in_flight.pop(agent_id, set()):
+                if case_id not in self._cases:
+                    continue
+                if self._attempts.get(case_id, 0) <= self.retries:
+                    self._tasks.put((case_id, *self._cases[case_id]))
+                else:
+                    del self._cases[case_id]
+                    self.errors[case_id] = reason
+                    given_up.append((case_id, None))
+        return given_up
+
+    def map(self, cases):
+        """
+        Runs every case and returns the outputs in the order the cases were given.
+
+        Args:
+            cases (iterable): Input dictionaries, one per case.
+
+        Returns:
+            list: The outputs of each case, None for failed cases.
+        """
+        case_ids = [self.submit(inputs) for inputs in cases]
+        results = dict(self.results(len(case_ids)))
+        return [results[case_id] for case_id in case_ids]
+
+    def health(self):
+        """
+        Returns every connected agent's host, slots, latest health report and last heartbeat time.
+
+        Returns:
+            dict: Mapping of agent IDs to their state.
+        """
+        return self._state.snapshot()
+
+    def close(self, timeout: float=None):
+        """
+        Tells agents to finish their current cases and disconnect, then stops serving.
+
+        Args:
+            timeout (float, optional): The longest to wait for agents to disconnect, in seconds.
+                Defaults to the heartbeat timeout.
+
+        Returns:
+            None
+        """
+        if self._server is None:
+            return
+        if timeout is None: timeout = self.heartbeat_timeout
+        self._state.stop()
+        deadline = time.time() + timeout
+        while self._state.snapshot() and time.time() < deadline:
+            time.sleep(0.1)
+        self._server.stop_event.set()
+        self._server = None
+
+
+class Agent:
+    """
+    Pulls cases from a Coordinator and runs them on a local ASPENPool, streaming results back.
+
+    The agent asks the coordinator for as many slots as it has licences and runs one pool worker per granted
+    slot, so the pool's crash isolation and retries apply on every host. A background thread reports
+    health as a heartbeat. If the coordinator has dropped the agent, its cases have already been requeued and
+    its slots may belong to another agent, so it kills its workers and stops at once.
+
+    Attributes:
+        address : tuple
+            The (host, port) of the coordinator.
+        aspen_path : pathlib.Path
+            The path to the ASPEN file on this host.
+        licences : int
+            The most ASPEN instances this agent asks for.
+        host : str
+            The host name reported to the coordinator.
+        agent_id : str
+            The ID of this agent.
+        slots : int
+            The number of slots granted by the coordinator.
+        done : int
+            The number of cases finished.
+        failed : int
+            The number of cases failed.
+
+    Methods:
+        run():
+            Connects to the coordinator and runs cases until it stops.
+        health():
+            Returns this agent's health report.
+    """
+
+    def __init__(self, address: tuple, aspen_path: str | Path, authkey: bytes, licences: int=1,
+                 host: str=None, outputs=(), heartbeat_interval: float=5.0, poll_interval: float=0.5,
+                 pool_options: dict=None):
+        """
+        Initialize the agent.
+
+        Args:
+            address (tuple): The (host, port) of the coordinator.
+            aspen_path (str | Path): The path to the ASPEN file on this host.
+            authkey (bytes): The coordinator's shared secret.
+            licences (int, optional): The most ASPEN instances to run. Defaults to 1.
+            host (str, optional): The host name reported to the coordinator. Defaults to this machine's name.
+            outputs (iterable, optional): Addresses to read after each case unless the case gives its own.
+                Defaults to ().
+            heartbeat_interval (float, optional): Seconds between heartbeats. Defaults to 5.
+            poll_interval (float, optional): Seconds to wait for a case before checking in again. Defaults to 0.5.
+            pool_options (dict, optional): Keyword arguments passed to ASPENPool, e.g. aspen_class, timeout
+                or retries. Defaults to None.
+        """
+        self.address = tuple(address)
+        self.aspen_path = Path(aspen_path)
+        self._authkey = authkey
+        self.licences = licences
+        self.host = socket.gethostname() if host is None else host
+        self.agent_id = f"{self.host}-{os.getpid()}"
+        self.outputs = tuple(outputs)
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self._pool_options = {} if pool_options is None else dict(pool_options)
+        self.slots = 0
+        self.done = 0
+        self.failed = 0
+        self._in_flight = {}
+        self._pool = None
+        self._stopping = Event()
+        self._dropped = Event()
+
+    def health(self):
+        """
+        Returns this agent's health report.
+
+        Returns:
+            dict: The host, slots, cases in flight, finished and failed counts, recycled workers and time.
+        """
+        return {
+            "host": self.host,
+            "slots": self.slots,
+            "in_flight": len(self._in_flight),
+            "done": self.done,
+            "failed": self.failed,
+            "recycled": self._pool.recycled if self._pool is not None else 0,
+            "time": time.time()
+        }
+
+    def _heartbeat(self, state):
+        """
+        Reports health every heartbeat_interval seconds until the agent stops.
+        """
+        while not self._stopping.is_set():
+            status = state.heartbeat(self.agent_id, self.health())
+            if status == "dropped":
+                self._dropped.set()
+            if status != "running":
+                self._stopping.set()
+            self._stopping.wait(self.heartbeat_interval)
+
+    def run(self):
+        """
+        Connects to the coordinator, pulls cases into the local pool while slots are free, and streams each
+        result back as it finishes. Returns once the coordinator stops and the cases in flight are done, or at
+        once if the coordinator has dropped this agent.
+
+        Returns:
+            None
+        """
+        manager = _AgentManager(address=self.address, authkey=self._authkey)
+        manager.connect()
+        tasks, results, state = manager.tasks(), manager.results(), manager.state()
+        self.slots = state.register(self.agent_id, self.host, self.licences)
+        if not self.slots:
+            state.release(self.agent_id)
+            return
+        heartbeat = Thread(target=self._heartbeat, args=(state,), daemon=True)
+        heartbeat.start()
+        try:
+            with ASPENPool(self.aspen_path, processes=self.slots, outputs=self.outputs,
+                           log_folder=f"ASPEN Agent {self.agent_id}", **self._pool_options) as pool:
+                self._pool = pool
+                while True:
+                    if self._dropped.is_set():
+                        # Abandon the cases in flight. The coordinator has requeued them.
+                        pool.close(timeout=0)
+                        break
+                    
+                    # Only take as many cases as there are slots, so other agents can take the rest.
+                    while len(self._in_flight) < self.slots and not self._stopping.is_set():
+                        try:
+                            case_id, inputs, outputs = tasks.get(timeout=self.poll_interval)
+                        except queue.Empty:
+                            break
+                        self._in_flight[pool.submit(inputs, outputs)] = case_id
+                        results.put(("started", self.agent_id, case_id, None))
+                    if not self._in_flight:
+                        if self._stopping.is_set():
+                            break
+                        continue
+
+                    # Stream the next result back as soon as it finishes, checking in every poll interval.
+                    for local_id, outputs in pool.results(1, timeout=self.poll_interval):
+                        case_id = self._in_flight.pop(local_id)
+                        if local_id in pool.errors:
+                            self.failed += 1
+                            results.put(("failed", self.agent_id, case_id, pool.errors[local_id]))
+                        else:
+                            self.done += 1
+                            results.put(("done", self.agent_id, case_id, outputs))
+        finally:
+            self._stopping.set()
+            heartbeat.join()
+            state.release(self.agent_id)
+
+
+def _run_agent(address, aspen_path, authkey, licences, host, outputs, pool_options):
+    """
+    Runs an Agent. The target of the local agent processes started by demo().
+    """
+    Agent(address, aspen_path, authkey, licences, host, outputs, pool_options=pool_options).run()
+
+
+def demo(agents: int=2, licences: int=2, cases: int=20, host_limit: int=3):
+    """
+    Runs a coordinator and local agents end to end against the simulated backend.
+
+    Every agent reports the same host name, so the host limit caps the total number of slots.
+
+    Args:
+        agents (int, optional): The number of local agent processes. Defaults to 2.
+        licences (int, optional): The licences each agent asks for. Defaults to 2.
+        cases (int, optional): The number of cases. Defaults to 20.
+        host_limit (int, optional): The licence limit of the shared host. Defaults to 3.
+
+    Returns:
+        dict: The number of cases that finished and failed, the wall time, and the agents' health.
+    """
+    import multiprocessing
+    from backends import SimulatedBackend
+
+    address = ("127.0.0.1", 0)
+    authkey = secrets.token_bytes(16)
+    backend = SimulatedBackend(latency=0.001, solve_time=0.1, create_missing=True)
+    pool_options = {"aspen_options": {"verbose": False, "backend": backend}}
+    start_time = time.time()
+    with Coordinator(address, authkey, host_limits={"demo-host": host_limit}, heartbeat_timeout=10.0) as coordinator:
+        processes = [
+            multiprocessing.Process(target=_run_agent, args=(coordinator.address, __file__, authkey, licences,
+                                                              "demo-host", (), pool_options))
+            for _ in range(agents)
+        ]
+        for process in processes:
+            process.start()
+        results = coordinator.map([{"\\Data\\Blocks\\B1\\Input\\VALUE": float(i)} for i in range(cases)])
+        health = coordinator.health()
+        coordinator.close()
+        for process in processes:
+            process.join()
+    return {
+        "done": sum(result is not None for result in results),
+        "failed": len(coordinator.errors),
+        "wall_time": time.time() - start_time,
+        "agents": health
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run ASPEN cases across hosts.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # Agent: run on each ASPEN host.
+    agent_parser = subparsers.add_parser("agent", help="Pull cases from a coordinator and run them.")
+    agent_parser.add_argument("coordinator", help="The coordinator's host:port.")
+    agent_parser.add_argument("aspen_path", help="The ASPEN file on this host.")
+    agent_parser.add_argument("--licences", type=int, default=1, help="The most ASPEN instances to run.")
+    agent_parser.add_argument("--authkey", required=True, help="The coordinator's shared secret.")
+
+    # Demo: coordinator and local agents on one machine with the simulated backend.
+    demo_parser = subparsers.add_parser("demo", help="Run end to end on this machine with the simulated backend.")
+    demo_parser.add_argument("--agents", type=int, default=2)
+    demo_parser.add_argument("--licences", type=int, default=2)
+    demo_parser.add_argument("--cases", type=int, default=20)
+    demo_parser.add_argument("--host-limit", type=int, default=3)
+
+    args = parser.parse_args()
+    if args.command == "agent":
+        host, port = args.coordinator.rsplit(":", 1)
+        Agent((host, int(port)), args.aspen_path, args.authkey.encode(), args.licences).run()
+    else:
+        print(demo(args.agents, args.licences, args.cases, args.host_limit))
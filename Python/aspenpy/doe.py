@@ -0,0 +1,534 @@
+import time
+import queue
+import random
+import multiprocessing
+
+from math import dist
+from pathlib import Path
+from statistics import median
+
+from aspen import ASPEN, kill_process_tree
+from pool import prepare_sweep
+from timings import Timings
+from sweep import ResultStore, Sweep, grid_cases, latin_hypercube_cases
+
+# Primitive polynomials and initial direction numbers for Sobol dimensions 2 to 16, from Joe and Kuo.
+# Each entry is (degree s, coefficients a, initial direction numbers m_1..m_s). Dimension 1 is van der Corput.
+SOBOL_DIRECTIONS = (
+    (1, 0, (1,)),
+    (2, 1, (1, 3)),
+    (3, 1, (1, 3, 1)),
+    (3, 2, (1, 1, 1)),
+    (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)),
+    (5, 2, (1, 1, 5, 5, 17)),
+    (5, 4, (1, 1, 5, 5, 5)),
+    (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)),
+    (5, 13, (1, 1, 1, 3, 11)),
+    (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)),
+    (6, 13, (1, 1, 1, 15, 21, 21)),
+    (6, 16, (1, 3, 1, 13, 27, 49)),
+)
+
+# Bits of precision of the Sobol points.
+SOBOL_BITS = 30
+
+# The case-level stages of the ASPEN timings, used to estimate the time per case.
+CASE_STAGES = ("reset", "input_set", "solve", "output_read", "save_export")
+
+
+def _sobol_directions(dimension: int):
+    """
+    Returns the direction numbers of one Sobol dimension.
+
+    Args:
+        dimension (int): The 0-based dimension.
+
+    Returns:
+        list: SOBOL_BITS direction numbers.
+    """
+    if dimension == 0:
+        return [1 << (SOBOL_BITS - k) for k in range(1, SOBOL_BITS + 1)]
+    s, a, m = SOBOL_DIRECTIONS[dimension - 1]
+    v = [m[k] << (SOBOL_BITS - k - 1) for k in range(s)]
+    for k in range(s, SOBOL_BITS):
+        value = v[k - s] ^ (v[k - s] >> s)
+        for j in range(1, s):
+            if (a >> (s - 1 - j)) & 1:
+                value ^= v[k - j]
+        v.append(value)
+    return v
+
+
+def sobol_cases(bounds: dict, samples: int, seed: int=0, scramble: bool=True):
+    """
+    Builds a Sobol design over the given bounds.
+
+    Powers of two give the best balanced designs. With scramble, each dimension gets a random digital shift,
+    which keeps the low-discrepancy structure but moves the first point off the lower corner.
+
+    Args:
+        bounds (dict): Mapping of addresses to (low, high) tuples. At most 16 addresses.
+        samples (int): The number of cases.
+        seed (int, optional): The random seed of the scramble. Defaults to 0.
+        scramble (bool, optional): Apply a random digital shift. Defaults to True.
+
+    Raises:
+        ValueError: If there are more addresses than Sobol dimensions.
+
+    Returns:
+        list: One input dictionary per sample.
+    """
+    if len(bounds) > len(SOBOL_DIRECTIONS) + 1:
+        raise ValueError(f"Sobol designs support at most {len(SOBOL_DIRECTIONS) + 1} addresses.")
+    rng = random.Random(seed)
+    directions = [_sobol_directions(d) for d in range(len(bounds))]
+    shifts = [rng.getrandbits(SOBOL_BITS) if scramble else 0 for _ in bounds]
+
+    # Gray-code order: each point differs from the last by one direction number per dimension.
+    x = [0] * len(bounds)
+    cases = []
+    for n in range(samples):
+        cases.append({
+            address: low + (high - low) * ((x[d] ^ shifts[d]) / (1 << SOBOL_BITS))
+            for d, (address, (low, high)) in enumerate(bounds.items())
+        })
+        c = ((n + 1) & -(n + 1)).bit_length() - 1  # Index of the lowest set bit of n + 1
+        for d in range(len(bounds)):
+            x[d] ^= directions[d][c]
+    return cases
+
+
+def full_factorial_cases(bounds: dict, levels: int | dict=3):
+    """
+    Builds a full-factorial design with evenly spaced levels between the bounds.
+
+    Args:
+        bounds (dict): Mapping of addresses to (low, high) tuples.
+        levels (int | dict, optional): The number of levels, for every address or per address. Defaults to 3.
+
+    Returns:
+        list: One input dictionary per grid point.
+    """
+    space = {}
+    for address, (low, high) in bounds.items():
+        n = levels[address] if isinstance(levels, dict) else levels
+        space[address] = [low + (high - low) * i / (n - 1) for i in range(n)] if n > 1 else [(low + high) / 2]
+    return grid_cases(space)
+
+
+def adaptive_cases(pairs, output: str, samples: int, bounds: dict=None, neighbours: int=4):
+    """
+    Proposes new cases where a finished design shows the output changing fastest.
+
+    Every finished case is paired with its nearest neighbours in scaled input space. Each pair is scored by
+    the change in the output across it, and the midpoints of the highest-scoring pairs become the new cases.
+
+    Args:
+        pairs (iterable): (input dict, output dict) tuples of finished cases, e.g. from surrogate.training_data.
+        output (str): The output address to refine on.
+        samples (int): The number of new cases.
+        bounds (dict, optional): Mapping of addresses to (low, high) tuples used to scale the inputs.
+            Defaults to None (the range of the finished cases).
+        neighbours (int, optional): How many neighbours each case is paired with. Defaults to 4.
+
+    Returns:
+        list: The new input dictionaries, highest-scoring first.
+    """
+    pairs = [(inputs, outputs) for inputs, outputs in pairs if isinstance(outputs.get(output), (int, float))]
+    if len(pairs) < 2:
+        return []
+    addresses = list(pairs[0][0])
+    if bounds is None:
+        bounds = {address: (min(inputs[address] for inputs, _ in pairs), max(inputs[address] for inputs, _ in pairs))
+                  for address in addresses}
+    points = [[(inputs[address] - bounds[address][0]) / ((bounds[address][1] - bounds[address][0]) or 1)
+               for address in addresses] for inputs, _ in pairs]
+
+    # Score each nearest-neighbour pair by the output change across it, counting each pair once.
+    scores = {}
+    for i, point in enumerate(points):
+        nearest = sorted((dist(point, other), j) for j, other in enumerate(points) if j != i)[:neighbours]
+        for _, j in nearest:
+            scores[min(i, j), max(i, j)] = abs(pairs[i][1][output] - pairs[j][1][output])
+
+    # Propose the midpoints of the highest-scoring pairs, skipping duplicates.
+    existing = {tuple(inputs[address] for address in addresses) for inputs, _ in pairs}
+    cases = []
+    for i, j in sorted(scores, key=scores.get, reverse=True):
+        midpoint = {address: (pairs[i][0][address] + pairs[j][0][address]) / 2 for address in addresses}
+        key = tuple(midpoint.values())
+        if key not in existing:
+            existing.add(key)
+            cases.append(midpoint)
+        if len(cases) == samples:
+            break
+    return cases
+
+
+def morton_order(cases, bounds: dict=None, bits: int=10):
+    """
+    Orders cases along a Z-order (Morton) curve so that neighbouring cases are close in input space.
+
+    This is O(n log n), so it scales to designs that are too big for sweep.nearest_neighbour_order.
+
+    Args:
+        cases (list): Input dictionaries with numeric values.
+        bounds (dict, optional): Mapping of addresses to (low, high) tuples. Defaults to None (the range of the cases).
+        bits (int, optional): Bits per address of the curve. Defaults to 10.
+
+    Returns:
+        list: The same cases, reordered.
+    """
+    if len(cases) < 3:
+        return list(cases)
+    addresses = sorted(cases[0])
+    if bounds is None:
+        bounds = {address: (min(inputs[address] for inputs in cases), max(inputs[address] for inputs in cases))
+                  for address in addresses}
+    top = (1 << bits) - 1
+
+    def key(inputs):
+        # Quantise each address, then interleave their bits from the most significant down.
+        cells = [min(max(int((inputs[address] - bounds[address][0])
+                             / ((bounds[address][1] - bounds[address][0]) or 1) * top), 0), top)
+                 for address in addresses]
+        code = 0
+        for bit in range(bits - 1, -1, -1):
+            for cell in cells:
+                code = (code << 1) | ((cell >> bit) & 1)
+        return code
+
+    return sorted(cases, key=key)
+
+
+def shard_cases(cases, workers: int, bounds: dict=None):
+    """
+    Splits cases into one contiguous block of the Morton order per worker.
+
+    Each worker gets a compact region of input space, so with warm starts every solve begins near the
+    previous converged state. Shard sizes differ by at most one case.
+
+    Args:
+        cases (list): Input dictionaries.
+        workers (int): The number of shards.
+        bounds (dict, optional): Passed to morton_order. Defaults to None.
+
+    Returns:
+        list: One list of input dictionaries per worker.
+    """
+    ordered = morton_order(list(cases), bounds)
+    size, extra = divmod(len(ordered), workers)
+    shards, start = [], 0
+    for worker in range(workers):
+        end = start + size + (worker < extra)
+        shards.append(ordered[start:end])
+        start = end
+    return shards
+
+
+def estimate_wall_time(shards, timings: Timings=None, store: ResultStore=None, per_case: float=None,
+                       startup: float=None, bounds: dict=None):
+    """
+    Estimates the wall time of running shards in parallel, from measured timings.
+
+    The time per case comes from, in order of preference: the elapsed time of the nearest finished case in
+    the store (so slow regions of input space stay slow), the case-level stages of the timings, or per_case.
+    Startup (dispatch and archive load) comes from the timings unless given.
+
+    Args:
+        shards (list): One list of input dictionaries per worker, e.g. from shard_cases.
+        timings (Timings, optional): Measured timings, e.g. Timings.from_jsonl over a previous sweep's logs.
+        store (ResultStore, optional): A store of finished cases with elapsed times.
+        per_case (float, optional): Seconds per case, used when nothing better is available.
+        startup (float, optional): Seconds for each worker to dispatch ASPEN, stage and load the archive.
+        bounds (dict, optional): Mapping of addresses to (low, high) tuples used to scale the inputs when
+            finding the nearest finished case. Defaults to None (the range of the finished cases).
+
+    Raises:
+        ValueError: If there is nothing to estimate the time per case from.
+
+    Returns:
+        dict: The number of cases and workers, the seconds per case and per worker startup, the estimated
+            seconds of each shard, and the estimated wall time (the slowest shard).
+    """
+    summary = timings.summary() if timings is not None else {}
+    if startup is None:
+        startup = sum(summary[stage]["mean"] for stage in ("dispatch", "archive_stage", "archive_load")
+                      if stage in summary)
+    if "solve" in summary:
+        per_case = sum(summary[stage]["total"] for stage in CASE_STAGES if stage in summary) / summary["solve"]["count"]
+
+    # Finished cases let each case be timed by its nearest measured neighbour.
+    measured = []
+    if store is not None:
+        measured = [(row["inputs"], row["elapsed"]) for row in store.rows(status="done") if row["elapsed"] is not None]
+        if per_case is None and measured:
+            per_case = median(elapsed for _, elapsed in measured)
+    if per_case is None:
+        raise ValueError("No timings to estimate from. Give timings, a store with finished cases, or per_case.")
+
+    # Scale every address to [0, 1] so no address dominates the distance.
+    addresses = sorted({address for inputs, _ in measured for address, value in inputs.items()
+                        if isinstance(value, (int, float))})
+    if bounds is None:
+        bounds = {address: (min(inputs.get(address, 0) for inputs, _ in measured),
+                            max(inputs.get(address, 0) for inputs, _ in measured)) for address in addresses}
+
+    def point(inputs):
+        return [(inputs.get(address, 0) - bounds[address][0]) / ((bounds[address][1] - bounds[address][0]) or 1)
+                for address in addresses]
+
+    measured_points = [(point(inputs), elapsed) for inputs, elapsed in measured]
+
+    def case_time(inputs):
+        if not measured_points:
+            return per_case
+        case_point = point(inputs)
+        return min(measured_points, key=lambda item: dist(case_point, item[0]))[1]
+
+    shard_times = [startup + sum(case_time(inputs) for inputs in shard) for shard in shards]
+    return {
+        "cases": sum(len(shard) for shard in shards),
+        "workers": len(shards),
+        "per_case": per_case,
+        "startup": startup,
+        "shard_times": shard_times,
+        "wall_time": max(shard_times, default=0.0)
+    }
+
+
+def _shard_worker(shard_id, cases, aspen_class, aspen_options, aspen_path, log_folder, store_path, outputs, reload,
+                  timeout, warm_start, result_queue):
+    """
+    Runs one shard of a design on its own ASPEN instance, storing each case as it finishes.
+
+    Args:
+        shard_id (int): The index of the shard.
+        cases (list): The input dictionaries of the shard.
+        aspen_class (type): The ASPEN class (or subclass) to instantiate.
+        aspen_options (dict): Keyword arguments passed to aspen_class.
+        aspen_path (pathlib.Path): The path to the ASPEN file.
+        log_folder (str): The base name of the log folder.
+        store_path (pathlib.Path): The path to the result store shared by every shard.
+        outputs (tuple): Addresses to read after each case.
+        reload (bool): Reload the archive between cases instead of reinitialising.
+        timeout (float): Wall-clock limit per case in seconds, or None.
+        warm_start (bool): Carry the converged state from case to case.
+        result_queue (multiprocessing.Queue): Receives ("ready", shard_id, ASPEN process IDs) once connected and
+            ("done", shard_id, summary) when the shard finishes.
+
+    Returns:
+        None
+    """
+    with aspen_class(f"{log_folder} Shard {shard_id}", **aspen_options) as aspen:
+        aspen.connect_to_aspen(aspen_path)
+        # Tell the parent which ASPEN processes are ours, so only they are killed if another shard dies.
+        result_queue.put(("ready", shard_id, aspen.aspen_pids))
+        with ResultStore(store_path) as store:
+            # Sweep skips cases already completed in the store.
+            summary = Sweep(cases, store, outputs).run(aspen, reload=reload, timeout=timeout, warm_start=warm_start)
+    result_queue.put(("done", shard_id, summary))
+
+
+class Design:
+    """
+    A design of experiments over named ASPEN input addresses, with sharding and a dry-run estimate.
+
+    Attributes:
+        cases : list
+            The input dictionaries of every case.
+        bounds : dict
+            Mapping of addresses to (low, high) tuples, used to scale the inputs. None if unknown.
+
+    Methods:
+        full_factorial(bounds, levels=3):
+            Builds a full-factorial design.
+        sobol(bounds, samples, seed=0, scramble=True):
+            Builds a Sobol design.
+        latin_hypercube(bounds, samples, seed=0):
+            Builds a Latin-hypercube design.
+        adaptive(pairs, output, samples, bounds=None, neighbours=4):
+            Builds a refinement design from finished cases.
+        shards(workers):
+            Splits the cases into locality-friendly blocks, one per worker.
+        estimate(workers, timings=None, store=None, per_case=None, startup=None):
+            Estimates the wall time of running the design.
+        run(aspen_path, store, workers, outputs=(), ...):
+            Runs the design, one process and ASPEN instance per shard.
+    """
+
+    def __init__(self, cases, bounds: dict=None):
+        """
+        Initialize the design.
+
+        Args:
+            cases (iterable): Input dictionaries, one per case.
+            bounds (dict, optional): Mapping of addresses to (low, high) tuples. Defaults to None.
+        """
+        self.cases = [dict(inputs) for inputs in cases]
+        self.bounds = bounds
+
+    def __len__(self):
+        return len(self.cases)
+
+    @classmethod
+    def full_factorial(cls, bounds: dict, levels: int | dict=3):
+        """
+        Builds a full-factorial design. See full_factorial_cases.
+
+        Returns:
+            Design: The design.
+        """
+        return cls(full_factorial_cases(bounds, levels), bounds)
+
+    @classmethod
+    def sobol(cls, bounds: dict, samples: int, seed: int=0, scramble: bool=True):
+        """
+        Builds a Sobol design. See sobol_cases.
+
+        Returns:
+            Design: The design.
+        """
+        return cls(sobol_cases(bounds, samples, seed, scramble), bounds)
+
+    @classmethod
+    def latin_hypercube(cls, bounds: dict, samples: int, seed: int=0):
+        """
+        Builds a Latin-hypercube design. See sweep.latin_hypercube_cases.
+
+        Returns:
+            Design: The design.
+        """
+        return cls(latin_hypercube_cases(bounds, samples, seed), bounds)
+
+    @classmethod
+    def adaptive(cls, pairs, output: str, samples: int, bounds: dict=None, neighbours: int=4):
+        """
+        Builds a refinement design from finished cases. See adaptive_cases.
+
+        Returns:
+            Design: The design.
+        """
+        return cls(adaptive_cases(pairs, output, samples, bounds, neighbours), bounds)
+
+    def shards(self, workers: int):
+        """
+        Splits the cases into locality-friendly blocks, one per worker. See shard_cases.
+
+        Args:
+            workers (int): The number of workers.
+
+        Returns:
+            list: One list of input dictionaries per worker.
+        """
+        return shard_cases(self.cases, workers, self.bounds)
+
+    def estimate(self, workers: int, timings: Timings=None, store: ResultStore=None, per_case: float=None,
+                 startup: float=None):
+        """
+        Estimates the wall time of running the design on workers. See estimate_wall_time.
+
+        Returns:
+            dict: The estimate.
+        """
+        return estimate_wall_time(self.shards(workers), timings, store, per_case, startup, self.bounds)
+
+    def run(self, aspen_path: str | Path, store: str | Path, workers: int, outputs=(), log_folder: str=None,
+            aspen_class: type=ASPEN, aspen_options: dict=None, reload: bool=False, timeout: float=None,
+            warm_start: bool=False, dry_run: bool=False, timings: Timings=None, per_case: float=None):
+        """
+        Runs the design, one process and ASPEN instance per shard, all appending to one result store.
+
+        Cases already completed in the store are skipped, so a rerun resumes. With dry_run nothing is run and
+        the wall-time estimate is returned instead.
+
+        Args:
+            aspen_path (str | Path): The path to the ASPEN file.
+            store (str | Path): The path to the result store.
+            workers (int): The number of shards and worker processes.
+            outputs (iterable, optional): Addresses to read after each case. Defaults to ().
+            log_folder (str, optional): The base name of the shard log folders. Defaults to 'ASPEN Design'.
+            aspen_class (type, optional): The ASPEN class (or subclass) each worker uses. Defaults to ASPEN.
+            aspen_options (dict, optional): Keyword arguments passed to aspen_class. Defaults to None.
+            reload (bool, optional): Reload the archive between cases instead of reinitialising. Defaults to False.
+            timeout (float, optional): Wall-clock limit per case in seconds. Defaults to None (no limit).
+            warm_start (bool, optional): Carry the converged state from case to case within a shard.
+                Defaults to False.
+            dry_run (bool, optional): Only estimate the wall time. Defaults to False.
+            timings (Timings, optional): Measured timings for the dry-run estimate. Defaults to None.
+            per_case (float, optional): Seconds per case for the dry-run estimate. Defaults to None.
+
+        Raises:
+            ValueError: If the ASPEN path does not exist.
+            RuntimeError: If a shard's worker exits without reporting. The other shards are killed first.
+
+        Returns:
+            dict: With dry_run, the estimate. Otherwise the number of cases that finished and failed, and the
+                wall time.
+        """
+        if log_folder is None: log_folder = 'ASPEN Design'
+        aspen_path = Path(aspen_path)
+        if not aspen_path.exists():
+            raise ValueError(f"ASPEN path invalid: {aspen_path}")
+
+        # Only the cases still to run are sharded, so a resumed design stays balanced.
+        store = Path(store)
+        with ResultStore(store) as result_store:
+            pending = Sweep(self.cases, result_store).pending()
+            shards = shard_cases(pending, workers, self.bounds)
+            if dry_run:
+                return estimate_wall_time(shards, timings, result_store, per_case, bounds=self.bounds)
+
+        # Prepare the backend, hash the archive and stage it once. Every shard only loads what was prepared.
+        aspen_options = {} if aspen_options is None else dict(aspen_options)
+        aspen_options["archive_hash"] = prepare_sweep(aspen_path, aspen_options)
+
+        start_time = time.time()
+        context = multiprocessing.get_context()
+        result_queue = context.Queue()
+        # Shared by every shard, as in ASPENPool, so each can tell its own ASPEN process apart from the others'.
+        aspen_options["dispatch_lock"] = context.Lock()
+        processes = {}
+        for shard_id, cases in enumerate(shards):
+            if not cases:
+                continue
+            process = context.Process(
+                target=_shard_worker,
+                args=(shard_id, cases, aspen_class, aspen_options, aspen_path, log_folder, store, tuple(outputs),
+                      reload, timeout, warm_start, result_queue),
+                daemon=True
+            )
+            process.start()
+            processes[shard_id] = process
+
+        summary = {"done": 0, "failed": 0}
+        shard_pids = {}
+        waiting = set(processes)
+        while waiting:
+            try:
+                status, shard_id, payload = result_queue.get(timeout=1.0)
+            except queue.Empty:
+                # A worker that died without reporting would otherwise leave us waiting forever.
+                dead = [shard_id for shard_id in waiting if not processes[shard_id].is_alive()]
+                if dead and result_queue.empty():
+                    # Stop the other shards and their ASPEN processes rather than leave them running unsupervised.
+                    kill_process_tree([pid for shard_id, process in processes.items()
+                                       for pid in (process.pid, *shard_pids.get(shard_id, []))])
+                    for process in processes.values():
+                        process.join()
+                    raise RuntimeError(f"Shard {dead} exited without reporting. Rerun the design to resume it.")
+                continue
+            if status == "ready":
+                shard_pids[shard_id] = payload
+                continue
+            shard_summary = payload
+            waiting.discard(shard_id)
+            summary["done"] += shard_summary["done"]
+            summary["failed"] += shard_summary["failed"]
+        for process in processes.values():
+            process.join()
+        summary["wall_time"] = time.time() - start_time
+        return summary
@@ -1,7 +1,15 @@
 from aspen import ASPEN
+from cache import ARCHIVE_CACHE
+from pool import ASPENPool
+from sweep import Sweep
+from progress import Progress
 from multiprocessing import Pool
 from pathlib import Path
 
+# Path to the ASPEN file used by the multiprocessing examples
+ASPEN_PATH = r"C:\Users\SWAMINATHU\OneDrive - NOVA Chemicals Corporation\My Stuff" \
+             r"\Jodell Project\Experimentation\LDPE Simulation\LDPE Simulation2-Mixing,GE,Tadj,PH2ADJ.bkp"
+
 class AspenExample(ASPEN):
     """
     A class to represent an example of using ASPEN.
@@ -27,8 +35,9 @@ class AspenExample(ASPEN):
             log_folder : str
                 The folder where logs will be stored.
         """
-        super().__init__(log_folder=log_folder)  # Initialize the parent ASPEN class with the log folder
-        self.connect_to_aspen()  # Connect to the ASPEN software
+        # Initialize the parent ASPEN class with the log folder. Interactive, so the file can be picked in a dialog.
+        super().__init__(log_folder=log_folder, interactive=True)
+        self.connect_to_aspen()  # Connect to the ASPEN software, using ASPEN_PATH or path_param.json if set
     
     def set_coldshot_ratio(self, ratio):
         """
@@ -158,6 +167,54 @@ class AspenMultiProcessingExample(ASPEN):
             # Raise an error if unable to get the production rate
             raise RuntimeError("Unable to get production rate")
 
+class AspenPoolExample(AspenExample):
+    """
+    A class to represent an example of using ASPEN with ASPENPool.
+
+    Each pool worker creates one instance and reuses it for every case it is given.
+
+    Methods
+    -------
+    run_case(inputs, outputs, autosave, timeout):
+        Sets the coldshot ratio, runs ASPEN and returns the production rate.
+    """
+    def __init__(self, log_folder: str, **options):
+        """
+        Constructs the AspenPoolExample object without connecting. ASPENPool connects each worker itself.
+
+        Parameters
+        ----------
+            log_folder : str
+                The folder where logs will be stored.
+            **options
+                Passed to ASPEN, e.g. the pool's shared log queue and the archive cache.
+        """
+        ASPEN.__init__(self, log_folder=log_folder, **options)  # Skip AspenExample.__init__, which prompts for a file
+    
+    def run_case(self, inputs, outputs=(), autosave=False, timeout=None):
+        """
+        Sets the coldshot ratio, runs ASPEN and returns the production rate.
+
+        Parameters
+        ----------
+        inputs : dict
+            The case. Must contain a "coldshot_ratio" key.
+        outputs : iterable
+            Unused. The production rate is always returned.
+        autosave : bool
+            Whether to autosave the results.
+        timeout : float
+            Wall-clock limit for the run in seconds, or None.
+
+        Returns
+        -------
+        float
+            The production rate.
+        """
+        self.set_coldshot_ratio(inputs["coldshot_ratio"])
+        self.run_aspen(autosave=autosave, timeout=timeout)
+        return self.production_rate
+
 def multiprocessing_example(coldshot_ratio):
     """
     Example function to demonstrate multiprocessing with ASPEN.
@@ -172,12 +229,9 @@ def multiprocessing_example(coldshot_ratio):
     float
         The production rate or 0 if an error occurs.
     """
-    # Define the path to the ASPEN file
-    aspen_path = r"C:\Users\SWAMINATHU\OneDrive - NOVA Chemicals Corporation\My Stuff" \
-                 r"\Jodell Project\Experimentation\LDPE Simulation\LDPE Simulation2-Mixing,GE,Tadj,PH2ADJ.bkp"
     try:
         # Create an instance of AspenMultiProcessingExample and set the coldshot ratio
-        with AspenMultiProcessingExample(aspen_path, f"Coldshot Simulation {coldshot_ratio}") as aspen:
+        with AspenMultiProcessingExample(ASPEN_PATH, f"Coldshot Simulation {coldshot_ratio}") as aspen:
             aspen.set_coldshot_ratio(coldshot_ratio)
             aspen.run_aspen()  # Run the ASPEN simulation
             return aspen.production_rate  # Return the production rate
@@ -194,4 +248,26 @@ if __name__ == "__main__":
     # Multiprocessing example
     with Pool(4) as p:
         # Run the multiprocessing example with different coldshot ratios
-        print(p.map(multiprocessing_example, [0.2, 0.4, 0.6, 0.8]))
\ No newline at end of file
+        print(p.map(multiprocessing_example, [0.2, 0.4, 0.6, 0.8]))
+
+    # Warm pool example. Each worker connects to ASPEN once and is reused for every case.
+    # A worker whose ASPEN crashes or hangs past the deadline is killed and replaced, and its case is retried once.
+    # The archive is copied off OneDrive into a local cache once, and each worker loads its own copy of it.
+    # Cases expected to take longest start first, and a straggler is copied to an idle worker once nothing is left.
+    with ASPENPool(ASPEN_PATH, processes=4, aspen_class=AspenPoolExample, log_folder="Coldshot Pool",
+                   timeout=600, case_deadline=900, retries=1, aspen_options={"archive_cache": ARCHIVE_CACHE}) as pool:
+        print(pool.map([{"coldshot_ratio": ratio} for ratio in [0.2, 0.4, 0.6, 0.8]]), pool.errors)
+        print(pool.utilisation())  # Busy and alive seconds per worker
+
+    # Resumable sweep example. Results are stored as each case finishes and completed cases are skipped on rerun.
+    # Worker logs only go to the log file, so the live progress line stays readable. Open Coldshot Sweep.html in a
+    # browser for the same view with per-worker detail.
+    sweep = Sweep.grid({"coldshot_ratio": [0.2, 0.4, 0.6, 0.8]}, "Coldshot Sweep.db")
+    with ASPENPool(ASPEN_PATH, processes=4, aspen_class=AspenPoolExample, log_folder="Coldshot Sweep",
+                   console_log=False) as pool:
+        progress = Progress(html_path="Coldshot Sweep.html", title="Coldshot Sweep")
+        runtimes = {}  # Filled in by the callback as each case finishes
+        summary = sweep.run_pool(pool, progress=progress,
+                                 callback=lambda case: runtimes.update({case["case_id"]: case["runtime"]}))
+        progress.close()
+        print(summary, runtimes)
\ No newline at end of file
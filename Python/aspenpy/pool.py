@@ -0,0 +1,819 @@
+import time
+import queue
+import multiprocessing
+
+from collections import Counter, deque
+from threading import Thread, Event
+from pathlib import Path, WindowsPath
+
+from aspen import (ASPEN, ASPEN_PATH_ARG, ASPEN_PATH_ENV, ASPEN_PATH_FILES, ConvergenceError, kill_process_tree,
+                   resolve_aspen_path, start_log_listener, validate_archive)
+from backends import ComBackend
+from cache import ArchiveCache
+from scheduler import RuntimeEstimator
+
+
+def prepare_sweep(aspen_path: str | Path, aspen_options: dict):
+    """
+    Does the setup a sweep needs once, in the parent, before any worker is spawned.
+
+    Prepares the backend (e.g. generates the COM gencache), validates and hashes the archive, and stages it
+    into the archive cache if the workers use one. The workers then only load what was prepared.
+
+    Args:
+        aspen_path (str | Path): The path to the archive.
+        aspen_options (dict): The keyword arguments the workers' ASPEN instances get.
+
+    Raises:
+        ValueError: If the archive is not a readable file.
+
+    Returns:
+        str: The hash of the archive, to be passed to the workers.
+    """
+    aspen_options.get("backend", ComBackend()).prepare()
+    archive_hash = validate_archive(aspen_path)
+    archive_cache = aspen_options.get("archive_cache")
+    if archive_cache is not None:
+        if not isinstance(archive_cache, ArchiveCache):
+            archive_cache = ArchiveCache(archive_cache)
+        archive_cache.stage(aspen_path, archive_hash)
+    return archive_hash
+
+
+def _heartbeat(worker_id, result_queue, interval, stopped, task_queue):
+    """
+    Posts a heartbeat for a worker every interval seconds until stopped is set.
+
+    Runs on its own thread, so it keeps beating while the worker is blocked in a COM call but stops if the
+    worker process dies. If the pool process dies instead, it tells the worker to stop after its current case,
+    so an orphaned worker doesn't hold an ASPEN licence forever.
+
+    Args:
+        worker_id (int): The ID of the worker.
+        result_queue (multiprocessing.Queue): The pool's result queue.
+        interval (float): Seconds between heartbeats.
+        stopped (threading.Event): Set to stop the heartbeat.
+        task_queue (multiprocessing.Queue): The worker's task queue.
+
+    Returns:
+        None
+    """
+    parent = multiprocessing.parent_process()
+    while not stopped.wait(interval):
+        if parent is not None and not parent.is_alive():
+            # Nobody reads the results any more, so don't wait to flush them when the worker exits.
+            result_queue.cancel_join_thread()
+            task_queue.put(None)
+            return
+        result_queue.put(("heartbeat", worker_id, None, None))
+
+
+def _pool_worker(worker_id, aspen_class, aspen_options, aspen_path, log_folder, outputs, reload, warm_start, timeout,
+                 autosave, heartbeat_interval, task_queue, result_queue):
+    """
+    Worker loop for ASPENPool. Holds one connected ASPEN instance for the life of the process.
+
+    Args:
+        worker_id (int): The ID of this worker.
+        aspen_class (type): The ASPEN class (or subclass) to instantiate.
+        aspen_options (dict): Keyword arguments passed to aspen_class.
+        aspen_path (pathlib.Path): The path to the ASPEN file.
+        log_folder (str): The base name of the log folder.
+        outputs (tuple): Addresses to read after each case unless the case gives its own.
+        reload (bool): Reload the archive between cases instead of reinitialising.
+        warm_start (bool): Start each case from the previous case's converged state instead of resetting.
+        timeout (float): Wall-clock limit per case in seconds, or None.
+        autosave (bool): Whether to autosave each case, subject to the instance's artifact policy.
+        heartbeat_interval (float): Seconds between heartbeats posted to the result queue.
+        task_queue (multiprocessing.Queue): This worker's queue of (case_id, inputs, outputs) tuples. None stops
+            the worker.
+        result_queue (multiprocessing.Queue): Queue of (status, worker_id, case_id, payload) tuples. The status
+            is "ready", "started", "health", "done", "retry" (the case failed its health check), "failed" (the
+            worker has exited) or "heartbeat".
+
+    Returns:
+        None
+    """
+    # Beat from the start so the pool can tell a slow dispatch from a dead worker.
+    stopped = Event()
+    Thread(target=_heartbeat, args=(worker_id, result_queue, heartbeat_interval, stopped, task_queue),
+           daemon=True).start()
+    try:
+        with aspen_class(f"{log_folder} Worker {worker_id}", **aspen_options) as aspen:
+            try:
+                # Connect once. Every case handled by this worker reuses this instance.
+                aspen.connect_to_aspen(aspen_path)
+            except Exception as e:
+                # A case_id of None tells the pool the worker never started.
+                result_queue.put(("failed", worker_id, None, repr(e)))
+                return
+            
+            # Tell the pool which ASPEN processes belong to this worker, so only they are killed if it hangs.
+            result_queue.put(("ready", worker_id, None, aspen.aspen_pids))
+            
+            fresh = True
+            reset_next = False
+            while True:
+                task = task_queue.get()
+                if task is None:
+                    # Stop beating first. Nobody reads the heartbeats once the pool is closing.
+                    stopped.set()
+                    break
+                case_id, inputs, case_outputs = task
+                result_queue.put(("started", worker_id, case_id, None))
+                try:
+                    # The first case runs on the freshly loaded archive. Later cases reset it first unless warm
+                    # starting from a converged case.
+                    if not fresh and (reset_next or not warm_start):
+                        aspen.reset_aspen(reload=reload)
+                    fresh = False
+                    reset_next = False
+                    result = aspen.run_case(inputs, outputs if case_outputs is None else case_outputs,
+                                            autosave=autosave, timeout=timeout)
+                except ConvergenceError as e:
+                    # ASPEN itself is fine, so keep the worker. Only the case is retried, and never warm started from.
+                    result_queue.put(("health", worker_id, case_id, aspen.last_health))
+                    result_queue.put(("retry", worker_id, case_id, repr(e)))
+                    reset_next = True
+                    continue
+                except Exception as e:
+                    # Report the failure and exit so the pool replaces this worker with a fresh ASPEN.
+                    aspen.error(f"Case {case_id} failed: {e!r}. Recycling worker.")
+                    result_queue.put(("failed", worker_id, case_id, repr(e)))
+                    return
+                if aspen.last_health is not None:
+                    result_queue.put(("health", worker_id, case_id, aspen.last_health))
+                result_queue.put(("done", worker_id, case_id, result))
+    finally:
+        stopped.set()
+
+
+class ASPENPool:
+    """
+    A pool of long-lived worker processes that each hold one connected ASPEN instance.
+
+    Dispatching ASPEN and loading the archive is paid once per worker rather than once per case.
+    Workers reset the simulation between cases and are only replaced when a case fails.
+
+    The pool also supervises its workers. A worker that dies, stops sending heartbeats, or overruns the
+    per-case deadline has its process tree and its own ASPEN processes killed (other workers' are left
+    alone), is replaced, and its case is requeued until the retry budget runs out.
+
+    Cases are handed to idle workers one at a time, each on the worker's own queue, so the pool always knows
+    which case a worker holds. A worker that crashes before its messages reach the pool can't lose a case.
+
+    The pool learns how long cases take in each region of input space and hands out the longest expected case
+    first, so a slow case doesn't start last and hold up the whole sweep. Once nothing is pending, an idle
+    worker steals a copy of a case that has run well past its estimate. Whichever copy finishes first counts.
+
+    Attributes:
+        aspen_path : pathlib.Path
+            The path to the ASPEN file.
+        processes : int
+            The number of worker processes.
+        outputs : tuple
+            Addresses read back after each case.
+        archive_hash : str
+            The hash of the archive, computed once when the pool starts and shared with every worker.
+        health : dict
+            Mapping of case IDs to the block health scan of their last attempt, for workers with health_check on.
+        errors : dict
+            Mapping of case IDs that failed on every attempt to the last error message.
+        recycled : int
+            The number of workers replaced after a failure.
+        requeued : int
+            The number of cases put back on the queue after a failure.
+        retries : int
+            How many times a failed case is requeued before it is reported as failed.
+        heartbeat_interval : float
+            Seconds between worker heartbeats.
+        heartbeat_timeout : float
+            A worker that hasn't sent a heartbeat for this many seconds is treated as hung.
+        case_deadline : float
+            A case running for longer than this many seconds is treated as hung, or None for no limit.
+        warm_start : bool
+            Whether workers carry the converged state from case to case instead of resetting.
+        schedule : str
+            "longest" to hand out the longest expected case first, or "fifo" to keep the submission order.
+        estimator : scheduler.RuntimeEstimator
+            Learns the runtime of each region of input space from finished cases.
+        steal_after : float
+            An idle worker copies a case once it has run for this many times its estimate, or None to never steal.
+        runtimes : dict
+            Mapping of finished case IDs to their runtime in seconds.
+        stolen : int
+            The number of cases copied to an idle worker.
+        _worker_stats : dict
+            Mapping of worker IDs to their start and exit times, busy seconds and case count.
+        _worker_pids : dict
+            Mapping of worker IDs to the ASPEN process IDs each worker reported.
+        _worker_cases : dict
+            Mapping of worker IDs to the (case_id, start time) of the case each worker was handed.
+        _task_queues : dict
+            Mapping of worker IDs to each worker's task queue.
+        _pending : collections.deque
+            Case IDs waiting for an idle worker. Requeued cases go to the front, which only decides the order for
+            the "fifo" schedule or before any runtime is known.
+        _heartbeats : dict
+            Mapping of worker IDs to the time of their last heartbeat.
+        _cases : dict
+            Mapping of unfinished case IDs to their (inputs, outputs), kept so a case can be requeued.
+        _attempts : dict
+            Mapping of case IDs to the number of times they have been handed to a worker.
+        _dispatch_lock : multiprocessing.Lock
+            Shared by every worker so each can tell its own ASPEN process apart from the others'.
+        _log_queue : multiprocessing.Queue
+            The queue every worker's logger puts records on.
+        _log_listener : logging.handlers.QueueListener
+            The single listener that writes every worker's log records while the pool is running.
+
+    Methods:
+        start():
+            Starts the worker processes.
+        submit(inputs, outputs=None):
+            Queues a case and returns its case ID.
+        results(count, progress=None, timeout=None):
+            Yields (case_id, outputs) tuples as cases finish.
+        imap_unordered(cases, outputs=None, callback=None, progress=None):
+            Runs every case and yields each one with its timings as soon as it finishes.
+        map(cases):
+            Runs every case and returns the outputs in order.
+        utilisation():
+            Returns how busy each worker has been and what it is doing.
+        close(timeout=None):
+            Stops the worker processes.
+    """
+
+    def __init__(self, aspen_path: str | WindowsPath=None, processes: int=4, outputs=(), log_folder: str=None,
+                 reload: bool=False, aspen_class: type=ASPEN, timeout: float=None, autosave: bool=False,
+                 aspen_options: dict=None, warm_start: bool=False, retries: int=1, heartbeat_interval: float=5.0,
+                 heartbeat_timeout: float=60.0, case_deadline: float=None, schedule: str=None,
+                 estimator: RuntimeEstimator=None, steal_after: float=2.0, console_log: bool=True):
+        """
+        Initialize the pool. Workers are not started until start() is called or the pool is entered.
+
+        Args:
+            aspen_path (str | WindowsPath, optional): The path to the ASPEN file. Defaults to None (looked up
+                with resolve_aspen_path, so workers never need to ask for it).
+            processes (int, optional): The number of worker processes. Defaults to 4.
+            outputs (iterable, optional): Addresses to read after each case. Defaults to ().
+            log_folder (str, optional): The base name of the worker log folders. Defaults to 'ASPEN Pool'.
+            reload (bool, optional): Reload the archive between cases instead of reinitialising. Defaults to False.
+            aspen_class (type, optional): The ASPEN class (or subclass) each worker uses. Defaults to ASPEN.
+            timeout (float, optional): Wall-clock limit per case in seconds. A case that exceeds it is stopped
+                and reported as failed. Defaults to None (no limit).
+            autosave (bool, optional): Whether workers autosave each case. Defaults to False.
+            aspen_options (dict, optional): Keyword arguments passed to aspen_class, e.g. the artifact policy.
+                Defaults to None.
+            warm_start (bool, optional): Start each case from the previous case's converged tear streams
+                instead of resetting. A failed case still recycles its worker. Defaults to False.
+            retries (int, optional): How many times a failed case is requeued. Defaults to 1.
+            heartbeat_interval (float, optional): Seconds between worker heartbeats. Defaults to 5.
+            heartbeat_timeout (float, optional): Seconds without a heartbeat before a worker is killed.
+                Defaults to 60.
+            case_deadline (float, optional): Seconds a case may run before its worker is killed. This is the
+                backstop for a hung engine that ignores the timeout. Defaults to None (twice the timeout if
+                one is set, otherwise no limit).
+            schedule (str, optional): "longest" to hand out the longest expected case first, or "fifo" to keep
+                the submission order. Defaults to None ("fifo" with warm_start, which relies on the order the
+                cases were submitted in, otherwise "longest").
+            estimator (scheduler.RuntimeEstimator, optional): The runtime estimator, e.g. one seeded with the
+                runtimes of an earlier sweep. Defaults to None (a new estimator).
+            steal_after (float, optional): Once nothing is pending, an idle worker copies a case that has run for
+                this many times its estimate. Defaults to 2. None never steals.
+            console_log (bool, optional): Echo the workers' log records to stdout as well as the log file. Turn
+                it off to keep a live progress line readable. Defaults to True.
+
+        Raises:
+            ValueError: If the ASPEN path does not exist or none was given or configured, or the schedule is
+                unknown.
+        """
+        if log_folder is None: log_folder = 'ASPEN Pool'
+        if aspen_path is None:
+            aspen_path, _ = resolve_aspen_path()
+            if aspen_path is None:
+                raise ValueError(f"No ASPEN path given. Pass one, set {ASPEN_PATH_ENV}, add aspen_path to "
+                                 f"{' or '.join(ASPEN_PATH_FILES)}, or pass {ASPEN_PATH_ARG}.")
+        self.aspen_path = Path(aspen_path)
+        if not self.aspen_path.exists():
+            raise ValueError(f"ASPEN path invalid: {aspen_path}")
+        
+        self.processes = processes
+        self.outputs = tuple(outputs)
+        self._log_folder_name = log_folder
+        self._reload = reload
+        self.warm_start = warm_start
+        self._aspen_class = aspen_class
+        self._timeout = timeout
+        self._autosave = autosave
+        self._aspen_options = {} if aspen_options is None else dict(aspen_options)
+        self._console_log = console_log
+        
+        # Supervision settings.
+        if case_deadline is None and timeout is not None: case_deadline = 2 * timeout
+        self.retries = retries
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.case_deadline = case_deadline
+        
+        # Scheduling settings.
+        if schedule is None: schedule = "fifo" if warm_start else "longest"
+        if schedule not in ("longest", "fifo"):
+            raise ValueError(f"Unknown schedule {schedule!r}. Use 'longest' or 'fifo'.")
+        self.schedule = schedule
+        self.estimator = RuntimeEstimator() if estimator is None else estimator
+        self.steal_after = steal_after
+        
+        self.archive_hash = None
+        self.health = {}
+        self.errors = {}
+        self.recycled = 0
+        self.requeued = 0
+        self.runtimes = {}
+        self.stolen = 0
+        self._worker_stats = {}
+        self._workers = {}
+        self._worker_pids = {}
+        self._worker_cases = {}
+        self._heartbeats = {}
+        self._cases = {}
+        self._attempts = {}
+        self._task_queues = {}
+        self._pending = deque()
+        self._next_worker_id = 0
+        self._next_case_id = 0
+        self._context = multiprocessing.get_context()
+        self._dispatch_lock = None
+        self._result_queue = None
+        self._log_queue = None
+        self._log_listener = None
+
+    def __enter__(self):
+        """
+        Starts the workers when used with the with keyword.
+
+        Returns:
+            ASPENPool: This pool.
+        """
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Stops the workers when leaving the with block.
+        """
+        self.close()
+
+    def start(self):
+        """
+        Starts the worker processes.
+
+        Returns:
+            None
+        """
+        self._result_queue = self._context.Queue()
+        self._dispatch_lock = self._context.Lock()
+        
+        # Prepare the backend, hash the archive and stage it once. Workers only load what was prepared.
+        self.archive_hash = prepare_sweep(self.aspen_path, self._aspen_options)
+        
+        # One log listener for the whole pool. Workers only put records on its queue.
+        log_file = Path.cwd() / 'Run_Logs' / f"{self._log_folder_name}.log"
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        self._log_queue, self._log_listener = start_log_listener(
+            log_file, self._context.Queue(), '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            console=self._console_log
+        )
+        for _ in range(self.processes):
+            self._spawn_worker()
+
+    def _spawn_worker(self):
+        """
+        Starts a single worker process.
+
+        Returns:
+            None
+        """
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        self._task_queues[worker_id] = self._context.Queue()
+        aspen_options = {"log_queue": self._log_queue, "dispatch_lock": self._dispatch_lock,
+                         "archive_hash": self.archive_hash, **self._aspen_options}
+        process = self._context.Process(
+            target=_pool_worker,
+            args=(worker_id, self._aspen_class, aspen_options, self.aspen_path, self._log_folder_name, self.outputs,
+                  self._reload, self.warm_start, self._timeout, self._autosave, self.heartbeat_interval,
+                  self._task_queues[worker_id], self._result_queue),
+            daemon=True
+        )
+        process.start()
+        self._workers[worker_id] = process
+        self._heartbeats[worker_id] = time.time()
+        self._worker_stats[worker_id] = {"started": time.time(), "exited": None, "busy": 0.0, "cases": 0}
+
+    def submit(self, inputs: dict, outputs=None):
+        """
+        Queues a case for the workers.
+
+        Args:
+            inputs (dict): Mapping of Variable Explorer addresses to the values to set.
+            outputs (iterable, optional): Addresses to read for this case. Defaults to the pool's outputs.
+
+        Returns:
+            int: The case ID.
+        """
+        case_id = self._next_case_id
+        self._next_case_id += 1
+        self._cases[case_id] = (dict(inputs), None if outputs is None else tuple(outputs))
+        self.estimator.expand(inputs)
+        self._pending.append(case_id)
+        self._dispatch()
+        return case_id
+
+    def _dispatch(self):
+        """
+        Hands pending cases to idle workers, one case per worker.
+
+        A worker is idle once it has reported ready and isn't holding a case. Once nothing is pending, idle
+        workers steal copies of cases that have overrun their estimate.
+
+        Returns:
+            None
+        """
+        for worker_id in self._workers:
+            if worker_id not in self._worker_pids or worker_id in self._worker_cases:
+                continue
+            case_id = self._next_case()
+            if case_id is not None:
+                self._attempts[case_id] = self._attempts.get(case_id, 0) + 1
+            else:
+                # A copy doesn't use up a retry. The case only fails if every copy does.
+                case_id = self._straggler()
+                if case_id is None:
+                    return
+                self.stolen += 1
+            self._worker_cases[worker_id] = (case_id, time.time())
+            self._task_queues[worker_id].put((case_id, *self._cases[case_id]))
+
+    def _next_case(self):
+        """
+        Takes the next case off the pending queue.
+
+        Returns:
+            int: The ID of the case with the longest expected runtime, or the first pending case with the "fifo"
+                schedule or before any runtime is known. None if nothing is pending.
+        """
+        # Skip cases that finished while waiting, e.g. a requeued case whose first attempt reported late.
+        while self._pending and self._pending[0] not in self._cases:
+            self._pending.popleft()
+        if not self._pending:
+            return None
+        if self.schedule == "fifo" or not self.estimator.observed:
+            return self._pending.popleft()
+        
+        # Longest expected first. Ties keep the queue order, so requeued cases still go before later ones.
+        self._pending = deque(case_id for case_id in self._pending if case_id in self._cases)
+        estimates = [self.estimator.estimate(self._cases[case_id][0]) for case_id in self._pending]
+        index = max(range(len(estimates)), key=estimates.__getitem__)
+        case_id = self._pending[index]
+        del self._pending[index]
+        return case_id
+
+    def _straggler(self):
+        """
+        Finds a running case worth copying to an idle worker.
+
+        Returns:
+            int: The ID of the case furthest past its estimate among those that have run for steal_after times
+                their estimate and aren't already copied, or None.
+        """
+        if self.steal_after is None or not self.estimator.observed:
+            return None
+        now = time.time()
+        holders = Counter(case_id for case_id, _ in self._worker_cases.values())
+        straggler, worst = None, None
+        for case_id, started in self._worker_cases.values():
+            if holders[case_id] > 1 or case_id not in self._cases:
+                continue
+            expected = self.estimator.estimate(self._cases[case_id][0])
+            elapsed = now - started
+            if elapsed <= self.steal_after * expected:
+                continue
+            if worst is None or elapsed - expected > worst:
+                straggler, worst = case_id, elapsed - expected
+        return straggler
+
+    def _release(self, worker_id: int):
+        """
+        Frees a worker of the case it was handed and books the time it spent on it.
+
+        Args:
+            worker_id (int): The ID of the worker.
+
+        Returns:
+            tuple: The (case_id, start time) the worker was holding, or None if it wasn't holding a case.
+        """
+        held = self._worker_cases.pop(worker_id, None)
+        if held is not None:
+            stats = self._worker_stats[worker_id]
+            stats["busy"] += time.time() - held[1]
+            stats["cases"] += 1
+        return held
+
+    def results(self, count: int, progress=None, timeout: float=None):
+        """
+        Yields finished cases in completion order.
+
+        A failed case is requeued on a fresh worker until the retry budget runs out, then yields None. A case that
+        fails its block health check is requeued too, but its worker is kept. Each finished case's runtime is fed
+        to the estimator.
+
+        Args:
+            count (int): The number of results to wait for.
+            progress (progress.Progress, optional): A live view, updated with the worker states every time the
+                pool wakes up. Defaults to None.
+            timeout (float, optional): Stop early, without an error, once this many seconds pass without a case
+                finishing. The cases carry on and can be collected by calling results again. Defaults to None
+                (wait for count cases).
+
+        Raises:
+            RuntimeError: If a worker could not connect to ASPEN.
+
+        Yields:
+            tuple: (case_id, outputs) where outputs is a dict or None if the case failed.
+        """
+        remaining = count
+        last_finished = time.time()
+        wait = self.heartbeat_interval if timeout is None else min(self.heartbeat_interval, timeout)
+        while remaining:
+            # Wake up at least once per heartbeat interval to check on the workers.
+            try:
+                status, worker_id, case_id, payload = self._result_queue.get(timeout=wait)
+            except queue.Empty:
+                status = None
+            
+            finished = []
+            if status is not None:
+                # Messages from a worker that has already been replaced are stale, apart from results.
+                known = worker_id in self._workers
+                if known:
+                    self._heartbeats[worker_id] = time.time()
+                if status == "ready" and known:
+                    self._worker_pids[worker_id] = payload
+                elif status == "started" and known and case_id == self._worker_cases.get(worker_id, (None,))[0]:
+                    # The deadline runs from when the worker picked the case up.
+                    self._worker_cases[worker_id] = (case_id, time.time())
+                elif status == "health":
+                    self.health[case_id] = payload
+                elif status == "retry" and known:
+                    # The case's blocks finished with errors. The worker is fine and takes the next case.
+                    self._release(worker_id)
+                    finished.extend(self._retry(case_id, payload))
+                elif status == "done":
+                    held = self._release(worker_id) if known else None
+                    # A requeued or stolen case may finish twice. Only the first result counts.
+                    case = self._cases.pop(case_id, None)
+                    if case is not None:
+                        finished.append((case_id, payload))
+                        if held is not None:
+                            self.runtimes[case_id] = time.time() - held[1]
+                            self.estimator.observe(case[0], self.runtimes[case_id])
+                elif status == "failed" and known:
+                    # The worker has exited. Replace it before deciding what to do with the case.
+                    if case_id is None:
+                        self._workers.pop(worker_id).join()
+                        raise RuntimeError(f"ASPEN worker {worker_id} failed to start: {payload}")
+                    finished.extend(self._recycle(worker_id, payload, kill=False))
+            
+            # Kill and replace any worker that has died, gone quiet, or overrun its deadline.
+            for worker_id, reason in self._check_workers():
+                finished.extend(self._recycle(worker_id, reason, kill=True))
+            
+            # Hand the next cases to workers that have become idle or ready.
+            self._dispatch()
+            if progress is not None:
+                progress.update(self)
+            
+            for case_id, outputs in finished:
+                remaining -= 1
+                yield case_id, outputs
+            if finished:
+                last_finished = time.time()
+            elif timeout is not None and time.time() - last_finished > timeout:
+                return
+
+    def _check_workers(self):
+        """
+        Finds workers that have died, stopped sending heartbeats, or overrun the case deadline.
+
+        Returns:
+            list: (worker_id, reason) tuples.
+        """
+        now = time.time()
+        unhealthy = []
+        for worker_id, process in self._workers.items():
+            case_id, started = self._worker_cases.get(worker_id, (None, now))
+            if not process.is_alive():
+                unhealthy.append((worker_id, f"Worker {worker_id} died with exit code {process.exitcode}"))
+            elif now - self._heartbeats[worker_id] > self.heartbeat_timeout:
+                unhealthy.append((worker_id, f"Worker {worker_id} sent no heartbeat for {self.heartbeat_timeout} seconds"))
+            elif self.case_deadline is not None and now - started > self.case_deadline:
+                unhealthy.append((worker_id, f"Case {case_id} overran its {self.case_deadline} second deadline"))
+        return unhealthy
+
+    def _recycle(self, worker_id: int, reason: str, kill: bool):
+        """
+        Replaces a worker and retries the case it was running.
+
+        Args:
+            worker_id (int): The ID of the worker to replace.
+            reason (str): Why the worker is being replaced. Recorded in errors if the case is given up on.
+            kill (bool): Kill the worker's process tree and ASPEN processes rather than waiting for it to exit.
+
+        Returns:
+            list: A (case_id, None) tuple if the case was given up on, otherwise empty.
+        """
+        process = self._workers.pop(worker_id)
+        self._task_queues.pop(worker_id)
+        pids = self._worker_pids.pop(worker_id, [])
+        case_id, _ = self._release(worker_id) or (None, None)
+        self._worker_stats[worker_id]["exited"] = time.time()
+        self._heartbeats.pop(worker_id, None)
+        if kill:
+            # Only this worker and the ASPEN processes it reported. Other workers' engines keep running.
+            kill_process_tree([process.pid, *pids])
+        process.join()
+        self.recycled += 1
+        self._spawn_worker()
+        return self._retry(case_id, reason)
+
+    def _retry(self, case_id: int, reason: str):
+        """
+        Requeues a failed case, or gives up on it once its retries are used up.
+
+        Args:
+            case_id (int): The ID of the case, or None if the worker wasn't running one.
+            reason (str): Why the case failed. Recorded in errors if the case is given up on.
+
+        Returns:
+            list: A (case_id, None) tuple if the case was given up on, otherwise empty.
+        """
+        # The worker may have died between cases, or the case may already have finished.
+        if case_id not in self._cases:
+            return []
+        # Another worker is still running a copy of the case. Its result decides.
+        if any(held == case_id for held, _ in self._worker_cases.values()):
+            return []
+        if self._attempts.get(case_id, 0) <= self.retries:
+            self.requeued += 1
+            self._pending.appendleft(case_id)
+            return []
+        del self._cases[case_id]
+        self.errors[case_id] = reason
+        return [(case_id, None)]
+
+    def map(self, cases):
+        """
+        Runs every case and returns the outputs in the order the cases were given.
+
+        Args:
+            cases (iterable): Input dictionaries, one per case.
+
+        Returns:
+            list: The outputs of each case, None for failed cases.
+        """
+        case_ids = [self.submit(inputs) for inputs in cases]
+        results = dict(self.results(len(case_ids)))
+        return [results[case_id] for case_id in case_ids]
+
+    def imap_unordered(self, cases, outputs=None, callback=None, progress=None):
+        """
+        Runs every case and yields each one as soon as it finishes, in completion order.
+
+        Every case is submitted up front so the scheduler can order them. A failed case is yielded once its
+        retries are used up, with outputs of None.
+
+        Args:
+            cases (iterable): Input dictionaries, one per case.
+            outputs (iterable, optional): Addresses to read for every case. Defaults to the pool's outputs.
+            callback (callable, optional): Called with each finished case before it is yielded. Defaults to None.
+            progress (progress.Progress, optional): A live view of the sweep. Its total is set to the number of
+                cases if it has none. Defaults to None.
+
+        Yields:
+            dict: The finished case: index (its position in cases), case_id, inputs, outputs (None if it
+                failed), error, runtime (seconds on the worker that finished it, None if it failed) and health.
+        """
+        submitted = {}
+        for index, inputs in enumerate(cases):
+            submitted[self.submit(inputs, outputs)] = (index, inputs)
+        if progress is not None and progress.total is None:
+            progress.total = len(submitted)
+        
+        for case_id, case_outputs in self.results(len(submitted), progress):
+            index, inputs = submitted.pop(case_id)
+            case = {
+                "index": index,
+                "case_id": case_id,
+                "inputs": inputs,
+                "outputs": case_outputs,
+                "error": self.errors.get(case_id),
+                "runtime": self.runtimes.get(case_id),
+                "health": self.health.get(case_id)
+            }
+            if progress is not None:
+                progress.record(case)
+            if callback is not None:
+                callback(case)
+            yield case
+
+    def utilisation(self):
+        """
+        Returns how busy each worker has been and what it is doing, including workers that have been replaced.
+
+        Returns:
+            dict: Mapping of worker IDs to dictionaries of the worker's state ("starting", "idle", "running" or
+                "exited"), the case it is running and for how many seconds (None when not running), the cases it
+                was handed, its busy and alive seconds, and its utilisation, the fraction of its life spent running
+                cases.
+        """
+        now = time.time()
+        report = {}
+        for worker_id, stats in self._worker_stats.items():
+            alive = (stats["exited"] or now) - stats["started"]
+            busy = stats["busy"]
+            case_id, running = None, None
+            if stats["exited"] is not None:
+                state = "exited"
+            elif worker_id in self._worker_cases:
+                state = "running"
+                case_id, started = self._worker_cases[worker_id]
+                running = now - started
+                busy += running
+            else:
+                state = "idle" if worker_id in self._worker_pids else "starting"
+            report[worker_id] = {"state": state, "case": case_id, "running": running, "cases": stats["cases"],
+                                 "busy": busy, "alive": alive, "utilisation": busy / alive if alive else 0.0}
+        return report
+
+    def close(self, timeout: float=None):
+        """
+        Stops the worker processes once they finish their current case. Workers running a copy of a case that
+        has already finished are killed instead, as are workers still alive when the timeout runs out.
+
+        The result queue is drained while waiting. A worker can't exit while its queue feeder is blocked on a
+        full pipe, so joining without reading would hang.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the workers to exit. Defaults to None (the case
+                deadline, if any, plus the heartbeat timeout).
+
+        Returns:
+            None
+        """
+        if self._result_queue is None:
+            return
+        if timeout is None: timeout = (self.case_deadline or 0) + self.heartbeat_timeout
+        # Workers still running a copy of a case that already finished are killed rather than waited for.
+        # kill_process_tree reaps them, after which is_alive can't tell they have gone, so they aren't polled.
+        killed = set()
+        for worker_id, (case_id, _) in list(self._worker_cases.items()):
+            if case_id not in self._cases:
+                kill_process_tree([self._workers[worker_id].pid, *self._worker_pids.get(worker_id, [])])
+                self._release(worker_id)
+                killed.add(worker_id)
+        for task_queue in self._task_queues.values():
+            task_queue.put(None)
+        
+        # Late results and heartbeats are discarded. Reading them is what lets the workers exit.
+        running = [process for worker_id, process in self._workers.items() if worker_id not in killed]
+        deadline = time.time() + timeout
+        while time.time() < deadline and any(process.is_alive() for process in running):
+            try:
+                self._result_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for worker_id, process in self._workers.items():
+            if worker_id not in killed and process.is_alive():
+                kill_process_tree([process.pid, *self._worker_pids.get(worker_id, [])])
+            process.join()
+            self._release(worker_id)
+            self._worker_stats[worker_id]["exited"] = time.time()
+        
+        # Remove the working copies of workers that were killed before they could remove their own.
+        archive_cache = self._aspen_options.get("archive_cache")
+        if archive_cache is not None:
+            (archive_cache if isinstance(archive_cache, ArchiveCache) else ArchiveCache(archive_cache)).prune()
+        self._workers.clear()
+        self._worker_pids.clear()
+        self._worker_cases.clear()
+        self._heartbeats.clear()
+        self._task_queues.clear()
+        self._pending.clear()
+        self._result_queue = None
+        
+        # Every worker has exited, so the listener can flush and stop.
+        self._log_listener.stop()
+        for handler in self._log_listener.handlers:
+            handler.close()
+        self._log_listener = None
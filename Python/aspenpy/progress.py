@@ -0,0 +1,284 @@
+import os
+import time
+
+from sys import stdout
+from html import escape
+from pathlib import Path
+from collections import deque
+
+
+
+def format_seconds(seconds: float):
+    """
+    Formats a duration for display.
+
+    Args:
+        seconds (float): The duration, or None.
+
+    Returns:
+        str: e.g. "1h 02m", "4m 05s" or "12s", or "-" for None.
+    """
+    if seconds is None:
+        return "-"
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Progress:
+    """
+    A live view of a running sweep: throughput, ETA, failure rate and what each worker is doing.
+
+    Finished cases are recorded as they stream in, and the worker states are read from the pool each time it
+    wakes up. The view is redrawn at most once per interval as a single line of text, a local HTML page that
+    refreshes itself, or both.
+
+    Attributes:
+        total : int
+            The number of cases in the sweep, or None if not known yet.
+        done : int
+            The number of cases that finished.
+        failed : int
+            The number of cases that failed on every attempt.
+        started : float
+            When the view was created.
+        interval : float
+            The minimum number of seconds between redraws.
+        stream : file
+            Where the text line is written, or None for no text.
+        html_path : pathlib.Path
+            Where the HTML page is written, or None for no page.
+        title : str
+            The title of the HTML page.
+        recent : collections.deque
+            The most recently finished cases, newest first.
+        workers : dict
+            Mapping of worker IDs to their state from the last update, as returned by ASPENPool.utilisation.
+        _runtime : float
+            The total runtime of the finished cases.
+        _timed : int
+            The number of finished cases with a runtime.
+        _last_draw : float
+            When the view was last redrawn.
+        _width : int
+            The length of the last text line, so a shorter line can blank it out.
+        _drawn : int
+            The number of finished cases the last redraw showed.
+
+    Methods:
+        record(case):
+            Counts a finished case.
+        update(pool=None, force=False):
+            Reads the worker states from the pool and redraws if the interval has passed.
+        summary():
+            Returns the current figures.
+        text():
+            Returns the view as a single line.
+        html():
+            Returns the view as an HTML page.
+        close():
+            Draws the final view.
+    """
+
+    def __init__(self, total: int=None, stream=stdout, html_path: str | Path=None, interval: float=1.0,
+                 title: str="ASPEN sweep", recent: int=10):
+        """
+        Initialize the view.
+
+        Args:
+            total (int, optional): The number of cases in the sweep. Defaults to None (set by
+                ASPENPool.imap_unordered).
+            stream (file, optional): Where the text line is written. Defaults to stdout. None for no text.
+            html_path (str | Path, optional): Where the HTML page is written. Defaults to None (no page).
+            interval (float, optional): The minimum number of seconds between redraws. Defaults to 1.
+            title (str, optional): The title of the HTML page. Defaults to 'ASPEN sweep'.
+            recent (int, optional): How many finished cases the HTML page lists. Defaults to 10.
+        """
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.time()
+        self.interval = interval
+        self.stream = stream
+        self.html_path = None if html_path is None else Path(html_path)
+        self.title = title
+        self.recent = deque(maxlen=recent)
+        self.workers = {}
+        self._runtime = 0.0
+        self._timed = 0
+        self._last_draw = 0.0
+        self._width = 0
+        self._drawn = None
+
+    def record(self, case: dict):
+        """
+        Counts a finished case and redraws if the interval has passed. The last case always redraws.
+
+        Args:
+            case (dict): The case as yielded by ASPENPool.imap_unordered.
+
+        Returns:
+            None
+        """
+        if case["outputs"] is None:
+            self.failed += 1
+        else:
+            self.done += 1
+        if case["runtime"] is not None:
+            self._runtime += case["runtime"]
+            self._timed += 1
+        self.recent.appendleft(case)
+        self.update(force=self.total is not None and self.done + self.failed >= self.total)
+
+    def update(self, pool=None, force: bool=False):
+        """
+        Reads the worker states from the pool and redraws if the interval has passed.
+
+        Args:
+            pool (ASPENPool, optional): The pool running the sweep. Defaults to None (keep the last states).
+            force (bool, optional): Redraw even if the interval hasn't passed. Defaults to False.
+
+        Returns:
+            None
+        """
+        if pool is not None:
+            self.workers = pool.utilisation()
+        now = time.time()
+        if not force and now - self._last_draw < self.interval:
+            return
+        self._last_draw = now
+        self._drawn = self.done + self.failed
+
+        if self.stream is not None:
+            line = self.text()
+            if self.stream.isatty():
+                # Redraw in place, blanking out whatever is left of a longer previous line.
+                self.stream.write("\r" + line.ljust(self._width))
+                self._width = len(line)
+            else:
+                self.stream.write(line + "\n")
+            self.stream.flush()
+
+        if self.html_path is not None:
+            # Write to a temporary file first so the browser never reloads a half-written page.
+            partial = self.html_path.with_name(self.html_path.name + ".partial")
+            partial.write_text(self.html(), encoding="utf-8")
+            os.replace(partial, self.html_path)
+
+    def summary(self):
+        """
+        Returns the current figures.
+
+        Returns:
+            dict: total, done, failed, remaining (None without a total), elapsed seconds, throughput in cases per
+                minute, eta in seconds (None until a case finishes or without a total), failure_rate as a
+                fraction of the finished cases, mean_runtime in seconds of the cases that finished, and the
+                worker states.
+        """
+        elapsed = time.time() - self.started
+        finished = self.done + self.failed
+        remaining = None if self.total is None else max(self.total - finished, 0)
+        throughput = finished / elapsed * 60 if elapsed > 0 else 0.0
+        eta = remaining / throughput * 60 if remaining is not None and throughput else None
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "remaining": remaining,
+            "elapsed": elapsed,
+            "throughput": throughput,
+            "eta": eta,
+            "failure_rate": self.failed / finished if finished else 0.0,
+            "mean_runtime": self._runtime / self._timed if self._timed else None,
+            "workers": self.workers
+        }
+
+    def text(self):
+        """
+        Returns the view as a single line.
+
+        Returns:
+            str: e.g. "12/40 finished, 1 failed (8%) | 3.2 cases/min | ETA 8m 45s | W0 case 14 35s, W1 idle".
+        """
+        summary = self.summary()
+        finished = summary["done"] + summary["failed"]
+        parts = [
+            f"{finished}/{'?' if self.total is None else self.total} finished, "
+            f"{summary['failed']} failed ({summary['failure_rate']:.0%})",
+            f"{summary['throughput']:.1f} cases/min",
+            f"ETA {format_seconds(summary['eta'])}"
+        ]
+        states = [self._worker_text(worker_id, state) for worker_id, state in self.workers.items()
+                  if state["state"] != "exited"]
+        if states:
+            parts.append(", ".join(states))
+        return " | ".join(parts)
+
+    def html(self):
+        """
+        Returns the view as an HTML page that reloads itself every interval.
+
+        Returns:
+            str: The page.
+        """
+        summary = self.summary()
+        refresh = max(1, round(self.interval))
+        worker_rows = "".join(
+            f"<tr><td>{worker_id}</td><td>{escape(state['state'])}</td>"
+            f"<td>{'' if state['case'] is None else state['case']}</td><td>{state['cases']}</td>"
+            f"<td>{format_seconds(state['busy'])}</td><td>{state['utilisation']:.0%}</td></tr>"
+            for worker_id, state in self.workers.items()
+        )
+        case_rows = "".join(
+            f"<tr><td>{case['case_id']}</td><td>{'done' if case['outputs'] is not None else 'failed'}</td>"
+            f"<td>{format_seconds(case['runtime'])}</td><td>{escape(str(case['inputs']))}</td>"
+            f"<td>{escape(case['error'] or '')}</td></tr>"
+            for case in self.recent
+        )
+        return (
+            f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><meta http-equiv=\"refresh\" content=\"{refresh}\">"
+            f"<title>{escape(self.title)}</title>"
+            "<style>body{font-family:sans-serif} table{border-collapse:collapse} "
+            "td,th{border:1px solid #ccc;padding:2px 8px;text-align:left}</style></head><body>\n"
+            f"<h1>{escape(self.title)}</h1>\n"
+            f"<p>{summary['done']} done, {summary['failed']} failed of {'?' if self.total is None else self.total}. "
+            f"Failure rate {summary['failure_rate']:.1%}. {summary['throughput']:.2f} cases/min. "
+            f"Mean runtime {format_seconds(summary['mean_runtime'])}. Elapsed {format_seconds(summary['elapsed'])}. "
+            f"ETA {format_seconds(summary['eta'])}.</p>\n"
+            "<h2>Workers</h2>\n<table><tr><th>Worker</th><th>State</th><th>Case</th><th>Cases</th><th>Busy</th>"
+            f"<th>Utilisation</th></tr>{worker_rows}</table>\n"
+            "<h2>Recent cases</h2>\n<table><tr><th>Case</th><th>Status</th><th>Runtime</th><th>Inputs</th>"
+            f"<th>Error</th></tr>{case_rows}</table>\n</body></html>\n"
+        )
+
+    def close(self):
+        """
+        Draws the final view, unless the last redraw already showed every finished case, and ends the text line.
+
+        Returns:
+            None
+        """
+        if self._drawn != self.done + self.failed:
+            self.update(force=True)
+        if self.stream is not None and self.stream.isatty():
+            self.stream.write("\n")
+            self.stream.flush()
+
+    @staticmethod
+    def _worker_text(worker_id: int, state: dict):
+        """
+        Describes a worker in a few characters.
+
+        Args:
+            worker_id (int): The ID of the worker.
+            state (dict): The worker's state as returned by ASPENPool.utilisation.
+
+        Returns:
+            str: e.g. "W0 case 14 35s" or "W1 idle".
+        """
+        if state["state"] == "running":
+            return f"W{worker_id} case {state['case']} {format_seconds(state['running'])}"
+        return f"W{worker_id} {state['state']}"
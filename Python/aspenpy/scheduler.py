@@ -0,0 +1,197 @@
+from math import floor
+
+
+class RuntimeEstimator:
+    """
+    Learns how long cases take in each region of input space, so expensive cases can be started first.
+
+    Numeric inputs are cut into equal bins across the range of every case the estimator has seen, and other
+    inputs are used as they are. A case's region is the tuple of its bins. The estimate for a case is the mean
+    runtime of its region, or of the nearest regions that have finished cases if its own has none.
+
+    Attributes:
+        bins : int
+            The number of bins each numeric input is cut into.
+        observed : int
+            The number of runtimes observed.
+        _bounds : dict
+            Mapping of numeric addresses to the [min, max] of the values seen.
+        _other : set
+            Addresses with a non-numeric value in any case seen.
+        _observations : list
+            (inputs, seconds) tuples, kept so the regions can be rebuilt when the bounds change.
+        _regions : dict
+            Mapping of regions to [total seconds, count]. None when it needs rebuilding.
+        _estimates : dict
+            Mapping of regions to their estimate, cleared whenever a runtime is observed.
+
+    Methods:
+        expand(inputs):
+            Widens the bounds to cover a case without observing a runtime.
+        observe(inputs, seconds):
+            Records how long a case took.
+        region(inputs):
+            Returns the region a case falls in.
+        estimate(inputs):
+            Returns the expected runtime of a case in seconds, or None before anything is observed.
+    """
+
+    def __init__(self, bins: int=4):
+        """
+        Initialize the estimator.
+
+        Args:
+            bins (int, optional): The number of bins each numeric input is cut into. Defaults to 4.
+
+        Raises:
+            ValueError: If bins is less than 1.
+        """
+        if bins < 1:
+            raise ValueError(f"bins must be at least 1, got {bins}")
+        self.bins = bins
+        self.observed = 0
+        self._bounds = {}
+        self._other = set()
+        self._observations = []
+        self._regions = {}
+        self._estimates = {}
+
+    def expand(self, inputs: dict):
+        """
+        Widens the bounds to cover a case. Submitting every case up front keeps the regions from shifting later.
+
+        Args:
+            inputs (dict): Mapping of addresses to input values.
+
+        Returns:
+            None
+        """
+        for address, value in inputs.items():
+            if address in self._other:
+                continue
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                # An address that isn't always numeric is matched on its value instead of binned.
+                self._other.add(address)
+                self._bounds.pop(address, None)
+                self._regions = None
+                continue
+            bounds = self._bounds.get(address)
+            if bounds is None:
+                self._bounds[address] = [value, value]
+                self._regions = None
+            elif value < bounds[0] or value > bounds[1]:
+                bounds[0], bounds[1] = min(bounds[0], value), max(bounds[1], value)
+                self._regions = None
+
+    def observe(self, inputs: dict, seconds: float):
+        """
+        Records how long a case took.
+
+        Args:
+            inputs (dict): Mapping of addresses to the case's input values.
+            seconds (float): The case's runtime.
+
+        Returns:
+            None
+        """
+        self.expand(inputs)
+        self._observations.append((dict(inputs), seconds))
+        self.observed += 1
+        self._estimates.clear()
+        if self._regions is not None:
+            totals = self._regions.setdefault(self.region(inputs), [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
+
+    def region(self, inputs: dict):
+        """
+        Returns the region a case falls in.
+
+        Args:
+            inputs (dict): Mapping of addresses to input values.
+
+        Returns:
+            tuple: One (address, bin or value) pair per address, sorted by address.
+        """
+        region = []
+        for address in sorted(inputs):
+            value = inputs[address]
+            bounds = self._bounds.get(address)
+            if bounds is None or address in self._other:
+                region.append((address, value))
+                continue
+            low, high = bounds
+            span = high - low
+            # The top of the range belongs to the last bin rather than a bin of its own.
+            index = min(floor((value - low) / span * self.bins), self.bins - 1) if span else 0
+            region.append((address, max(index, 0)))
+        return tuple(region)
+
+    def estimate(self, inputs: dict):
+        """
+        Returns the expected runtime of a case.
+
+        Args:
+            inputs (dict): Mapping of addresses to input values.
+
+        Returns:
+            float: The mean runtime of the case's region, or of the nearest regions with finished cases. None if
+                nothing has been observed.
+        """
+        if not self.observed:
+            return None
+        if self._regions is None:
+            self._rebuild()
+
+        region = self.region(inputs)
+        if region in self._estimates:
+            return self._estimates[region]
+        totals = self._regions.get(region)
+        if totals is not None:
+            estimate = totals[0] / totals[1]
+        else:
+            # Average the nearest regions. Bins are compared by index, other inputs add 1 when they differ.
+            nearest, best = [], None
+            for other, (total, count) in self._regions.items():
+                distance = self._distance(region, other)
+                if best is None or distance < best:
+                    nearest, best = [(total, count)], distance
+                elif distance == best:
+                    nearest.append((total, count))
+            estimate = sum(total for total, _ in nearest) / sum(count for _, count in nearest)
+        self._estimates[region] = estimate
+        return estimate
+
+    def _distance(self, a: tuple, b: tuple):
+        """
+        Returns how many bins apart two regions are.
+
+        Args:
+            a (tuple): A region.
+            b (tuple): Another region.
+
+        Returns:
+            float: The sum of the bin differences, plus 1 for each other input or address that differs.
+        """
+        a, b = dict(a), dict(b)
+        distance = 0
+        for address in a.keys() | b.keys():
+            if address in self._bounds and address in a and address in b:
+                distance += abs(a[address] - b[address])
+            else:
+                distance += a.get(address) != b.get(address)
+        return distance
+
+    def _rebuild(self):
+        """
+        Regroups every observation after the bounds have changed.
+
+        Returns:
+            None
+        """
+        self._regions = {}
+        self._estimates.clear()
+        for inputs, seconds in self._observations:
+            totals = self._regions.setdefault(self.region(inputs), [0.0, 0])
+            totals[0] += seconds
+            totals[1] += 1
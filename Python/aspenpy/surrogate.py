@@ -0,0 +1,619 @@
+import time
+
+import numpy as np
+
+from abc import ABC, abstractmethod
+from itertools import combinations_with_replacement
+
+from aspen import ASPEN
+from sweep import ResultStore
+
+# SciPy is only used to tune the Gaussian process hyperparameters. Without it a coarse grid search is used.
+try:
+    from scipy.optimize import minimize
+except ImportError:
+    minimize = None
+
+
+def training_data(rows, inputs=None, outputs=None):
+    """
+    Extracts (inputs, outputs) pairs from stored sweep results.
+
+    Rows that failed, or are missing a numeric value for any chosen address, are skipped.
+
+    Args:
+        rows (iterable): Result dictionaries as returned by ResultStore.rows.
+        inputs (iterable, optional): The input addresses to use. Defaults to None (every input in the rows).
+        outputs (iterable, optional): The output addresses to use. Defaults to None (every numeric output).
+
+    Returns:
+        tuple: (inputs, outputs, pairs) where pairs is a list of (input dict, output dict) tuples.
+    """
+    rows = [row for row in rows if row["status"] == "done" and row["outputs"]]
+    if inputs is None:
+        inputs = sorted({address for row in rows for address in row["inputs"]})
+    if outputs is None:
+        outputs = sorted({address for row in rows for address, value in row["outputs"].items()
+                          if isinstance(value, (int, float))})
+    inputs, outputs = list(inputs), list(outputs)
+
+    pairs = []
+    for row in rows:
+        values = {**row["inputs"], **row["outputs"]}
+        if all(isinstance(values.get(address), (int, float)) for address in inputs + outputs):
+            pairs.append(({address: row["inputs"][address] for address in inputs},
+                          {address: row["outputs"][address] for address in outputs}))
+    return inputs, outputs, pairs
+
+
+class Surrogate(ABC):
+    """
+    Base class of the surrogate models. Maps ASPEN input addresses to output addresses.
+
+    Inputs are scaled to [0, 1] and outputs standardised before fitting, so the model settings work for any
+    units. Subclasses implement _fit and _predict on the scaled data.
+
+    Attributes:
+        inputs : list
+            The input addresses, in column order.
+        outputs : list
+            The output addresses, in column order.
+        X : numpy.ndarray
+            The training inputs, one row per case.
+        Y : numpy.ndarray
+            The training outputs, one row per case.
+
+    Methods:
+        from_store(store, inputs=None, outputs=None, **options):
+            Builds and fits a model from a ResultStore.
+        fit(pairs):
+            Fits the model to (input dict, output dict) pairs.
+        add(inputs, outputs, refit=True):
+            Adds one case to the training data.
+        predict(inputs):
+            Predicts the outputs and their standard deviations for one case.
+        predict_array(X):
+            Predicts the outputs and their standard deviations for many cases at once.
+        uncertainty(inputs):
+            Returns the largest standard deviation relative to the spread of the training outputs.
+    """
+
+    def __init__(self, inputs, outputs):
+        """
+        Initialize an unfitted model.
+
+        Args:
+            inputs (iterable): The input addresses.
+            outputs (iterable): The output addresses.
+        """
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.X = np.empty((0, len(self.inputs)))
+        self.Y = np.empty((0, len(self.outputs)))
+
+    @classmethod
+    def from_store(cls, store: ResultStore, inputs=None, outputs=None, **options):
+        """
+        Builds and fits a model from the successful cases in a ResultStore.
+
+        Args:
+            store (ResultStore): The sweep results.
+            inputs (iterable, optional): The input addresses. Defaults to None (every input in the store).
+            outputs (iterable, optional): The output addresses. Defaults to None (every numeric output).
+            **options: Passed to the model's constructor.
+
+        Raises:
+            ValueError: If the store has no usable cases.
+
+        Returns:
+            Surrogate: The fitted model.
+        """
+        inputs, outputs, pairs = training_data(store.rows(status="done"), inputs, outputs)
+        if not pairs:
+            raise ValueError(f"No usable cases in {store.path}")
+        model = cls(inputs, outputs, **options)
+        model.fit(pairs)
+        return model
+
+    def fit(self, pairs):
+        """
+        Fits the model to (input dict, output dict) pairs, replacing any previous training data.
+
+        Args:
+            pairs (iterable): (input dict, output dict) tuples.
+
+        Returns:
+            Surrogate: This model.
+        """
+        pairs = list(pairs)
+        self.X = np.array([[inputs[address] for address in self.inputs] for inputs, _ in pairs], dtype=float)
+        self.Y = np.array([[outputs[address] for address in self.outputs] for _, outputs in pairs], dtype=float)
+        return self._refit()
+
+    def add(self, inputs: dict, outputs: dict, refit: bool=True):
+        """
+        Adds one case to the training data.
+
+        Args:
+            inputs (dict): The inputs of the case.
+            outputs (dict): The outputs of the case.
+            refit (bool, optional): Refit the model straight away. Defaults to True.
+
+        Returns:
+            Surrogate: This model.
+        """
+        self.X = np.vstack([self.X, [inputs[address] for address in self.inputs]])
+        self.Y = np.vstack([self.Y, [outputs[address] for address in self.outputs]])
+        return self._refit() if refit else self
+
+    def _refit(self):
+        """
+        Rescales the training data and fits the model to it.
+
+        Returns:
+            Surrogate: This model.
+        """
+        self._x_low = self.X.min(axis=0)
+        self._x_span = np.where(np.ptp(self.X, axis=0) > 0, np.ptp(self.X, axis=0), 1.0)
+        self._y_mean = self.Y.mean(axis=0)
+        self._y_scale = np.where(self.Y.std(axis=0) > 0, self.Y.std(axis=0), 1.0)
+        self._fit((self.X - self._x_low) / self._x_span, (self.Y - self._y_mean) / self._y_scale)
+        return self
+
+    def predict(self, inputs: dict):
+        """
+        Predicts the outputs of one case.
+
+        Args:
+            inputs (dict): The inputs of the case.
+
+        Returns:
+            tuple: (means, standard deviations), each a dictionary keyed by output address.
+        """
+        mean, std = self.predict_array([[inputs[address] for address in self.inputs]])
+        return dict(zip(self.outputs, mean[0].tolist())), dict(zip(self.outputs, std[0].tolist()))
+
+    def predict_array(self, X):
+        """
+        Predicts the outputs of many cases at once.
+
+        Args:
+            X (array-like): One row per case, with columns in the order of inputs.
+
+        Returns:
+            tuple: (means, standard deviations), each an array with one row per case and one column per output.
+        """
+        mean, std = self._predict((np.asarray(X, dtype=float) - self._x_low) / self._x_span)
+        return mean * self._y_scale + self._y_mean, std * self._y_scale
+
+    def uncertainty(self, inputs: dict):
+        """
+        Returns the largest predicted standard deviation across the outputs, relative to the spread of the
+        training outputs. 0 means the model is certain; around 1 means it knows no more than the mean.
+
+        Args:
+            inputs (dict): The inputs of the case.
+
+        Returns:
+            float: The relative uncertainty.
+        """
+        _, std = self._predict(((np.array([inputs[address] for address in self.inputs], dtype=float)
+                                 - self._x_low) / self._x_span)[None, :])
+        return float(std.max())
+
+    @abstractmethod
+    def _fit(self, X, Y):
+        """
+        Fits the model to scaled inputs and standardised outputs.
+
+        Args:
+            X (numpy.ndarray): The scaled inputs.
+            Y (numpy.ndarray): The standardised outputs.
+
+        Returns:
+            None
+        """
+
+    @abstractmethod
+    def _predict(self, X):
+        """
+        Predicts standardised outputs for scaled inputs.
+
+        Args:
+            X (numpy.ndarray): The scaled inputs.
+
+        Returns:
+            tuple: (means, standard deviations) in standardised units.
+        """
+
+
+def _squared_distances(A, B):
+    """
+    Returns the squared Euclidean distance between every row of A and every row of B.
+
+    Args:
+        A (numpy.ndarray): An (n, d) array.
+        B (numpy.ndarray): An (m, d) array.
+
+    Returns:
+        numpy.ndarray: An (n, m) array.
+    """
+    return np.maximum((A * A).sum(axis=1)[:, None] + (B * B).sum(axis=1)[None, :] - 2 * A @ B.T, 0.0)
+
+
+class GaussianProcess(Surrogate):
+    """
+    A Gaussian process with a squared-exponential kernel and one length scale per input.
+
+    The length scales and noise are tuned by maximising the marginal likelihood, with SciPy if it is installed
+    and a coarse grid search otherwise. The standard deviation is the posterior standard deviation.
+
+    Attributes:
+        length_scales : numpy.ndarray
+            The kernel length scales, in scaled input units.
+        noise : float
+            The noise variance, in standardised output units.
+        optimise : bool
+            Whether the hyperparameters are tuned on every fit.
+    """
+
+    def __init__(self, inputs, outputs, length_scale: float=0.3, noise: float=1e-6, optimise: bool=True):
+        """
+        Initialize an unfitted Gaussian process.
+
+        Args:
+            inputs (iterable): The input addresses.
+            outputs (iterable): The output addresses.
+            length_scale (float, optional): The starting length scale, in scaled input units. Defaults to 0.3.
+            noise (float, optional): The starting noise variance. Defaults to 1e-6, i.e. the solves are
+                treated as deterministic.
+            optimise (bool, optional): Tune the hyperparameters on every fit. Defaults to True.
+        """
+        super().__init__(inputs, outputs)
+        self.length_scales = np.full(len(self.inputs), length_scale)
+        self.noise = noise
+        self.optimise = optimise
+
+    def _kernel(self, A, B):
+        """
+        Evaluates the kernel between every row of A and every row of B.
+        """
+        return np.exp(-0.5 * _squared_distances(A / self.length_scales, B / self.length_scales))
+
+    def _negative_log_likelihood(self, X, Y, length_scales, noise):
+        """
+        Returns the negative log marginal likelihood summed over the outputs, up to a constant.
+        """
+        K = np.exp(-0.5 * _squared_distances(X / length_scales, X / length_scales)) + noise * np.eye(len(X))
+        try:
+            L = np.linalg.cholesky(K)
+        except np.linalg.LinAlgError:
+            return np.inf
+        alpha = np.linalg.solve(L.T, np.linalg.solve(L, Y))
+        return 0.5 * float((Y * alpha).sum()) + Y.shape[1] * float(np.log(np.diag(L)).sum())
+
+    def _tune(self, X, Y):
+        """
+        Tunes the length scales and noise by maximising the marginal likelihood.
+        """
+        if minimize is not None:
+            def objective(theta):
+                return self._negative_log_likelihood(X, Y, np.exp(theta[:-1]), np.exp(theta[-1]))
+            start = np.log(np.append(self.length_scales, max(self.noise, 1e-8)))
+            bounds = [(np.log(1e-2), np.log(1e2))] * X.shape[1] + [(np.log(1e-8), np.log(1e-1))]
+            result = minimize(objective, start, method="L-BFGS-B", bounds=bounds)
+            if np.isfinite(result.fun):
+                self.length_scales, self.noise = np.exp(result.x[:-1]), float(np.exp(result.x[-1]))
+            return
+
+        # Without SciPy, search a shared length scale and the noise on a grid.
+        best = (np.inf, self.length_scales, self.noise)
+        for length_scale in np.logspace(-1.5, 1, 12):
+            for noise in (1e-6, 1e-4, 1e-2):
+                length_scales = np.full(X.shape[1], length_scale)
+                score = self._negative_log_likelihood(X, Y, length_scales, noise)
+                if score < best[0]:
+                    best = (score, length_scales, noise)
+        _, self.length_scales, self.noise = best
+
+    def _fit(self, X, Y):
+        if self.optimise and len(X) > 1:
+            self._tune(X, Y)
+        self._X = X
+        K = self._kernel(X, X) + self.noise * np.eye(len(X))
+        L = np.linalg.cholesky(K)
+        # Keep the inverse factor so a prediction is two matrix products and no solves.
+        self._L_inverse = np.linalg.solve(L, np.eye(len(X)))
+        self._alpha = self._L_inverse.T @ (self._L_inverse @ Y)
+
+    def _predict(self, X):
+        K_star = self._kernel(X, self._X)
+        v = self._L_inverse @ K_star.T
+        variance = np.maximum(1.0 - (v * v).sum(axis=0), 0.0)
+        return K_star @ self._alpha, np.repeat(np.sqrt(variance)[:, None], self._alpha.shape[1], axis=1)
+
+
+class RBFInterpolant(Surrogate):
+    """
+    A radial basis function interpolant.
+
+    The standard deviation is a heuristic based on the leave-one-out error of the interpolant (from Rippa's
+    formula, so no refits are needed). It grows from 0 at a training case to the leave-one-out error one mean
+    spacing away, then keeps growing with distance towards the spread of the outputs (1 in standardised
+    units), as the Gaussian process's does, so extrapolated points stay uncertain.
+
+    Attributes:
+        kernel : str
+            "multiquadric", "gaussian" or "thin_plate".
+        epsilon : float
+            The shape parameter. None picks one from the spacing of the training cases.
+        smoothing : float
+            Added to the diagonal. 0 interpolates the training cases exactly.
+    """
+
+    KERNELS = ("multiquadric", "gaussian", "thin_plate")
+
+    def __init__(self, inputs, outputs, kernel: str="multiquadric", epsilon: float=None, smoothing: float=0.0):
+        """
+        Initialize an unfitted interpolant.
+
+        Args:
+            inputs (iterable): The input addresses.
+            outputs (iterable): The output addresses.
+            kernel (str, optional): "multiquadric", "gaussian" or "thin_plate". Defaults to "multiquadric".
+            epsilon (float, optional): The shape parameter. Defaults to None (one over the mean spacing).
+            smoothing (float, optional): Added to the diagonal. Defaults to 0.
+
+        Raises:
+            ValueError: If the kernel is not recognised.
+        """
+        if kernel not in self.KERNELS:
+            raise ValueError(f"Unknown kernel: {kernel}. Use one of {self.KERNELS}")
+        super().__init__(inputs, outputs)
+        self.kernel = kernel
+        self.epsilon = epsilon
+        self.smoothing = smoothing
+
+    def _phi(self, squared_distances):
+        """
+        Evaluates the radial basis function on squared distances.
+        """
+        if self.kernel == "gaussian":
+            return np.exp(-self._epsilon ** 2 * squared_distances)
+        if self.kernel == "multiquadric":
+            return np.sqrt(1.0 + self._epsilon ** 2 * squared_distances)
+        # Thin plate: r^2 log r, which is 0 at r = 0.
+        return 0.5 * squared_distances * np.log(np.where(squared_distances > 0, squared_distances, 1.0))
+
+    def _fit(self, X, Y):
+        self._X = X
+        squared_distances = _squared_distances(X, X)
+
+        # The mean distance to the nearest neighbour sets the shape parameter and the uncertainty scale.
+        nearest = np.sqrt(np.where(np.eye(len(X), dtype=bool), np.inf, squared_distances).min(axis=1))
+        self._spacing = float(nearest.mean()) if len(X) > 1 else 1.0
+        self._epsilon = self.epsilon if self.epsilon is not None else 1.0 / max(self._spacing, 1e-12)
+
+        A_inverse = np.linalg.pinv(self._phi(squared_distances) + self.smoothing * np.eye(len(X)))
+        self._weights = A_inverse @ Y
+
+        # Rippa's formula gives every leave-one-out error from one factorisation.
+        leave_one_out = self._weights / np.diag(A_inverse)[:, None]
+        self._loo_rms = np.sqrt((leave_one_out ** 2).mean(axis=0)) if len(X) > 1 else np.ones(Y.shape[1])
+
+    def _predict(self, X):
+        squared_distances = _squared_distances(X, self._X)
+        nearest = np.sqrt(squared_distances.min(axis=1))
+        spacings = (nearest / max(self._spacing, 1e-12))[:, None]
+        # Never saturate below the leave-one-out error, in case the interpolant fits worse than the mean.
+        spread = np.maximum(self._loo_rms, 1.0)[None, :]
+        std = np.where(spacings <= 1.0, spacings * self._loo_rms[None, :],
+                       spread - (spread - self._loo_rms[None, :]) * np.exp(1.0 - spacings))
+        return self._phi(squared_distances) @ self._weights, std
+
+
+class PolynomialModel(Surrogate):
+    """
+    A least-squares polynomial response surface.
+
+    The standard deviation is the standard error of prediction from the residuals of the fit.
+
+    Attributes:
+        degree : int
+            The highest total degree of the terms.
+    """
+
+    def __init__(self, inputs, outputs, degree: int=2):
+        """
+        Initialize an unfitted polynomial.
+
+        Args:
+            inputs (iterable): The input addresses.
+            outputs (iterable): The output addresses.
+            degree (int, optional): The highest total degree of the terms. Defaults to 2.
+        """
+        super().__init__(inputs, outputs)
+        self.degree = degree
+
+        # Each term is a tuple of input columns to multiply, e.g. (0, 0, 1) for x0^2 x1. () is the constant.
+        self._terms = [term for d in range(degree + 1)
+                       for term in combinations_with_replacement(range(len(self.inputs)), d)]
+
+    def _features(self, X):
+        """
+        Evaluates every term at every row of X.
+        """
+        return np.column_stack([np.prod(X[:, list(term)], axis=1) if term else np.ones(len(X)) for term in self._terms])
+
+    def _fit(self, X, Y):
+        F = self._features(X)
+        self._coefficients, *_ = np.linalg.lstsq(F, Y, rcond=None)
+        residuals = Y - F @ self._coefficients
+        self._sigma = np.sqrt((residuals ** 2).sum(axis=0) / max(len(X) - len(self._terms), 1))
+        self._covariance = np.linalg.pinv(F.T @ F)
+
+    def _predict(self, X):
+        F = self._features(X)
+        leverage = np.einsum("ij,jk,ik->i", F, self._covariance, F)
+        return F @ self._coefficients, np.sqrt(1.0 + leverage)[:, None] * self._sigma[None, :]
+
+
+# Model names accepted by ActiveLearner.from_store.
+SURROGATE_MODELS = {"gp": GaussianProcess, "rbf": RBFInterpolant, "polynomial": PolynomialModel}
+
+
+class ActiveLearner:
+    """
+    Answers cases from a surrogate and only sends uncertain ones to ASPEN.
+
+    A case whose relative uncertainty (see Surrogate.uncertainty) is above the threshold is run on ASPEN,
+    appended to the result store if one is given, and added to the model before the answer is returned.
+
+    Attributes:
+        model : Surrogate
+            The surrogate model.
+        aspen : ASPEN
+            A connected ASPEN instance used for the real solves.
+        store : ResultStore
+            Where real solves are recorded, or None.
+        threshold : float
+            The relative uncertainty above which a case is run on ASPEN.
+        timeout : float
+            Wall-clock limit per real solve in seconds, or None.
+        solves : int
+            The number of cases run on ASPEN.
+        predictions : int
+            The number of cases answered by the model.
+
+    Methods:
+        from_store(store, aspen, model="gp", inputs=None, outputs=None, threshold=0.1, timeout=None, **options):
+            Builds a learner with a model fitted to a ResultStore.
+        evaluate(inputs):
+            Returns the outputs of a case from the model, or from ASPEN if the model is too uncertain.
+        refine(candidates, budget):
+            Runs the most uncertain candidates on ASPEN, one at a time.
+    """
+
+    def __init__(self, model: Surrogate, aspen: ASPEN, store: ResultStore=None, threshold: float=0.1,
+                 timeout: float=None):
+        """
+        Initialize the learner.
+
+        Args:
+            model (Surrogate): A fitted surrogate model.
+            aspen (ASPEN): A connected ASPEN instance.
+            store (ResultStore, optional): Where real solves are recorded. Defaults to None.
+            threshold (float, optional): The relative uncertainty above which a case is run on ASPEN.
+                Defaults to 0.1.
+            timeout (float, optional): Wall-clock limit per real solve in seconds. Defaults to None (no limit).
+        """
+        self.model = model
+        self.aspen = aspen
+        self.store = store
+        self.threshold = threshold
+        self.timeout = timeout
+        self.solves = 0
+        self.predictions = 0
+
+    @classmethod
+    def from_store(cls, store: ResultStore, aspen: ASPEN, model: str="gp", inputs=None, outputs=None,
+                   threshold: float=0.1, timeout: float=None, **options):
+        """
+        Builds a learner with a model fitted to a ResultStore. New solves are appended to the same store.
+
+        Args:
+            store (ResultStore): The sweep results.
+            aspen (ASPEN): A connected ASPEN instance.
+            model (str, optional): "gp", "rbf" or "polynomial". Defaults to "gp".
+            inputs (iterable, optional): The input addresses. Defaults to None (every input in the store).
+            outputs (iterable, optional): The output addresses. Defaults to None (every numeric output).
+            threshold (float, optional): The relative uncertainty above which a case is run. Defaults to 0.1.
+            timeout (float, optional): Wall-clock limit per real solve in seconds. Defaults to None.
+            **options: Passed to the model's constructor.
+
+        Raises:
+            ValueError: If the model is not recognised or the store has no usable cases.
+
+        Returns:
+            ActiveLearner: The learner.
+        """
+        if model not in SURROGATE_MODELS:
+            raise ValueError(f"Unknown model: {model}. Use one of {tuple(SURROGATE_MODELS)}")
+        return cls(SURROGATE_MODELS[model].from_store(store, inputs, outputs, **options), aspen, store,
+                   threshold, timeout)
+
+    def evaluate(self, inputs: dict):
+        """
+        Returns the outputs of a case, from the model if it is certain enough and from ASPEN otherwise.
+
+        Args:
+            inputs (dict): The inputs of the case, keyed by the model's input addresses.
+
+        Returns:
+            tuple: (outputs, standard deviations, source) where source is "model" or "aspen". A solved case
+                has standard deviations of 0.
+        """
+        if self.model.uncertainty(inputs) <= self.threshold:
+            self.predictions += 1
+            return (*self.model.predict(inputs), "model")
+        outputs = self._solve(inputs)
+        return outputs, dict.fromkeys(outputs, 0.0), "aspen"
+
+    def refine(self, candidates, budget: int):
+        """
+        Improves the model where it is least certain, running up to budget candidates on ASPEN one at a time.
+
+        Stops early once every remaining candidate is within the threshold.
+
+        Args:
+            candidates (iterable): Input dictionaries to choose from.
+            budget (int): The most cases to run on ASPEN.
+
+        Returns:
+            list: The inputs of the cases that were run.
+        """
+        remaining = [dict(inputs) for inputs in candidates]
+        solved = []
+        while remaining and len(solved) < budget:
+            uncertainties = [self.model.uncertainty(inputs) for inputs in remaining]
+            index = int(np.argmax(uncertainties))
+            if uncertainties[index] <= self.threshold:
+                break
+            inputs = remaining.pop(index)
+            self._solve(inputs)
+            solved.append(inputs)
+        self.aspen.log(f"Refined surrogate with {len(solved)} ASPEN solves.")
+        return solved
+
+    def _solve(self, inputs: dict):
+        """
+        Runs a case on ASPEN, records it, and adds it to the model.
+
+        Args:
+            inputs (dict): The inputs of the case.
+
+        Raises:
+            RuntimeError: If the case fails or an output can't be read.
+
+        Returns:
+            dict: The outputs of the case.
+        """
+        # Every solve after the first starts from a clean simulation, as in Sweep.run.
+        if self.solves:
+            self.aspen.reset_aspen()
+        start_time = time.time()
+        try:
+            outputs = self.aspen.run_case(inputs, self.model.outputs, timeout=self.timeout)
+            if any(outputs[address] is None for address in self.model.outputs):
+                raise RuntimeError(f"Unable to read every output for {inputs}")
+        except Exception as e:
+            if self.store is not None:
+                self.store.append(inputs, status="failed", error=repr(e), elapsed=time.time() - start_time,
+                                  health=self.aspen.last_health)
+            raise
+        finally:
+            self.solves += 1
+        if self.store is not None:
+            self.store.append(inputs, outputs, elapsed=time.time() - start_time, health=self.aspen.last_health)
+        self.model.add(inputs, outputs)
+        return outputs
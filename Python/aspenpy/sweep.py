@@ -0,0 +1,453 @@
+import json
+import time
+import random
+import sqlite3
+import hashlib
+
+from math import dist
+from pathlib import Path
+from itertools import product
+
+from aspen import ASPEN
+from pool import ASPENPool
+
+
+def case_key(inputs: dict):
+    """
+    Builds a stable key for a case from its inputs.
+
+    Args:
+        inputs (dict): Mapping of Variable Explorer addresses to values.
+
+    Returns:
+        str: The SHA-1 hex digest of the inputs as sorted JSON.
+    """
+    return hashlib.sha1(json.dumps(sorted(inputs.items()), default=str).encode()).hexdigest()
+
+
+def grid_cases(space: dict):
+    """
+    Builds the full grid of cases over the given values.
+
+    Args:
+        space (dict): Mapping of addresses to the list of values each one takes.
+
+    Returns:
+        list: One input dictionary per grid point.
+    """
+    addresses = list(space)
+    return [dict(zip(addresses, values)) for values in product(*(space[address] for address in addresses))]
+
+
+def latin_hypercube_cases(bounds: dict, samples: int, seed: int=0):
+    """
+    Builds a Latin-hypercube design over the given bounds.
+
+    The seed defaults to 0 so that a restarted sweep regenerates the same cases.
+
+    Args:
+        bounds (dict): Mapping of addresses to (low, high) tuples.
+        samples (int): The number of cases.
+        seed (int, optional): The random seed. Defaults to 0.
+
+    Returns:
+        list: One input dictionary per sample.
+    """
+    rng = random.Random(seed)
+    columns = {}
+    for address, (low, high) in bounds.items():
+        # One point in each of the equal-probability strata, shuffled independently per address.
+        strata = [(i + rng.random()) / samples for i in range(samples)]
+        rng.shuffle(strata)
+        columns[address] = [low + (high - low) * u for u in strata]
+    return [{address: columns[address][i] for address in bounds} for i in range(samples)]
+
+
+def explicit_cases(addresses, rows):
+    """
+    Builds cases from an explicit table of values.
+
+    Args:
+        addresses (iterable): The addresses, one per column.
+        rows (iterable): Rows of values in address order.
+
+    Returns:
+        list: One input dictionary per row.
+    """
+    addresses = list(addresses)
+    return [dict(zip(addresses, row)) for row in rows]
+
+
+def nearest_neighbour_order(cases):
+    """
+    Orders cases along a greedy nearest-neighbour path through input space.
+
+    Numeric inputs are scaled by their range across the cases so no address dominates. Non-numeric
+    inputs add a distance of 1 when they differ. The path starts from the case nearest the lower corner.
+
+    Args:
+        cases (list): Input dictionaries.
+
+    Returns:
+        list: The same cases, reordered.
+    """
+    if len(cases) < 3:
+        return list(cases)
+    
+    # Scale each numeric address to [0, 1].
+    addresses = sorted({address for inputs in cases for address in inputs})
+    numeric = [address for address in addresses
+               if all(isinstance(inputs.get(address), (int, float)) for inputs in cases)]
+    scales = {}
+    for address in numeric:
+        values = [inputs[address] for inputs in cases]
+        scales[address] = (min(values), (max(values) - min(values)) or 1)
+    
+    def point(inputs):
+        return [(inputs[address] - scales[address][0]) / scales[address][1] for address in numeric]
+    
+    def distance(a, b):
+        mismatches = sum(cases[a].get(address) != cases[b].get(address) for address in addresses
+                         if address not in scales)
+        return dist(points[a], points[b]) + mismatches
+    
+    points = [point(inputs) for inputs in cases]
+    remaining = set(range(len(cases)))
+    current = min(remaining, key=lambda i: sum(points[i]))
+    order = [current]
+    remaining.remove(current)
+    while remaining:
+        current = min(remaining, key=lambda i: distance(current, i))
+        order.append(current)
+        remaining.remove(current)
+    return [cases[i] for i in order]
+
+
+class ResultStore:
+    """
+    An append-only SQLite store of sweep results.
+
+    Each finished case is written and committed immediately, so results survive a crash and can be
+    read by another process while the sweep is still running. With ASPEN's health check on, each row
+    also summarises the block health of the case.
+
+    Attributes:
+        path : pathlib.Path
+            The path to the SQLite database.
+
+    Methods:
+        append(inputs, outputs=None, status="done", error=None, elapsed=None, health=None):
+            Appends the result of one case.
+        completed_keys():
+            Returns the keys of every case that finished successfully.
+        rows(status=None):
+            Returns the stored results.
+        close():
+            Closes the database connection.
+    """
+
+    def __init__(self, path: str | Path):
+        """
+        Opens (or creates) the store.
+
+        Args:
+            path (str | Path): The path to the SQLite database.
+        """
+        self.path = Path(path)
+        self._connection = sqlite3.connect(self.path)
+
+        # WAL lets readers analyse partial results while the sweep keeps appending.
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "case_key TEXT NOT NULL, "
+            "status TEXT NOT NULL, "
+            "inputs TEXT NOT NULL, "
+            "outputs TEXT, "
+            "error TEXT, "
+            "elapsed REAL, "
+            "finished REAL NOT NULL, "
+            "health TEXT, "
+            "blocks TEXT)"
+        )
+        # Stores written before the health columns existed get them added.
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(results)")}
+        for column in ("health", "blocks"):
+            if column not in columns:
+                self._connection.execute(f"ALTER TABLE results ADD COLUMN {column} TEXT")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS results_case_key ON results (case_key)")
+        self._connection.commit()
+
+    def __enter__(self):
+        """
+        Allows for the use of the with keyword.
+
+        Returns:
+            ResultStore: This store.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """
+        Closes the store when leaving the with block.
+        """
+        self.close()
+
+    def append(self, inputs: dict, outputs: dict=None, status: str="done", error: str=None, elapsed: float=None,
+               health: dict=None):
+        """
+        Appends the result of one case and commits it.
+
+        Args:
+            inputs (dict): The inputs of the case.
+            outputs (dict, optional): The outputs of the case. Defaults to None.
+            status (str, optional): "done" or "failed". Defaults to "done".
+            error (str, optional): The error message of a failed case. Defaults to None.
+            elapsed (float, optional): Seconds the case took. Defaults to None.
+            health (dict, optional): The block health scan of the case (see ASPEN.scan_block_health).
+                Defaults to None (not scanned).
+
+        Returns:
+            None
+        """
+        # The health class gets its own column so it can be filtered on. The blocks behind it are kept as JSON.
+        blocks = None
+        if health is not None:
+            blocks = json.dumps({key: health[key] for key in ("errors", "warnings", "messages")}, default=str)
+        self._connection.execute(
+            "INSERT INTO results (case_key, status, inputs, outputs, error, elapsed, finished, health, blocks) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (case_key(inputs), status, json.dumps(inputs), json.dumps(outputs, default=str), error, elapsed,
+             time.time(), None if health is None else health["status"], blocks)
+        )
+        self._connection.commit()
+
+    def completed_keys(self):
+        """
+        Returns the keys of every case that finished successfully.
+
+        Returns:
+            set: The completed case keys.
+        """
+        return {key for key, in self._connection.execute("SELECT case_key FROM results WHERE status = 'done'")}
+
+    def rows(self, status: str=None):
+        """
+        Returns the stored results in the order they were written.
+
+        Args:
+            status (str, optional): Only return rows with this status. Defaults to None (all rows).
+
+        Returns:
+            list: One dictionary per stored result.
+        """
+        query = "SELECT case_key, status, inputs, outputs, error, elapsed, finished, health, blocks FROM results"
+        parameters = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            parameters = (status,)
+        return [
+            {
+                "case_key": key,
+                "status": row_status,
+                "inputs": json.loads(inputs),
+                "outputs": json.loads(outputs) if outputs is not None else None,
+                "error": error,
+                "elapsed": elapsed,
+                "finished": finished,
+                "health": health,
+                "blocks": json.loads(blocks) if blocks is not None else None
+            }
+            for key, row_status, inputs, outputs, error, elapsed, finished, health, blocks
+            in self._connection.execute(query + " ORDER BY id", parameters)
+        ]
+
+    def close(self):
+        """
+        Closes the database connection.
+
+        Returns:
+            None
+        """
+        self._connection.close()
+
+
+class Sweep:
+    """
+    A declarative sweep over ASPEN input addresses with a resumable result store.
+
+    Every finished case is written to the store straight away. Cases already completed in the
+    store are skipped, so a crashed or interrupted sweep picks up where it left off.
+
+    Attributes:
+        cases : list
+            The input dictionaries of every case in the sweep.
+        outputs : tuple
+            Addresses read after each case.
+        store : ResultStore
+            Where results are written.
+
+    Methods:
+        grid(space, store, outputs=()):
+            Builds a full-grid sweep.
+        latin_hypercube(bounds, samples, store, outputs=(), seed=0):
+            Builds a Latin-hypercube sweep.
+        explicit(addresses, rows, store, outputs=()):
+            Builds a sweep from an explicit table of values.
+        pending():
+            Returns the cases not yet completed in the store.
+        run(aspen, reload=False, timeout=None, warm_start=False, iteration_addresses=()):
+            Runs the pending cases one after another on a connected ASPEN instance.
+        run_pool(pool, callback=None, progress=None, iteration_addresses=()):
+            Runs the pending cases on an ASPENPool.
+    """
+
+    def __init__(self, cases, store: str | Path | ResultStore, outputs=()):
+        """
+        Initialize the sweep.
+
+        Args:
+            cases (iterable): Input dictionaries, one per case.
+            store (str | Path | ResultStore): The result store, or the path to one.
+            outputs (iterable, optional): Addresses to read after each case. Defaults to ().
+        """
+        self.cases = [dict(inputs) for inputs in cases]
+        self.outputs = tuple(outputs)
+        self.store = store if isinstance(store, ResultStore) else ResultStore(store)
+
+    @classmethod
+    def grid(cls, space: dict, store: str | Path | ResultStore, outputs=()):
+        """
+        Builds a full-grid sweep. See grid_cases.
+
+        Returns:
+            Sweep: The sweep.
+        """
+        return cls(grid_cases(space), store, outputs)
+
+    @classmethod
+    def latin_hypercube(cls, bounds: dict, samples: int, store: str | Path | ResultStore, outputs=(), seed: int=0):
+        """
+        Builds a Latin-hypercube sweep. See latin_hypercube_cases.
+
+        Returns:
+            Sweep: The sweep.
+        """
+        return cls(latin_hypercube_cases(bounds, samples, seed), store, outputs)
+
+    @classmethod
+    def explicit(cls, addresses, rows, store: str | Path | ResultStore, outputs=()):
+        """
+        Builds a sweep from an explicit table of values. See explicit_cases.
+
+        Returns:
+            Sweep: The sweep.
+        """
+        return cls(explicit_cases(addresses, rows), store, outputs)
+
+    def pending(self):
+        """
+        Returns the cases not yet completed in the store.
+
+        Returns:
+            list: The input dictionaries still to run.
+        """
+        completed = self.store.completed_keys()
+        return [inputs for inputs in self.cases if case_key(inputs) not in completed]
+
+    def run(self, aspen: ASPEN, reload: bool=False, timeout: float=None, warm_start: bool=False,
+            iteration_addresses=()):
+        """
+        Runs the pending cases one after another on a connected ASPEN instance.
+
+        A failed case is stored as failed and the sweep moves on. It is retried on the next run.
+
+        With warm_start the cases are ordered along a nearest-neighbour path and the simulation is not
+        reset between them, so each solve starts from the previous case's converged tear streams and
+        recycle estimates. The simulation is still reset after a failed case.
+
+        Args:
+            aspen (ASPEN): A connected ASPEN instance.
+            reload (bool, optional): Reload the archive between cases instead of reinitialising. Defaults to False.
+            timeout (float, optional): Wall-clock limit per case in seconds. A case that exceeds it is stopped
+                and stored as failed. Defaults to None (no limit).
+            warm_start (bool, optional): Carry the converged state from case to case. Defaults to False.
+            iteration_addresses (iterable, optional): Addresses holding solver iteration counts, e.g. the
+                convergence blocks' iteration outputs. They are stored with each case's outputs and summed
+                into the summary. Defaults to ().
+
+        Returns:
+            dict: The number of cases that finished and failed, and the total solver iterations.
+        """
+        summary = {"done": 0, "failed": 0, "iterations": 0}
+        cases = self.pending()
+        if warm_start:
+            cases = nearest_neighbour_order(cases)
+        
+        outputs_to_read = self.outputs + tuple(iteration_addresses)
+        reset_next = False
+        for index, inputs in enumerate(cases):
+            start_time = time.time()
+            try:
+                # Start from a clean simulation unless warm starting from a converged neighbour.
+                if index and (reset_next or not warm_start):
+                    aspen.reset_aspen(reload=reload)
+                reset_next = False
+                outputs = aspen.run_case(inputs, outputs_to_read, timeout=timeout)
+            except Exception as e:
+                aspen.error(f"Sweep case {inputs} failed: {e!r}")
+                self.store.append(inputs, status="failed", error=repr(e), elapsed=time.time() - start_time,
+                                  health=aspen.last_health)
+                summary["failed"] += 1
+                reset_next = True
+                continue
+            self.store.append(inputs, outputs, elapsed=time.time() - start_time, health=aspen.last_health)
+            summary["done"] += 1
+            summary["iterations"] += sum(outputs[address] or 0 for address in iteration_addresses)
+        
+        if iteration_addresses:
+            aspen.log(f"Sweep finished. {summary['iterations']} solver iterations over {summary['done']} cases.")
+        return summary
+
+    def run_pool(self, pool: ASPENPool, callback=None, progress=None, iteration_addresses=()):
+        """
+        Runs the pending cases on a started ASPENPool, storing each one as soon as it finishes.
+
+        For a pool created with warm_start the cases are submitted along a nearest-neighbour path. With the
+        "longest" schedule the pool's runtime estimator is seeded with the runtimes already in the store, so a
+        resumed sweep starts its most expensive cases first.
+
+        The sweep's outputs are read for every case, or the pool's outputs if the sweep has none.
+
+        Args:
+            pool (ASPENPool): A started pool.
+            callback (callable, optional): Called with each finished case, as yielded by
+                ASPENPool.imap_unordered, once it is stored. Defaults to None.
+            progress (progress.Progress, optional): A live view of the pending cases. Defaults to None.
+            iteration_addresses (iterable, optional): Addresses holding solver iteration counts, as for run. They
+                are stored with each case's outputs and summed into the summary. Defaults to ().
+
+        Returns:
+            dict: The number of cases that finished and failed, and the total solver iterations.
+        """
+        summary = {"done": 0, "failed": 0, "iterations": 0}
+        cases = self.pending()
+        if pool.warm_start:
+            cases = nearest_neighbour_order(cases)
+        if pool.schedule == "longest":
+            for row in self.store.rows("done"):
+                if row["elapsed"] is not None:
+                    pool.estimator.observe(row["inputs"], row["elapsed"])
+        outputs_to_read = (self.outputs or pool.outputs) + tuple(iteration_addresses)
+        for case in pool.imap_unordered(cases, outputs_to_read or None, progress=progress):
+            if case["outputs"] is None:
+                self.store.append(case["inputs"], status="failed", error=case["error"], health=case["health"])
+                summary["failed"] += 1
+            else:
+                self.store.append(case["inputs"], case["outputs"], elapsed=case["runtime"], health=case["health"])
+                summary["done"] += 1
+                summary["iterations"] += sum(case["outputs"][address] or 0 for address in iteration_addresses)
+            if callback is not None:
+                callback(case)
+        return summary
@@ -0,0 +1,67 @@
+"""
+Shared fixtures. Every test runs on backends.SimulatedBackend, so neither ASPEN nor Windows is needed.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from aspen import ASPEN
+from backends import SimulatedBackend
+
+
+# A two-block flowsheet: S1 feeds MIX, which makes S2. SPLIT has empty ports to connect streams to.
+FLOWSHEET = {
+    r"\Data\Streams\S1\Output\TEMP_OUT\MIXED": 300.0,
+    r"\Data\Streams\S2\Output\TEMP_OUT\MIXED": 310.0,
+    r"\Data\Streams\S3\Output\TEMP_OUT\MIXED": None,
+    r"\Data\Blocks\MIX\Ports\F(IN)\S1": None,
+    r"\Data\Blocks\MIX\Ports\P(OUT)\S2": None,
+    r"\Data\Blocks\MIX\Output\BLKSTAT": 0,
+    r"\Data\Blocks\MIX\Output\BLKMSG": "",
+    r"\Data\Blocks\SPLIT\Ports\F(IN)": None,
+    r"\Data\Blocks\SPLIT\Ports\P(OUT)": None,
+    r"\Data\Blocks\SPLIT\Output\BLKSTAT": 0,
+    r"\Data\Blocks\SPLIT\Output\BLKMSG": "",
+}
+
+
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    """
+    Runs every test in its own folder, so Run_Logs, caches and marker files land there.
+    """
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """
+    A file standing in for the ASPEN archive. The simulated backend only reads it.
+    """
+    path = tmp_path / "sim.bkp"
+    path.write_text("simulated archive")
+    return path
+
+
+@pytest.fixture
+def connect(archive):
+    """
+    Returns a function that connects a new ASPEN instance to the archive. Every instance is closed afterwards.
+    """
+    instances = []
+
+    def connect(backend=None, **options):
+        if backend is None:
+            backend = SimulatedBackend(FLOWSHEET)
+        aspen = ASPEN("Test", verbose=False, backend=backend, **options).__enter__()
+        instances.append(aspen)
+        aspen.connect_to_aspen(archive)
+        return aspen
+
+    yield connect
+    for aspen in reversed(instances):
+        aspen.__exit__(None, None, None)
@@ -0,0 +1,116 @@
+"""
+Tests for running, timing out, stopping and checking a single ASPEN instance.
+"""
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from threading import Event
+
+import pytest
+
+from aspen import ConvergenceError, classify_block_status
+from backends import SimulatedBackend, SimulatedEngine
+from conftest import FLOWSHEET
+
+
+def wait_until(condition, timeout=5.0):
+    """
+    Polls a condition until it holds, failing the test if it doesn't within the timeout.
+    """
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "condition never held"
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("status, message, expected", [
+    (0, "", "converged"),
+    (0, "BLOCK COMPLETED NORMALLY, no errors", "converged"),
+    (0, "0 errors, 0 warnings", "converged"),
+    (0, "  ** ERROR WHILE EXECUTING UNIT OPERATIONS BLOCK", "errors"),
+    (0, "*** SEVERE ERROR: DIMENSIONS EXCEEDED", "errors"),
+    (0, "Block NOT CONVERGED after 30 iterations", "errors"),
+    (0, "  * WARNING: TEMPERATURE OUT OF RANGE", "warnings"),
+    (1, "", "errors"),
+    (2, "", "warnings"),
+    (2, "** ERROR", "errors"),
+    (7, "", "errors"),
+    ("1", None, "errors"),
+    (None, None, "warnings"),
+    ("n/a", "", "warnings"),
+])
+def test_classify_block_status(status, message, expected):
+    assert classify_block_status(status, message) == expected
+
+
+def test_run_case_sets_inputs_and_reads_outputs(connect):
+    address = r"\Data\Streams\S1\Output\TEMP_OUT\MIXED"
+    aspen = connect()
+    assert aspen.run_case({address: 350}, [address]) == {address: 350}
+    assert aspen.aspen.Engine.runs == 1
+
+
+def test_run_aspen_timeout_stops_the_run(connect):
+    aspen = connect(SimulatedBackend(FLOWSHEET, solve_time=5))
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        aspen.run_aspen(autosave=False, timeout=0.3)
+    # The engine acknowledged the stop, so the instance is kept and can run again.
+    assert time.time() - start < 2
+    assert aspen.aspen is not None
+    assert not aspen._aspen_is_running
+    assert aspen.aspen.Engine.runs == 1
+
+
+def test_cancel_run_stops_a_background_run(connect):
+    aspen = connect(SimulatedBackend(FLOWSHEET, solve_time=5))
+    future = aspen.run_aspen_future(autosave=False)
+    wait_until(lambda: aspen.aspen.Engine.IsRunning)
+    aspen.cancel_run()
+    with pytest.raises(RuntimeError, match="cancelled"):
+        future.result(2)
+    assert not aspen.aspen.Engine.IsRunning
+
+
+def test_cancel_run_before_the_run_starts(connect):
+    aspen = connect(SimulatedBackend(FLOWSHEET, solve_time=5))
+    # Keep the engine thread busy so the run is still queued when it is cancelled.
+    busy = Event()
+    aspen._engine_executor = ThreadPoolExecutor(max_workers=1)
+    aspen._engine_executor.submit(busy.wait)
+    future = aspen.run_aspen_future(autosave=False)
+    aspen.cancel_run()
+    busy.set()
+    with pytest.raises(CancelledError):
+        future.result(2)
+    assert aspen.aspen.Engine.runs == 0
+
+
+def test_ignored_stop_kills_and_relaunches(connect, monkeypatch):
+    monkeypatch.setattr(SimulatedEngine, "Stop", lambda self: None)
+    aspen = connect(SimulatedBackend(FLOWSHEET, solve_time=2), wait_timeout=0.3)
+    with pytest.raises(TimeoutError):
+        aspen.run_aspen(autosave=False, timeout=0.2)
+    assert aspen.aspen is None
+    
+    # The next case dispatches a new document and reloads the archive before setting its inputs.
+    address = r"\Data\Streams\S1\Output\TEMP_OUT\MIXED"
+    aspen.backend.solve_time = 0
+    assert aspen.run_case({address: 320.0}, [address]) == {address: 320.0}
+    assert aspen.aspen is not None
+
+
+def test_health_check_raises_on_block_errors(connect):
+    values = {**FLOWSHEET, r"\Data\Blocks\SPLIT\Output\BLKSTAT": 1,
+              r"\Data\Blocks\SPLIT\Output\BLKMSG": "** ERROR: FLASH FAILED"}
+    aspen = connect(SimulatedBackend(values), health_check=True)
+    with pytest.raises(ConvergenceError) as raised:
+        aspen.run_case({}, ())
+    assert raised.value.health["status"] == "errors"
+    assert raised.value.health["errors"] == ["SPLIT"]
+    assert raised.value.health["messages"] == {"SPLIT": "** ERROR: FLASH FAILED"}
+
+
+def test_health_check_passes_converged_runs(connect):
+    aspen = connect(health_check=True)
+    aspen.run_case({}, ())
+    assert aspen.last_health == {"status": "converged", "errors": [], "warnings": [], "messages": {}}
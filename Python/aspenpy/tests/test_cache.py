@@ -0,0 +1,99 @@
+"""
+Tests for the result and archive caches.
+"""
+import stat
+
+import pytest
+
+from cache import ArchiveCache, ResultCache, hash_archive
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(tmp_path / "results.db")
+    yield cache
+    cache.close()
+
+
+def test_key_treats_ints_and_floats_alike(cache):
+    assert cache.key("hash", {"A": 1, "B": "x"}) == cache.key("hash", {"B": "x", "A": 1.0})
+    assert cache.key("hash", {"A": 1}) != cache.key("hash", {"A": 1.5})
+    assert cache.key("hash", {"A": 1}) != cache.key("other", {"A": 1})
+    # Booleans are not numbers to ASPEN.
+    assert cache.key("hash", {"A": True}) != cache.key("hash", {"A": 1})
+
+
+def test_key_snaps_to_the_tolerance_grid(tmp_path):
+    cache = ResultCache(tmp_path / "grid.db", tolerance=0.1)
+    try:
+        assert cache.key("hash", {"A": 0.2}) == cache.key("hash", {"A": 0.2001})
+        assert cache.key("hash", {"A": 0.2}) != cache.key("hash", {"A": 0.3})
+    finally:
+        cache.close()
+
+
+def test_get_needs_every_wanted_output(cache):
+    cache.put("k", {"X": 1.0})
+    cache.put("k", {"Y": 2.0})
+    assert cache.get("k", ["X", "Y"]) == {"X": 1.0, "Y": 2.0}
+    assert cache.get("k", ["X", "Z"]) is None
+    assert cache.get("missing", []) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_evicts_least_recently_used_entries(tmp_path):
+    cache = ResultCache(tmp_path / "lru.db", max_entries=2)
+    try:
+        cache.put("a", {"X": 1})
+        cache.put("b", {"X": 2})
+        assert cache.get("a", ["X"]) == {"X": 1}  # "b" is now the oldest
+        cache.put("c", {"X": 3})
+        assert cache.get("b", ["X"]) is None
+        assert cache.get("a", ["X"]) == {"X": 1}
+        assert cache.get("c", ["X"]) == {"X": 3}
+    finally:
+        cache.close()
+
+
+def test_evicts_down_to_max_bytes(tmp_path):
+    cache = ResultCache(tmp_path / "bytes.db", max_bytes=50)
+    try:
+        cache.put("a", {"X": "a" * 20})
+        cache.put("b", {"X": "b" * 20})
+        assert cache.get("a", ["X"]) is None
+        assert cache.get("b", ["X"]) == {"X": "b" * 20}
+    finally:
+        cache.close()
+
+
+def test_run_case_is_memoized(connect, cache):
+    address = r"\Data\Streams\S1\Output\TEMP_OUT\MIXED"
+    aspen = connect(result_cache=cache)
+    aspen.run_case({address: 1}, [address])
+    aspen.run_case({address: 1.0}, [address])
+    assert aspen.aspen.Engine.runs == 1
+    assert cache.hits == 1
+
+
+def test_archive_cache_stages_once_and_hands_out_private_copies(tmp_path, archive):
+    archives = ArchiveCache(tmp_path / "archives")
+    digest = hash_archive(archive)
+    first = archives.checkout(archive, digest)
+    second = archives.checkout(archive, digest)
+    assert first != second
+    assert first.read_bytes() == second.read_bytes() == archive.read_bytes()
+    assert [entry.name for entry in (tmp_path / "archives" / "archives").iterdir()] == [digest]
+    archives.release(first)
+    archives.release(second)
+    assert not first.exists() and not second.exists()
+
+
+def test_archive_cache_links_copies_to_a_read_only_archive(tmp_path, archive):
+    archives = ArchiveCache(tmp_path / "archives", link=True)
+    copy = archives.checkout(archive)
+    staged = archives.stage(archive)
+    assert copy.stat().st_ino == staged.stat().st_ino
+    # An in-place save fails instead of changing every worker's copy.
+    assert not staged.stat().st_mode & stat.S_IWUSR
+    archives.release(copy)
+    assert staged.exists() and not staged.stat().st_mode & stat.S_IWUSR
@@ -0,0 +1,70 @@
+"""
+Tests for the coordinator and the agents that pull cases from it.
+"""
+import multiprocessing
+import time
+
+import pytest
+
+from aspen import kill_process_tree
+from backends import SimulatedBackend
+from distributed import Coordinator, Agent
+
+ADDRESS = r"\Data\Blocks\SPLIT\Input\FRAC\S3"
+
+# BaseManager's server thread ends with sys.exit(0) once stopped, which threading ignores but pytest reports.
+pytestmark = pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+
+
+def run_agent(address, archive, host, licences, solve_time):
+    """
+    Runs an agent on the simulated backend until the coordinator stops it.
+    """
+    backend = SimulatedBackend(solve_time=solve_time, create_missing=True)
+    Agent(address, archive, b"secret", licences=licences, host=host, outputs=[ADDRESS], heartbeat_interval=0.3,
+          poll_interval=0.2, pool_options={"console_log": False,
+                                           "aspen_options": {"verbose": False, "backend": backend}}).run()
+
+
+def start_agent(coordinator, archive, host, licences, solve_time=0.0):
+    process = multiprocessing.Process(target=run_agent,
+                                      args=(coordinator.address, archive, host, licences, solve_time))
+    process.start()
+    return process
+
+
+def test_agents_run_every_case(archive):
+    with Coordinator(("127.0.0.1", 0), b"secret", heartbeat_timeout=5, host_limits={"a": 1}) as coordinator:
+        agents = [start_agent(coordinator, archive, "a", 4), start_agent(coordinator, archive, "b", 2)]
+        results = coordinator.map([{ADDRESS: float(value)} for value in range(6)])
+        # Host a is held to its one licence however many the agent asks for.
+        slots = {agent["host"]: agent["slots"] for agent in coordinator.health().values()}
+        coordinator.close()
+    for agent in agents:
+        agent.join(10)
+        assert agent.exitcode == 0
+    assert results == [{ADDRESS: float(value)} for value in range(6)]
+    assert coordinator.errors == {}
+    assert slots == {"a": 1, "b": 2}
+
+
+def test_cases_of_a_lost_agent_are_requeued(archive):
+    with Coordinator(("127.0.0.1", 0), b"secret", heartbeat_timeout=2) as coordinator:
+        lost = start_agent(coordinator, archive, "a", 2, solve_time=0.5)
+        case_ids = [coordinator.submit({ADDRESS: float(value)}) for value in range(4)]
+        time.sleep(1.5)
+        # The whole host goes down with cases in flight, workers and all.
+        kill_process_tree([lost.pid])
+        lost.join()
+        survivor = start_agent(coordinator, archive, "b", 2)
+        results = dict(coordinator.results(len(case_ids), timeout=30))
+        coordinator.close()
+    survivor.join(10)
+    assert survivor.exitcode == 0
+    assert results == {case_id: {ADDRESS: float(case_id)} for case_id in case_ids}
+    assert coordinator.errors == {}
+
+
+def test_coordinator_needs_an_authkey():
+    with pytest.raises(ValueError, match="authkey"):
+        Coordinator(("127.0.0.1", 0), None)
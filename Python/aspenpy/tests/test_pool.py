@@ -0,0 +1,81 @@
+"""
+Tests for the worker pool's crash isolation, deadlines and retries.
+"""
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from aspen import ASPEN
+from backends import SimulatedBackend
+from pool import ASPENPool
+
+ADDRESS = r"\Data\Blocks\SPLIT\Input\FRAC\S3"
+
+
+class FaultyASPEN(ASPEN):
+    """
+    Misbehaves on chosen inputs: 0.3 crashes the worker, 0.5 hangs, and 0.7 fails the first time only.
+    """
+
+    def run_case(self, inputs, outputs=(), autosave=False, timeout=None):
+        value = inputs.get(ADDRESS)
+        if value == 0.3:
+            os._exit(3)
+        if value == 0.5:
+            time.sleep(1000)
+        if value == 0.7 and not Path("flaky.marker").exists():
+            Path("flaky.marker").touch()
+            raise RuntimeError("flaky")
+        return super().run_case(inputs, outputs, autosave, timeout)
+
+
+def make_pool(archive, **options):
+    """
+    A two-worker pool on the simulated backend with short heartbeats, so failures are noticed quickly.
+    """
+    options = {"processes": 2, "outputs": [ADDRESS], "log_folder": "Pool", "heartbeat_interval": 0.2,
+               "heartbeat_timeout": 3, "steal_after": None, "console_log": False,
+               "aspen_options": {"verbose": False, "backend": SimulatedBackend(create_missing=True)},
+               **options}
+    return ASPENPool(archive, **options)
+
+
+def test_map_returns_outputs_in_order(archive):
+    with make_pool(archive) as pool:
+        results = pool.map([{ADDRESS: value} for value in (0.1, 0.2, 0.3)])
+    assert results == [{ADDRESS: 0.1}, {ADDRESS: 0.2}, {ADDRESS: 0.3}]
+    assert pool.errors == {}
+    assert (pool.recycled, pool.requeued) == (0, 0)
+    assert sorted(pool.runtimes) == [0, 1, 2]
+
+
+def test_crash_deadline_and_retry(archive):
+    # One case crashes its worker every time, one hangs past the deadline every time, one fails once and
+    # succeeds on its retry. The good cases are unaffected.
+    values = (0.1, 0.3, 0.5, 0.7, 0.9)
+    with make_pool(archive, aspen_class=FaultyASPEN, retries=1, case_deadline=2) as pool:
+        results = pool.map([{ADDRESS: value} for value in values])
+    
+    assert results == [{ADDRESS: 0.1}, None, None, {ADDRESS: 0.7}, {ADDRESS: 0.9}]
+    assert set(pool.errors) == {1, 2}
+    assert "died with exit code 3" in pool.errors[1]
+    assert pool.errors[2] == "Case 2 overran its 2 second deadline"
+    # Each bad case is retried once, and the flaky case once. Every failure replaces its worker.
+    assert pool.requeued == 3
+    assert pool.recycled == 5
+    assert Path("flaky.marker").exists()
+
+
+def test_failed_cases_are_not_retried_without_budget(archive):
+    with make_pool(archive, aspen_class=FaultyASPEN, retries=0) as pool:
+        results = pool.map([{ADDRESS: value} for value in (0.7, 0.1)])
+    assert results == [None, {ADDRESS: 0.1}]
+    assert "flaky" in pool.errors[0]
+    assert pool.requeued == 0
+
+
+def test_invalid_schedule_is_rejected(archive):
+    with pytest.raises(ValueError, match="Unknown schedule"):
+        make_pool(archive, schedule="random")
@@ -0,0 +1,97 @@
+"""
+Tests for the flowsheet index and all-or-nothing rewiring.
+"""
+import pytest
+
+from backends import SimulatedElements
+from topology import FlowsheetIndex
+
+
+def streams_on(aspen, block_name, port_name):
+    """
+    Reads the streams on a port straight from the simulated tree, bypassing the index.
+    """
+    port = aspen.aspen.Tree.FindNode(f"\\Data\\Blocks\\{block_name}\\Ports\\{port_name}")
+    return [stream.Name for stream in port.Elements]
+
+
+def test_index_reads_the_tree(connect):
+    index = connect().flowsheet
+    assert index.source_of("S2") == "MIX"
+    assert index.destination_of("S1") == "MIX"
+    assert index.source_of("S1") is None
+    assert index.ports_of("SPLIT") == {"F(IN)": set(), "P(OUT)": set()}
+
+
+def test_connect_replaces_the_old_end():
+    index = FlowsheetIndex()
+    index.connect("A", "S1", "P(OUT)")
+    index.connect("B", "S1", "F(IN)")
+    assert index.downstream("A") == {"B"}
+    
+    # A stream has one destination, so connecting it to C unlinks B.
+    index.connect("C", "S1", "F(IN)")
+    assert index.destination_of("S1") == "C"
+    assert index.downstream("A") == {"C"}
+    assert index.upstream("B") == set()
+    assert index.ports_of("B")["F(IN)"] == set()
+
+
+def test_rewire_applies_and_updates_the_index(connect):
+    aspen = connect()
+    with aspen.rewire() as tx:
+        tx.reconnect("MIX", "SPLIT", "S1", "F(IN)")
+        tx.connect("SPLIT", "S3", "P(OUT)")
+    assert streams_on(aspen, "MIX", "F(IN)") == []
+    assert streams_on(aspen, "SPLIT", "F(IN)") == ["S1"]
+    assert streams_on(aspen, "SPLIT", "P(OUT)") == ["S3"]
+    assert aspen.flowsheet.destination_of("S1") == "SPLIT"
+    assert aspen.flowsheet.source_of("S3") == "SPLIT"
+
+
+@pytest.mark.parametrize("operation, match", [
+    (("connect", "NOPE", "S1", "F(IN)"), "doesn't exist"),
+    (("connect", "SPLIT", "S1", "F(OUT)"), "no port"),
+    (("connect", "SPLIT", "S9", "F(IN)"), "stream doesn't exist"),
+    (("disconnect", "SPLIT", "S1", "F(IN)"), "not on"),
+    (("connect", "MIX", "S1", "F(IN)"), "already on"),
+    (("connect", "SPLIT", "S1", "F(IN)"), "already connected to MIX"),
+])
+def test_rewire_rejects_invalid_operations(connect, operation, match):
+    aspen = connect()
+    action, *arguments = operation
+    with pytest.raises(ValueError, match=match):
+        with aspen.rewire() as tx:
+            getattr(tx, action)(*arguments)
+    # Nothing was applied.
+    assert streams_on(aspen, "MIX", "F(IN)") == ["S1"]
+    assert streams_on(aspen, "SPLIT", "F(IN)") == []
+
+
+def test_rewire_rolls_back_when_a_step_fails(connect, monkeypatch):
+    aspen = connect()
+    add = SimulatedElements.Add
+
+    def add_or_fail(elements, name):
+        if name == "S3":
+            raise AttributeError("simulated COM failure")
+        return add(elements, name)
+
+    monkeypatch.setattr(SimulatedElements, "Add", add_or_fail)
+    with pytest.raises(RuntimeError, match="connect S3"):
+        with aspen.rewire() as tx:
+            tx.reconnect("MIX", "SPLIT", "S1", "F(IN)")
+            tx.connect("SPLIT", "S3", "P(OUT)")
+    
+    # The reconnect that did go through was undone, in Aspen and in the index.
+    assert streams_on(aspen, "MIX", "F(IN)") == ["S1"]
+    assert streams_on(aspen, "SPLIT", "F(IN)") == []
+    assert streams_on(aspen, "SPLIT", "P(OUT)") == []
+    assert aspen.flowsheet.destination_of("S1") == "MIX"
+
+
+def test_stream_reconnect_reports_failure(connect):
+    aspen = connect()
+    assert aspen.stream_reconnect("SPLIT", "MIX", "S1", "F(IN)") == -1
+    assert aspen.stream_reconnect("MIX", "SPLIT", "S1", "F(IN)") == 0
+    assert aspen.flowsheet.destination_of("S1") == "SPLIT"
@@ -0,0 +1,152 @@
+import json
+import math
+import time
+
+from threading import Lock
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Timings:
+    """
+    Collects per-stage timing spans into in-memory histograms.
+
+    Every finished span is appended to a JSON lines file straight away. The histograms can be written
+    out in the Prometheus text format at any time.
+
+    Attributes:
+        BUCKETS : tuple
+            The upper bounds, in seconds, of the histogram buckets.
+        jsonl_path : pathlib.Path
+            Where spans are appended as JSON lines, or None.
+        stages : dict
+            Mapping of stage names to their count, sum, min, max and bucket counts.
+
+    Methods:
+        span(stage, **labels):
+            Context manager that times a stage.
+        record(stage, seconds, **labels):
+            Adds one measurement to the histograms.
+        summary():
+            Returns the count, total, mean, min and max of every stage.
+        write_prometheus(path):
+            Writes the histograms in the Prometheus text format.
+        from_jsonl(paths):
+            Rebuilds the histograms from JSON lines files, e.g. from every worker of a sweep.
+    """
+    BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 600, math.inf)
+
+    def __init__(self, jsonl_path: str | Path=None):
+        """
+        Initialize empty histograms.
+
+        Args:
+            jsonl_path (str | Path, optional): Where finished spans are appended. Defaults to None (not written).
+        """
+        self.jsonl_path = None if jsonl_path is None else Path(jsonl_path)
+        self.stages = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def span(self, stage: str, **labels):
+        """
+        Times the body of a with block as one measurement of a stage.
+
+        Args:
+            stage (str): The stage name, e.g. "solve".
+            **labels: Extra fields written with the span, e.g. run_id.
+
+        Yields:
+            None
+        """
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.record(stage, time.time() - start_time, start=start_time, **labels)
+
+    def record(self, stage: str, seconds: float, **labels):
+        """
+        Adds one measurement to the histograms and appends it to the JSON lines file.
+
+        Args:
+            stage (str): The stage name.
+            seconds (float): How long the stage took.
+            **labels: Extra fields written with the span.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            stats = self.stages.setdefault(
+                stage, {"count": 0, "sum": 0.0, "min": math.inf, "max": 0.0, "buckets": [0] * len(self.BUCKETS)}
+            )
+            stats["count"] += 1
+            stats["sum"] += seconds
+            stats["min"] = min(stats["min"], seconds)
+            stats["max"] = max(stats["max"], seconds)
+            for index, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][index] += 1
+            if self.jsonl_path is not None:
+                with open(self.jsonl_path, "a") as file:
+                    file.write(json.dumps({"stage": stage, "seconds": seconds, **labels}, default=str) + "\n")
+
+    def summary(self):
+        """
+        Returns the count, total, mean, min and max of every stage.
+
+        Returns:
+            dict: Mapping of stage names to their statistics.
+        """
+        return {
+            stage: {
+                "count": stats["count"],
+                "total": stats["sum"],
+                "mean": stats["sum"] / stats["count"],
+                "min": stats["min"],
+                "max": stats["max"]
+            }
+            for stage, stats in self.stages.items()
+        }
+
+    def write_prometheus(self, path: str | Path):
+        """
+        Writes the histograms in the Prometheus text exposition format.
+
+        Args:
+            path (str | Path): The file to write.
+
+        Returns:
+            None
+        """
+        lines = [
+            "# HELP aspen_stage_seconds Wall-clock seconds spent in each ASPEN stage.",
+            "# TYPE aspen_stage_seconds histogram"
+        ]
+        for stage, stats in sorted(self.stages.items()):
+            for bound, count in zip(self.BUCKETS, stats["buckets"]):
+                le = "+Inf" if bound == math.inf else str(bound)
+                lines.append(f'aspen_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {count}')
+            lines.append(f'aspen_stage_seconds_sum{{stage="{stage}"}} {stats["sum"]}')
+            lines.append(f'aspen_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        Path(path).write_text("\n".join(lines) + "\n")
+
+    @classmethod
+    def from_jsonl(cls, paths):
+        """
+        Rebuilds the histograms from JSON lines files, e.g. from every worker of a sweep.
+
+        Args:
+            paths (iterable): The JSON lines files.
+
+        Returns:
+            Timings: The combined histograms.
+        """
+        timings = cls()
+        for path in paths:
+            with open(path) as file:
+                for line in file:
+                    span = json.loads(line)
+                    timings.record(span["stage"], span["seconds"])
+        return timings
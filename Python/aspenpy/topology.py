@@ -0,0 +1,536 @@
+import json
+
+from pathlib import Path
+
+
+class FlowsheetIndex:
+    """
+    An in-memory graph of the flowsheet's blocks, streams and ports.
+
+    Built with one walk of the Aspen tree and then kept up to date as streams are connected and
+    disconnected, so topology queries never go back to COM.
+
+    Attributes:
+        blocks : dict
+            Mapping of block names to {port name: set of stream names}.
+        streams : set
+            Every stream name.
+        _sources : dict
+            Mapping of stream names to the (block, port) that produces them.
+        _destinations : dict
+            Mapping of stream names to the (block, port) they feed.
+        _downstream : dict
+            Mapping of block names to {downstream block: number of connecting streams}.
+        _upstream : dict
+            Mapping of block names to {upstream block: number of connecting streams}.
+
+    Methods:
+        from_tree(tree):
+            Builds the index from the Aspen tree.
+        add_block(block_name):
+            Adds a block with no ports.
+        add_stream(stream_name):
+            Adds an unconnected stream.
+        connect(block_name, stream_name, port_name):
+            Records a stream connected to a block port.
+        disconnect(block_name, stream_name, port_name):
+            Records a stream disconnected from a block port.
+        ports_of(block_name):
+            Returns the ports of a block and the streams on each.
+        source_of(stream_name):
+            Returns the block that feeds a stream.
+        destination_of(stream_name):
+            Returns the block a stream feeds.
+        downstream(block_name):
+            Returns the blocks fed by a block.
+        upstream(block_name):
+            Returns the blocks feeding a block.
+        to_json(path=None):
+            Exports the graph as a JSON-serialisable dictionary.
+        to_networkx():
+            Exports the graph as a networkx MultiDiGraph.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty index.
+        """
+        self.blocks = {}
+        self.streams = set()
+        self._sources = {}
+        self._destinations = {}
+        self._downstream = {}
+        self._upstream = {}
+
+    @classmethod
+    def from_tree(cls, tree):
+        """
+        Builds the index by walking the blocks, streams and block ports of the Aspen tree once.
+
+        Args:
+            tree (Node): The Aspen tree, i.e. aspen.Tree.
+
+        Returns:
+            FlowsheetIndex: The index.
+        """
+        index = cls()
+        data = tree.Elements("Data")
+        for stream in data.Elements("Streams").Elements:
+            index.add_stream(stream.Name)
+        for block in data.Elements("Blocks").Elements:
+            index.add_block(block.Name)
+            for port in block.Elements("Ports").Elements:
+                index.blocks[block.Name].setdefault(port.Name, set())
+                for stream in port.Elements:
+                    index.connect(block.Name, stream.Name, port.Name)
+        return index
+
+    @staticmethod
+    def _is_outlet(port_name: str):
+        """
+        Tells whether a port is an outlet from its name, e.g. 'P(OUT)'.
+
+        Args:
+            port_name (str): The port name.
+
+        Returns:
+            bool: True for outlet ports.
+        """
+        return port_name.upper().endswith("(OUT)")
+
+    def add_block(self, block_name: str):
+        """
+        Adds a block with no ports.
+
+        Args:
+            block_name (str): The block name.
+
+        Returns:
+            None
+        """
+        self.blocks.setdefault(block_name, {})
+        self._downstream.setdefault(block_name, {})
+        self._upstream.setdefault(block_name, {})
+
+    def add_stream(self, stream_name: str):
+        """
+        Adds an unconnected stream.
+
+        Args:
+            stream_name (str): The stream name.
+
+        Returns:
+            None
+        """
+        self.streams.add(stream_name)
+
+    def connect(self, block_name: str, stream_name: str, port_name: str):
+        """
+        Records a stream connected to a block port and links the blocks on either end of it.
+
+        A stream has one source and one destination, so connecting a new one replaces the old one.
+
+        Args:
+            block_name (str): The block name.
+            stream_name (str): The stream name.
+            port_name (str): The port name.
+
+        Returns:
+            None
+        """
+        self.add_block(block_name)
+        self.add_stream(stream_name)
+        self.blocks[block_name].setdefault(port_name, set()).add(stream_name)
+        ends = self._sources if self._is_outlet(port_name) else self._destinations
+        old = ends.get(stream_name)
+        if old == (block_name, port_name):
+            return
+        # Unlink the old end first, or its block keeps the edge.
+        if old is not None:
+            self.disconnect(old[0], stream_name, old[1])
+        ends[stream_name] = (block_name, port_name)
+        self._link(stream_name, 1)
+
+    def disconnect(self, block_name: str, stream_name: str, port_name: str):
+        """
+        Records a stream disconnected from a block port and unlinks the blocks on either end of it.
+
+        Args:
+            block_name (str): The block name.
+            stream_name (str): The stream name.
+            port_name (str): The port name.
+
+        Returns:
+            None
+        """
+        self.blocks.get(block_name, {}).get(port_name, set()).discard(stream_name)
+        # Only the recorded end carries the edge. Disconnecting anything else leaves the links alone.
+        ends = self._sources if self._is_outlet(port_name) else self._destinations
+        if ends.get(stream_name) == (block_name, port_name):
+            self._link(stream_name, -1)
+            del ends[stream_name]
+
+    def _link(self, stream_name: str, change: int):
+        """
+        Adds (or removes) one edge between the blocks at either end of a stream.
+
+        Args:
+            stream_name (str): The stream name.
+            change (int): 1 to add the edge, -1 to remove it.
+
+        Returns:
+            None
+        """
+        if stream_name not in self._sources or stream_name not in self._destinations:
+            return
+        source = self._sources[stream_name][0]
+        destination = self._destinations[stream_name][0]
+        for adjacency, block, other in ((self._downstream, source, destination),
+                                        (self._upstream, destination, source)):
+            count = adjacency[block].get(other, 0) + change
+            if count > 0:
+                adjacency[block][other] = count
+            else:
+                adjacency[block].pop(other, None)
+
+    def ports_of(self, block_name: str):
+        """
+        Returns the ports of a block and the streams connected to each. Do not modify the result.
+
+        Args:
+            block_name (str): The block name.
+
+        Returns:
+            dict: Mapping of port names to sets of stream names, or None if the block is unknown.
+        """
+        return self.blocks.get(block_name)
+
+    def source_of(self, stream_name: str):
+        """
+        Returns the block that feeds a stream.
+
+        Args:
+            stream_name (str): The stream name.
+
+        Returns:
+            str: The block name, or None for a feed stream.
+        """
+        end = self._sources.get(stream_name)
+        return None if end is None else end[0]
+
+    def destination_of(self, stream_name: str):
+        """
+        Returns the block a stream feeds.
+
+        Args:
+            stream_name (str): The stream name.
+
+        Returns:
+            str: The block name, or None for a product stream.
+        """
+        end = self._destinations.get(stream_name)
+        return None if end is None else end[0]
+
+    def downstream(self, block_name: str):
+        """
+        Returns the blocks fed directly by a block. Do not modify the result.
+
+        Args:
+            block_name (str): The block name.
+
+        Returns:
+            dict_keys: The downstream block names.
+        """
+        return self._downstream.get(block_name, {}).keys()
+
+    def upstream(self, block_name: str):
+        """
+        Returns the blocks feeding a block directly. Do not modify the result.
+
+        Args:
+            block_name (str): The block name.
+
+        Returns:
+            dict_keys: The upstream block names.
+        """
+        return self._upstream.get(block_name, {}).keys()
+
+    def to_json(self, path: str | Path=None):
+        """
+        Exports the graph as a JSON-serialisable dictionary, optionally writing it to a file.
+
+        Args:
+            path (str | Path, optional): Where to write the JSON. Defaults to None (not written).
+
+        Returns:
+            dict: The blocks with their ports, and the streams with their source and destination.
+        """
+        graph = {
+            "blocks": {block: {port: sorted(streams) for port, streams in ports.items()}
+                       for block, ports in self.blocks.items()},
+            "streams": {stream: {"source": self._sources.get(stream), "destination": self._destinations.get(stream)}
+                        for stream in sorted(self.streams)}
+        }
+        if path is not None:
+            Path(path).write_text(json.dumps(graph, indent=4))
+        return graph
+
+    def to_networkx(self):
+        """
+        Exports the graph as a networkx MultiDiGraph with blocks as nodes and streams as edges.
+
+        Feed and product streams are not edges because they only have one end.
+
+        Raises:
+            RuntimeError: If networkx is not installed.
+
+        Returns:
+            networkx.MultiDiGraph: The graph.
+        """
+        try:
+            import networkx as nx
+        except ImportError:
+            raise RuntimeError("networkx is required to export the flowsheet as a graph.")
+        graph = nx.MultiDiGraph()
+        graph.add_nodes_from(self.blocks)
+        for stream, (source, source_port) in self._sources.items():
+            if stream in self._destinations:
+                destination, destination_port = self._destinations[stream]
+                graph.add_edge(source, destination, key=stream, source_port=source_port,
+                               destination_port=destination_port)
+        return graph
+
+
+class RewireTransaction:
+    """
+    Queues stream connect/disconnect operations and applies them all or none.
+
+    Use it through ASPEN.rewire(). Operations are validated against the flowsheet index before anything
+    touches Aspen, applied in one pass with each block fetched once, and undone in reverse order if any
+    step fails.
+
+    Attributes:
+        aspen : ASPEN
+            The ASPEN instance being rewired.
+        operations : list
+            The queued (action, block name, stream name, port name) tuples.
+
+    Methods:
+        connect(block_name, stream_name, port_name):
+            Queues a stream connection.
+        disconnect(block_name, stream_name, port_name):
+            Queues a stream disconnection.
+        reconnect(disconnect_from, connect_to, stream_name, port_name):
+            Queues moving a stream from one block to another.
+        validate():
+            Checks the queued operations against the flowsheet index.
+        commit():
+            Validates and applies the queued operations, rolling back on failure.
+    """
+
+    def __init__(self, aspen):
+        """
+        Initialize the transaction.
+
+        Args:
+            aspen (ASPEN): The ASPEN instance to rewire.
+        """
+        self.aspen = aspen
+        self.operations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Nothing has been applied yet, so an exception in the with block just drops the queue.
+        if exc_type is not None:
+            self.operations = []
+            return False
+        self.commit()
+        return False
+
+    def connect(self, block_name: str, stream_name: str, port_name: str):
+        """
+        Queues a stream connection.
+
+        Args:
+            block_name (str): The name of the block to connect the stream to.
+            stream_name (str): The name of the stream to connect.
+            port_name (str): The name of the port to connect the stream to.
+
+        Returns:
+            RewireTransaction: The transaction, so calls can be chained.
+        """
+        self.operations.append(("connect", block_name, stream_name, port_name))
+        return self
+
+    def disconnect(self, block_name: str, stream_name: str, port_name: str):
+        """
+        Queues a stream disconnection.
+
+        Args:
+            block_name (str): The name of the block to disconnect the stream from.
+            stream_name (str): The name of the stream to disconnect.
+            port_name (str): The name of the port to disconnect the stream from.
+
+        Returns:
+            RewireTransaction: The transaction, so calls can be chained.
+        """
+        self.operations.append(("disconnect", block_name, stream_name, port_name))
+        return self
+
+    def reconnect(self, disconnect_from: str, connect_to: str, stream_name: str, port_name: str):
+        """
+        Queues moving a stream from one block to another.
+
+        Args:
+            disconnect_from (str): The block to disconnect the stream from.
+            connect_to (str): The block to connect the stream to.
+            stream_name (str): The name of the stream to reconnect.
+            port_name (str): The port name used for both operations.
+
+        Returns:
+            RewireTransaction: The transaction, so calls can be chained.
+        """
+        self.disconnect(disconnect_from, stream_name, port_name)
+        return self.connect(connect_to, stream_name, port_name)
+
+    def validate(self):
+        """
+        Checks the queued operations, in order, against the flowsheet index without touching Aspen.
+
+        A stream must be on a port to be disconnected from it, and can have at most one source and one
+        destination.
+
+        Raises:
+            ValueError: If any operation is invalid. Nothing is applied.
+
+        Returns:
+            None
+        """
+        index = self.aspen.flowsheet
+        
+        # Changes made by earlier operations in the queue, layered over the index.
+        links = {}
+        ends = {}
+        for action, block_name, stream_name, port_name in self.operations:
+            ports = index.ports_of(block_name)
+            if ports is None:
+                raise ValueError(f"Cannot {action} {stream_name}: block {block_name} doesn't exist.")
+            if port_name not in ports:
+                raise ValueError(f"Cannot {action} {stream_name}: block {block_name} has no port {port_name}.")
+            if stream_name not in index.streams:
+                raise ValueError(f"Cannot {action} {stream_name}: stream doesn't exist.")
+            
+            # Work out whether the stream is on the port, and what currently holds this end of the stream.
+            link = (block_name, port_name, stream_name)
+            linked = links.get(link, stream_name in ports[port_name])
+            outlet = FlowsheetIndex._is_outlet(port_name)
+            end = (stream_name, outlet)
+            if end not in ends:
+                ends[end] = (index._sources if outlet else index._destinations).get(stream_name)
+            
+            if action == "disconnect":
+                if not linked:
+                    raise ValueError(f"Cannot disconnect {stream_name}: it is not on {block_name} {port_name}.")
+                links[link] = False
+                ends[end] = None
+            else:
+                if linked:
+                    raise ValueError(f"Cannot connect {stream_name}: it is already on {block_name} {port_name}.")
+                if ends[end] is not None:
+                    raise ValueError(
+                        f"Cannot connect {stream_name} to {block_name} {port_name}: "
+                        f"it is already connected to {ends[end][0]} {ends[end][1]}."
+                    )
+                links[link] = True
+                ends[end] = (block_name, port_name)
+
+    def commit(self):
+        """
+        Validates and applies the queued operations, then updates the flowsheet index.
+
+        If any step fails, the steps already applied are undone in reverse order.
+
+        Raises:
+            ValueError: If validation fails. Nothing is applied.
+            RuntimeError: If a step fails in Aspen. The flowsheet is rolled back.
+
+        Returns:
+            None
+        """
+        if not self.operations:
+            return
+        self.validate()
+        operations, self.operations = self.operations, []
+        
+        aspen = self.aspen
+        aspen.log(f"Rewiring {len(operations)} stream connection(s).")
+        
+        # Fetch each block's ports once.
+        ports = {}
+        for block_name in {operation[1] for operation in operations}:
+            ports[block_name] = aspen._fetch_block(block_name).Elements("Ports")
+        
+        applied = []
+        try:
+            with aspen.timings.span("rewire"):
+                for operation in operations:
+                    self._apply(ports, *operation)
+                    applied.append(operation)
+        except Exception as e:
+            failed = operations[len(applied)]
+            aspen.error(f"Unable to {failed[0]} {failed[2]} and {failed[1]} {failed[3]}: {e}. Rolling back.")
+            self._rollback(ports, applied)
+            raise RuntimeError(f"Rewiring failed at {failed[0]} {failed[2]} and {failed[1]} {failed[3]}.") from e
+        finally:
+            # The flowsheet may have changed, so cached handles may be stale.
+            aspen.clear_node_cache()
+        
+        # Keep the topology index in step.
+        index = aspen.flowsheet
+        for action, block_name, stream_name, port_name in operations:
+            getattr(index, action)(block_name, stream_name, port_name)
+        aspen.log(f"Rewired {len(operations)} stream connection(s).")
+
+    @staticmethod
+    def _apply(ports, action: str, block_name: str, stream_name: str, port_name: str):
+        """
+        Applies one operation in Aspen.
+
+        Args:
+            ports (dict): Mapping of block names to their Ports nodes.
+            action (str): 'connect' or 'disconnect'.
+            block_name (str): The block name.
+            stream_name (str): The stream name.
+            port_name (str): The port name.
+
+        Returns:
+            None
+        """
+        streams = ports[block_name].Elements(port_name).Elements
+        if action == "connect":
+            streams.Add(stream_name)
+        else:
+            streams.Remove(stream_name)
+
+    def _rollback(self, ports, applied):
+        """
+        Undoes applied operations in reverse order.
+
+        Args:
+            ports (dict): Mapping of block names to their Ports nodes.
+            applied (list): The operations that were applied.
+
+        Returns:
+            None
+        """
+        inverse = {"connect": "disconnect", "disconnect": "connect"}
+        for action, block_name, stream_name, port_name in reversed(applied):
+            try:
+                self._apply(ports, inverse[action], block_name, stream_name, port_name)
+            except Exception as e:
+                # The flowsheet no longer matches the index, so drop it and let it be rebuilt.
+                self.aspen.error(f"Rollback failed to {inverse[action]} {stream_name} and {block_name} {port_name}: {e}")
+                self.aspen._flowsheet = None
+        self.aspen.log(f"Rolled back {len(applied)} stream connection(s).")